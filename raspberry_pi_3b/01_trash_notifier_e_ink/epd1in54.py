@@ -64,6 +64,8 @@ class EPD:
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
         self.lut = self.lut_full_update
+        # Is the controller initialized (required to switch the look-up table only)
+        self.initialized = False
 
     lut_full_update = [
         0x02, 0x02, 0x01, 0x11, 0x12, 0x12, 0x22, 0x22,
@@ -100,6 +102,11 @@ class EPD:
         # so use [data] instead of data
         epdif.spi_transfer([data])
 
+    def send_data_bulk(self, data):
+        self.digital_write(self.dc_pin, GPIO.HIGH)
+        # send all bytes (bytes, bytearray or list) in a single transfer
+        epdif.spi_transfer_bulk(data)
+
     def init(self, lut):
         if (epdif.epd_init() != 0):
             return -1
@@ -124,11 +131,25 @@ class EPD:
         self.send_data(0x03)                     # X increment Y increment
         self.set_lut(self.lut)
         # EPD hardware init end
+        self.initialized = True
+        return 0
+
+##
+ #  @brief: switch between the full and the partial update look-up table.
+ #          the controller is only reset and initialized if necessary
+ #          so the frame memory is kept (required for partial updates).
+ ##
+    def init_lut(self, lut):
+        if not self.initialized:
+            return self.init(lut)
+        if lut is not self.lut:
+            self.set_lut(lut)
         return 0
 
     def wait_until_idle(self):
+        # poll in small steps, partial updates only take a few hundred ms
         while(self.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            self.delay_ms(100)
+            self.delay_ms(10)
 ##
  #  @brief: module reset.
  #          often used to awaken the module in deep sleep,
@@ -147,14 +168,14 @@ class EPD:
         self.lut = lut
         self.send_command(WRITE_LUT_REGISTER)
         # the length of look-up table is 30 bytes
-        for i in range(0, len(lut)):
-            self.send_data(self.lut[i])
+        self.send_data_bulk(self.lut)
 
 ##
  #  @brief: convert an image to a buffer
+ #          the buffer is packed (1 bit per pixel, MSB first, 1 = white)
+ #          which is the format of the frame memory
  ##
     def get_frame_buffer(self, image):
-        buf = [0x00] * (self.width * self.height / 8)
         # Set buffer to value of Python Imaging Library image.
         # Image must be in mode 1.
         image_monocolor = image.convert('1')
@@ -162,14 +183,7 @@ class EPD:
         if imwidth != self.width or imheight != self.height:
             raise ValueError('Image must be same dimensions as display \
                 ({0}x{1}).' .format(self.width, self.height))
-
-        pixels = image_monocolor.load()
-        for y in range(self.height):
-            for x in range(self.width):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[x, y] != 0:
-                    buf[(x + y * self.width) / 8] |= 0x80 >> (x % 8)
-        return buf
+        return image_monocolor.tobytes()
 
 ##
  #  @brief: put an image to the frame memory.
@@ -191,33 +205,32 @@ class EPD:
             y_end = self.height - 1
         else:
             y_end = y + image_height - 1
+        if (x_end < x or y_end < y):
+            return
+        # crop the image to the region so each row packs into whole bytes
+        region = image_monocolor.crop((0, 0, x_end - x + 1, y_end - y + 1))
+        self.set_frame_memory_buffer(region.tobytes(), x, y, x_end, y_end)
+
+##
+ #  @brief: put a packed buffer (see get_frame_buffer) of the region
+ #          to the frame memory with a single transfer.
+ #          this won't update the display.
+ ##
+    def set_frame_memory_buffer(self, buf, x, y, x_end, y_end):
         self.set_memory_area(x, y, x_end, y_end)
         self.set_memory_pointer(x, y)
         self.send_command(WRITE_RAM)
         # send the image data
-        pixels = image_monocolor.load()
-        byte_to_send = 0x00
-        for j in range(0, y_end - y + 1):
-            # 1 byte = 8 pixels, steps of i = 8
-            for i in range(0, x_end - x + 1):
-                # Set the bits for the column of pixels at the current position.
-                if pixels[i, j] != 0:
-                    byte_to_send |= 0x80 >> (i % 8)
-                if (i % 8 == 7):
-                    self.send_data(byte_to_send)
-                    byte_to_send = 0x00
+        self.send_data_bulk(buf)
 
 ##
  #  @brief: clear the frame memory with the specified color.
  #          this won't update the display.
  ##
     def clear_frame_memory(self, color):
-        self.set_memory_area(0, 0, self.width - 1, self.height - 1)
-        self.set_memory_pointer(0, 0)
-        self.send_command(WRITE_RAM)
-        # send the color data
-        for i in range(0, int(self.width / 8 * self.height)):
-            self.send_data(color)
+        self.set_frame_memory_buffer(
+            bytes([color]) * (self.width // 8 * self.height),
+            0, 0, self.width - 1, self.height - 1)
 
 ##
  #  @brief: update the display
@@ -268,5 +281,7 @@ class EPD:
     def sleep(self):
         self.send_command(DEEP_SLEEP_MODE)
         self.wait_until_idle()
+        # the frame memory is lost, init() is required again
+        self.initialized = False
 
 ### END OF FILE ###
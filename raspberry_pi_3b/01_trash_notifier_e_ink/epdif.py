@@ -49,6 +49,11 @@ def epd_delay_ms(delaytime):
 def spi_transfer(data):
     SPI.writebytes(data)
 
+def spi_transfer_bulk(data):
+    # writebytes2 accepts bytes/bytearray of any length (writebytes is
+    # limited to 4096 bytes) and splits it into chunks of the SPI buffer size
+    SPI.writebytes2(data)
+
 def epd_init():
     GPIO.setmode(GPIO.BCM)
     GPIO.setwarnings(False)
@@ -53,6 +53,8 @@ FONT_SIZE_BIG = 36
 FONT_SIZE_TEXT = 24
 FONT_SIZE_UPDATE = 12
 TEXT_SPACING = 8
+# Do a full update (clears ghosting) after this many partial updates
+EINK_PARTIAL_UPDATES_MAX = 24
 
 # Updates
 UPDATE_DELAY = 20  # 20s
@@ -68,12 +70,23 @@ logger = logging.getLogger("trash_notifier")
 logger.setLevel(logging.DEBUG)
 logger.addHandler(journal.JournalHandler(SYSLOG_IDENTIFIER='trash_notifier'))
 
+# > E-Ink display (the controller keeps its frame memory between updates for partial updates)
+epd = epd1in54.EPD()
+epd_frame_buffer: Optional[bytes] = None
+# Content of the displayed frame without the update time (which changes every update)
+epd_frame_content: Optional[bytes] = None
+epd_partial_updates = 0
+
 # State variable to track button press
 button_pressed = datetime.now().date() + DEBUG_DAY_OFFSET - timedelta(days=2)
 trash_taken_out = False
 
 
 def print_eink(trash_dates: list[tuple[date, str]]):
+    global epd_frame_buffer
+    global epd_frame_content
+    global epd_partial_updates
+
     logger.info("Update E-Ink display")
     # Create image to be displayed
     image = Image.new('1', (epd1in54.EPD_WIDTH, epd1in54.EPD_HEIGHT), 255)
@@ -94,16 +107,33 @@ def print_eink(trash_dates: list[tuple[date, str]]):
             break  # Stop, no vertical space available
         draw.text((TEXT_SPACING, y_position_text), text, font=font_text, fill=0)
         y_position_text += FONT_SIZE_TEXT + TEXT_SPACING
+    # Skip the update if the content did not change (compared before the update time is added)
+    frame_content = image.tobytes()
+    if frame_content == epd_frame_content:
+        logger.debug("E-Ink display is already up to date")
+        return
     # Add current time as indicator of the last update
     draw.text((TEXT_SPACING, epd1in54.EPD_HEIGHT - TEXT_SPACING - FONT_SIZE_UPDATE), datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
               font=font_update, fill=0)
-    # Initialize display (full update), clear frame memory, set new frame memory, display frame
-    epd = epd1in54.EPD()
-    epd.init(epd.lut_full_update)
-    epd.clear_frame_memory(0xFF)
-    epd.set_frame_memory(image, 0, 0)
-    epd.display_frame()
-    logger.debug("Updated E-Ink display")
+    frame_buffer = epd.get_frame_buffer(image)
+    if epd_frame_buffer is None or epd_partial_updates >= EINK_PARTIAL_UPDATES_MAX:
+        # Initialize display (full update), clear frame memory, set new frame memory, display frame
+        epd.init(epd.lut_full_update)
+        epd.clear_frame_memory(0xFF)
+        epd.set_frame_memory_buffer(frame_buffer, 0, 0, epd.width - 1, epd.height - 1)
+        epd.display_frame()
+        epd_partial_updates = 0
+    else:
+        # Switch to the partial update look-up table (no reset) and display the new frame
+        epd.init_lut(epd.lut_partial_update)
+        epd.set_frame_memory_buffer(frame_buffer, 0, 0, epd.width - 1, epd.height - 1)
+        epd.display_frame()
+        epd_partial_updates += 1
+    # Write the frame to the other memory area too so the next partial update is based on it
+    epd.set_frame_memory_buffer(frame_buffer, 0, 0, epd.width - 1, epd.height - 1)
+    epd_frame_buffer = frame_buffer
+    epd_frame_content = frame_content
+    logger.debug("Updated E-Ink display (%i partial updates since the last full update)", epd_partial_updates)
 
 
 def parse_ics(cache_file: Path) -> Calendar:
@@ -0,0 +1,281 @@
+# Run this file to benchmark the render and buffer conversion paths with synthetic plugin data (headless)
+# python benchmark_render.py
+# python benchmark_render.py --save-baseline
+# python benchmark_render.py --compare benchmark_render_baseline.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Optional
+
+# requires 'Pillow'
+from PIL import Image, ImageDraw
+
+from lib.render.epd_surface import EpdSurface
+from lib.render.render import render_display_bw, Action, Widget, Width, Height, ActionContent, WidgetContent, \
+    create_qr_code
+
+SCRIPT_DIR = Path(__file__).parent
+BASELINE_FILE = SCRIPT_DIR.joinpath("benchmark_render_baseline.json")
+
+RESOLUTIONS: list[tuple[Width, Height]] = [
+    (Width(800), Height(480)),  # 7.5" V2 (room buddy)
+    (Width(640), Height(384)),  # 7.5" V1
+    (Width(296), Height(128)),  # 2.9"
+    (Width(1304), Height(984)),  # 12.48"
+]
+
+LONG_TEXT = "Restmüll und Papier und Biomüll und Gelber Sack " * 4
+
+
+def create_image(content: str, size: int) -> Image:
+    """QR code like the plugins use (or a checkerboard if 'qrcode' is not installed)"""
+    try:
+        return create_qr_code(content, size)
+    except ImportError:
+        image = Image.new("1", (size, size), 255)
+        draw = ImageDraw.Draw(image)
+        for y in range(0, size, 8):
+            for x in range((y // 8 % 2) * 8, size, 16):
+                draw.rectangle((x, y, x + 7, y + 7), fill=0)
+        return image
+
+
+def create_workload(actions: int, widgets: int, images: int, long_text: bool) -> tuple[list[Action], list[Widget]]:
+    """Create synthetic actions and widgets similar to the ones of the plugins"""
+    today = datetime.now().date()
+    text = LONG_TEXT if long_text else "Restmüll"
+    widget_images = [create_image(f"https://example.com/{i}", 100) for i in range(images)]
+    generated_actions = [
+        Action(generate_content=lambda i=i: ActionContent(("info_white", "Take trash out", f"{text} #{i}")),
+               date=today + timedelta(days=i))
+        for i in range(actions)
+    ]
+    generated_widgets = [
+        Widget(generate_content=lambda i=i: [
+            WidgetContent(description="Trash Dates", text=""),
+            WidgetContent(description=(today + timedelta(days=i)).strftime('%d.%m.'), text=text),
+            WidgetContent(text=f"{20 + i / 10:.1f}°C / {50 + i:.0f}%",
+                          images=widget_images if i == 0 and len(widget_images) > 0 else None),
+        ])
+        for i in range(widgets)
+    ]
+    return generated_actions, generated_widgets
+
+
+WORKLOADS: dict[str, dict] = {
+    "empty": dict(actions=0, widgets=0, images=0, long_text=False),
+    "few_widgets": dict(actions=1, widgets=3, images=0, long_text=False),
+    "many_widgets": dict(actions=3, widgets=12, images=0, long_text=False),
+    "qr_codes": dict(actions=1, widgets=3, images=2, long_text=False),
+    "long_text": dict(actions=3, widgets=6, images=0, long_text=True),
+}
+
+
+def load_epd_class():
+    """The EPD driver can only be imported if epdconfig supports the machine (returns None otherwise)"""
+    # Never drive a connected panel, the display stages use the recording epdconfig implementation
+    os.environ.setdefault("EPD_SIMULATED", "1")
+    try:
+        from lib.waveshare_epd.epd7in5_V2 import EPD
+        from lib.waveshare_epd.epd_auto_sleep_manager import EPaperDisplayManager
+        return EPD, EPaperDisplayManager
+    except (ImportError, RuntimeError, OSError) as e:
+        print(f"Skip e-paper display stages (driver not available on this machine: {e!r})")
+        return None, None
+
+
+def measure(function: Callable[[], object], iterations: int, warmup: int) -> dict:
+    """Measure the latency percentiles (ms) and the allocations of a function"""
+    for _ in range(warmup):
+        function()
+    durations = []
+    for _ in range(iterations):
+        start_time = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start_time) * 1000)
+    durations.sort()
+
+    # Allocations are measured in a separate run since tracing slows down the function
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    snapshot_before = tracemalloc.take_snapshot()
+    function()
+    snapshot_after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    statistics_diff = snapshot_after.compare_to(snapshot_before, "filename")
+    allocated_blocks = sum(max(stat.count_diff, 0) for stat in statistics_diff)
+
+    def percentile(p: float) -> float:
+        return durations[min(int(p / 100 * len(durations)), len(durations) - 1)]
+
+    return {
+        "p50_ms": round(percentile(50), 3),
+        "p90_ms": round(percentile(90), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(durations[-1], 3),
+        "mean_ms": round(statistics.fmean(durations), 3),
+        "peak_kib": round(peak / 1024, 1),
+        "allocated_blocks": allocated_blocks,
+    }
+
+
+def measure_display_transfers(epd_class, image: Image, iterations: int, warmup: int) -> dict:
+    """Measure the host time and the modeled SPI/BUSY costs of the display methods (simulated epdconfig)"""
+    from lib.waveshare_epd import epdconfig
+    if not isinstance(epdconfig.implementation, epdconfig.Simulated):
+        print("Skip display transfer stages (epdconfig is not the simulated implementation)")
+        return {}
+    simulated = epdconfig.implementation
+    epd = epd_class()
+    buffer = epd.getbuffer(image)
+    buffer_4gray = epd.getbuffer_4Gray(image.convert("L"))
+    stages = {
+        "display": (epd.init, lambda: epd.display(buffer), iterations),
+        "display_Partial": (epd.init_part, lambda: epd.display_Partial(buffer, 0, 0, epd.width, epd.height),
+                            iterations),
+        # Packs the 2-bit pixels in Python and is therefore way slower
+        "display_4Gray": (epd.init_4Gray, lambda: epd.display_4Gray(buffer_4gray), min(iterations, 5)),
+    }
+    results = {}
+    for name, (init, display, stage_iterations) in stages.items():
+        init()
+        result = measure(display, stage_iterations, min(warmup, 1))
+        # The transfers are deterministic, so a single recorded call is enough
+        simulated.reset_recording()
+        display()
+        transfers = simulated.statistics.as_dict()
+        del transfers["refreshes"]
+        result.update(transfers)
+        results[f"{epd.width}x{epd.height}/{name} (simulated)"] = result
+    simulated.reset_recording()
+    return results
+
+
+def run_benchmarks(iterations: int, warmup: int, resolutions: list[tuple[Width, Height]]) -> dict:
+    epd_class, display_manager_class = load_epd_class()
+    results = {}
+    for resolution in resolutions:
+        for workload_name, workload in WORKLOADS.items():
+            actions, widgets = create_workload(**workload)
+            key = f"{resolution[0]}x{resolution[1]}/{workload_name}"
+
+            def render():
+                return render_display_bw(actions, widgets, resolution)
+
+            image = render()
+            results[f"{key}/render_display_bw"] = measure(render, iterations, warmup)
+
+            # Rendered in the display controller format (replaces render_display_bw + getbuffer)
+            surface = EpdSurface(*resolution)
+            results[f"{key}/render_display_bw (surface)"] = measure(
+                lambda: render_display_bw(actions, widgets, resolution, surface=surface), iterations, warmup)
+            results[f"{key}/EpdSurface.pack"] = measure(surface.pack, iterations, warmup)
+
+            if epd_class is not None:
+                # Only the resolution is used by getbuffer
+                epd = epd_class()
+                epd.width, epd.height = resolution
+                results[f"{key}/getbuffer"] = measure(lambda: epd.getbuffer(image), iterations, warmup)
+
+                image_equal = image.copy()
+                image_different = image.copy()
+                image_different.putpixel((resolution[0] - 1, resolution[1] - 1), 0)
+                results[f"{key}/images_are_equal (equal)"] = measure(
+                    lambda: display_manager_class.images_are_equal(image, image_equal), iterations, warmup)
+                results[f"{key}/images_are_equal (different)"] = measure(
+                    lambda: display_manager_class.images_are_equal(image, image_different), iterations, warmup)
+
+                # Idle frame check of the display manager (packed frame compared to the displayed one)
+                display_manager = display_manager_class(epd)
+                display_manager.frame_buffers[0][:] = image.tobytes()
+                display_manager.displayed_frame_index = 0
+                results[f"{key}/is_displayed (unchanged)"] = measure(
+                    lambda: display_manager.is_displayed(image.tobytes()), iterations, warmup)
+            print(f"{key} done")
+
+    if epd_class is not None:
+        actions, widgets = create_workload(**WORKLOADS["few_widgets"])
+        epd = epd_class()
+        results.update(measure_display_transfers(
+            epd_class, render_display_bw(actions, widgets, (Width(epd.width), Height(epd.height))), iterations, warmup))
+    return results
+
+
+def print_results(results: dict, baseline: Optional[dict], threshold: float) -> int:
+    """Print the results (compared to the baseline) and return the number of regressions"""
+    regressions = 0
+    print(f"{'stage':<60} {'p50':>9} {'p90':>9} {'p99':>9} {'peak':>10} {'blocks':>7}")
+    for key, result in results.items():
+        line = (f"{key:<60} {result['p50_ms']:>7.2f}ms {result['p90_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms "
+                f"{result['peak_kib']:>7.1f}KiB {result['allocated_blocks']:>7}")
+        if baseline is not None and key in baseline:
+            baseline_p50 = baseline[key]["p50_ms"]
+            change = (result["p50_ms"] - baseline_p50) / baseline_p50 if baseline_p50 > 0 else 0
+            line += f" {change:+7.1%}"
+            if change > threshold:
+                line += " REGRESSION"
+                regressions += 1
+            # The simulated transfers are deterministic, so every additional byte or transaction is a regression
+            for counter in ("transactions", "command_bytes", "data_bytes"):
+                if counter in result and result[counter] > baseline[key].get(counter, result[counter]):
+                    line += f" REGRESSION ({counter} {baseline[key][counter]} -> {result[counter]})"
+                    regressions += 1
+        if "transactions" in result:
+            line += (f"\n{'':<60} {result['transactions']} transactions, {result['data_bytes']} data bytes, "
+                     f"modeled {result['spi_time_ms']:.1f}ms SPI + {result['busy_time_ms']:.0f}ms busy")
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark render_display_bw, EPD.getbuffer, "
+                                                 "EPaperDisplayManager.images_are_equal and the EPD display "
+                                                 "transfers (simulated)")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--resolutions", nargs="+", default=[f"{w}x{h}" for w, h in RESOLUTIONS],
+                        help="Resolutions to benchmark (e.g. 800x480)")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_FILE, type=Path, default=None,
+                        help=f"Save the results as baseline JSON (default: {BASELINE_FILE.name})")
+    parser.add_argument("--compare", type=Path, default=None, help="Compare the results to a baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative p50 increase that is reported as regression (default: 0.2 = 20%%)")
+    args = parser.parse_args()
+
+    resolutions = [tuple(Width(int(x)) if i == 0 else Height(int(x)) for i, x in enumerate(resolution.split("x")))
+                   for resolution in args.resolutions]
+    results = run_benchmarks(args.iterations, args.warmup, resolutions)
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)["results"]
+    regressions = print_results(results, baseline, args.threshold)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as f:
+            json.dump({
+                "created": datetime.now().isoformat(timespec="seconds"),
+                "python": sys.version,
+                "machine": platform.platform(),
+                "iterations": args.iterations,
+                "results": results,
+            }, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if regressions > 0:
+        print(f"{regressions} regressions (p50 more than {args.threshold:.0%} slower than the baseline)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import time
+from datetime import datetime, timedelta
+
+
+class Clock:
+    """
+    Time source of the plugins and the scheduler (wall clock).
+    Can be replaced by a `VirtualClock` to simulate days in seconds.
+    """
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+
+class VirtualClock(Clock):
+    """
+    Clock that only moves forward when it is advanced (e.g. by the `VirtualTimeEventLoop` when all tasks wait).
+    Reading it is thread-safe, advancing it is only done by the loop thread.
+    """
+
+    def __init__(self, start: datetime):
+        self.start = start
+        self.elapsed = 0.0
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.elapsed)
+
+    def monotonic(self) -> float:
+        return self.elapsed
+
+    def advance(self, seconds: float):
+        if seconds > 0:
+            self.elapsed += seconds
@@ -1,5 +1,9 @@
+from functools import cache
+
+
+@cache
 def is_raspberry_pi():
-    """Detect if the program is running on a Raspberry Pi or on another (development) machine"""
+    """Detect if the program is running on a Raspberry Pi or on another (development) machine (cached)"""
     try:
         with open("/proc/cpuinfo", "r") as f:
             cpuinfo = f.read().lower()
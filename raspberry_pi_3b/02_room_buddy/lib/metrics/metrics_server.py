@@ -0,0 +1,153 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as CallStackCounter
+from logging import Logger
+from typing import Optional
+from urllib.parse import urlsplit, parse_qs
+
+from .metrics import MetricsRegistry, REGISTRY
+
+# Longest profile that can be requested (seconds)
+PROFILE_SECONDS_MAX = 300
+# Interval of the stack sampler (seconds)
+SAMPLE_INTERVAL = 0.01
+
+
+def read_rss_bytes() -> float:
+    """Current resident set size (falls back to the peak if /proc is not available)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        try:
+            import resource
+            # ru_maxrss is in KiB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+
+def register_process_metrics(registry: MetricsRegistry = REGISTRY):
+    registry.gauge("room_buddy_resident_memory_bytes", "Resident set size of the process", function=read_rss_bytes)
+    registry.gauge("room_buddy_threads", "Number of running threads", function=threading.active_count)
+
+
+async def monitor_event_loop_lag(registry: MetricsRegistry = REGISTRY, interval: float = 1.0):
+    """Measure how late the loop wakes up a sleeping task (blocking code in a coroutine delays all others)"""
+    lag_gauge = registry.gauge("room_buddy_event_loop_lag_seconds", "Last measured event loop lag")
+    lag_histogram = registry.histogram("room_buddy_event_loop_lag_histogram_seconds", "Event loop lag")
+    loop = asyncio.get_running_loop()
+    while True:
+        start_time = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start_time - interval, 0)
+        lag_gauge.set(lag)
+        lag_histogram.observe(lag)
+
+
+def sample_stacks(seconds: float, interval: float = SAMPLE_INTERVAL) -> str:
+    """
+    Sample the call stacks of all threads (like py-spy, but in-process) and return them in the folded format
+    (`thread;outer;...;inner count` lines, can be turned into a flame graph).
+    """
+    own_thread_id = threading.get_ident()
+    thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = CallStackCounter()
+    end_time = time.perf_counter() + seconds
+    while time.perf_counter() < end_time:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread_id:
+                continue
+            frames = [f"{summary.name} ({os.path.basename(summary.filename)}:{summary.lineno})"
+                      for summary in traceback.extract_stack(frame)]
+            stacks[";".join([thread_names.get(thread_id, str(thread_id))] + frames)] += 1
+        time.sleep(interval)
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint (no dependencies) of the metrics registry:
+    - `/metrics`: Prometheus text format
+    - `/profile?seconds=10`: cProfile of the event loop thread (pstats text, sorted by cumulative time)
+    - `/profile?seconds=10&mode=sample`: sampled call stacks of all threads (folded format)
+    """
+
+    def __init__(self, logger: Logger, registry: MetricsRegistry = REGISTRY,
+                 host: str = "127.0.0.1", port: int = 9105):
+        self.logger = logger
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.profiling = False
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.logger.info(f"Metrics endpoint: http://{self.host}:{self.port}/metrics")
+
+    async def profile(self, seconds: float, mode: str) -> str:
+        if mode == "sample":
+            return await asyncio.to_thread(sample_stacks, seconds)
+        # cProfile only profiles the thread it is enabled in (the event loop thread)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) is active
+            return f"Unable to start the profiler: {e}\n"
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(50)
+        return output.getvalue()
+
+    async def respond(self, path: str, query: dict[str, list[str]]) -> tuple[int, str, str]:
+        """Returns the status, content type and body"""
+        if path == "/metrics":
+            return 200, "text/plain; version=0.0.4; charset=utf-8", self.registry.render()
+        if path == "/profile":
+            if self.profiling:
+                return 409, "text/plain", "A profile is already running\n"
+            try:
+                seconds = min(float(query.get("seconds", ["10"])[0]), PROFILE_SECONDS_MAX)
+            except ValueError:
+                return 400, "text/plain", "Invalid 'seconds'\n"
+            mode = query.get("mode", ["cprofile"])[0]
+            self.logger.info(f"Profile ({mode}) for {seconds}s")
+            self.profiling = True
+            try:
+                return 200, "text/plain; charset=utf-8", await self.profile(seconds, mode)
+            finally:
+                self.profiling = False
+        return 404, "text/plain", "Not found (available: /metrics, /profile?seconds=10[&mode=sample])\n"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            # Skip the headers
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            if len(request_line) < 2 or request_line[0] != "GET":
+                status, content_type, body = 405, "text/plain", "Only GET is supported\n"
+            else:
+                url = urlsplit(request_line[1])
+                status, content_type, body = await self.respond(url.path, parse_qs(url.query))
+            content = body.encode("utf-8")
+            writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                         f"Content-Type: {content_type}\r\nContent-Length: {len(content)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + content)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            self.logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
@@ -5,7 +5,9 @@ from typing import NewType
 # requires 'gpiozero'
 from gpiozero import RGBLED, Button
 
+from lib.clock.clock import Clock
 from lib.render.render import Action, Widget
+from lib.scheduler.deadline_scheduler import DeadlineScheduler
 
 
 ChangeDetected = NewType('ChangeDetected', bool)
@@ -20,7 +22,7 @@ class PluginLoggerPrefixAdapter(LoggerAdapter):
 class PluginBase:
     def __init__(self, name: str, logger: Logger,
                  led_rgb_main: RGBLED, led_rgb_info: RGBLED, button_black: Button, button_red: Button,
-                 simulate_circuit: bool, timedelta_offset: timedelta):
+                 simulate_circuit: bool, timedelta_offset: timedelta, scheduler: DeadlineScheduler, clock: Clock):
         self.name = name
         self.logger = PluginLoggerPrefixAdapter(logger, {"prefix": f"[Plugin {self.name}]"})
         self.led_rgb_main = led_rgb_main
@@ -29,6 +31,10 @@ class PluginBase:
         self.button_black = button_black
         self.simulate_circuit = simulate_circuit
         self.timedelta_offset = timedelta_offset
+        # Shared scheduler to register deadline callbacks (instead of polling)
+        self.scheduler = scheduler
+        # Use `self.clock.now()` instead of `datetime.now()` so the plugin can be simulated in virtual time
+        self.clock = clock
 
         self.logger.debug(f"Created plugin {simulate_circuit=}")
 
@@ -36,6 +42,12 @@ class PluginBase:
         """Start the plugin's async loop (overwrite to provide loop)"""
         self.logger.debug("Has not implemented an async `run` method")
 
+    def release(self):
+        """
+        Release the shared hardware after the plugin was stopped (overwrite to e.g. reset button callbacks that
+        reference this instance, so a reloaded plugin does not run callbacks of the stopped one)
+        """
+
     async def receive_signal(self, signal_id: str, data: dict):
         """Provide a method to get data from the plugin"""
         self.logger.debug("Has not implemented an async `receive_signal` method {signal_id=}")
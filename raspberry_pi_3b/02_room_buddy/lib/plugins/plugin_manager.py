@@ -1,21 +1,67 @@
+import ast
 import asyncio
 import importlib
+import sys
+import time
+from dataclasses import dataclass, field
 from logging import Logger
 from pathlib import Path
 from datetime import timedelta
+from types import ModuleType
+from typing import Optional
 
 # requires 'gpiozero'
 from gpiozero import RGBLED, Button
 
 from .plugin import PluginBase, ChangeDetected
+from ..clock.clock import Clock
+from ..metrics.metrics import REGISTRY
 from ..render.render import Action, Widget
+from ..scheduler.deadline_scheduler import DeadlineScheduler
+
+# How often the plugin files are checked for changes (hot reload)
+PLUGIN_WATCH_INTERVAL_SECONDS = 2
+
+METRIC_PLUGIN_REQUEST_SECONDS = REGISTRY.histogram("room_buddy_plugin_request_seconds",
+                                                   "Duration of the action/widget requests per plugin")
+
+
+@dataclass
+class PluginInfo:
+    module_name: str = field(metadata={"description": "Name of the plugin module (e.g. 'plugins.trash_notifier')"})
+    file: Path = field(metadata={"description": "Source file of the plugin module"})
+    name: str = field(metadata={"description": "Name from the plugin metadata (default: file name)"})
+    description: str = field(default="", metadata={"description": "Description from the plugin metadata"})
+    enabled: bool = field(default=True, metadata={"description": "Disabled plugins are not imported"})
+    mtime_ns: int = field(default=0, metadata={"description": "Modification time of the file when it was loaded"})
+    module: Optional[ModuleType] = field(default=None)
+    instance: Optional[PluginBase] = field(default=None)
+    task: Optional[asyncio.Task] = field(default=None)
+
+
+def read_plugin_metadata(file: Path) -> Optional[dict]:
+    """
+    Read the `PLUGIN_METADATA` dictionary (literal) of a plugin file without importing it.
+    Returns None if the file does not define a `Plugin` class.
+    """
+    tree = ast.parse(file.read_text(encoding="utf-8"), filename=str(file))
+    metadata = {}
+    has_plugin_class = False
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and node.name == "Plugin":
+            has_plugin_class = True
+        elif isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == "PLUGIN_METADATA"
+                                                  for target in node.targets):
+            metadata = ast.literal_eval(node.value)
+    return metadata if has_plugin_class else None
 
 
 # Plugin manager to load and manage plugins
 class PluginManager:
     def __init__(self, plugin_dir: Path, logger: Logger,
                  led_rgb_main: RGBLED, led_rgb_info: RGBLED, button_black: Button, button_red: Button,
-                 simulate_circuit: bool, timedelta_offset: timedelta):
+                 simulate_circuit: bool, timedelta_offset: timedelta, hot_reload: bool = False,
+                 clock: Optional[Clock] = None):
         self.logger = logger
         self.led_rgb_main = led_rgb_main
         self.led_rgb_info = led_rgb_info
@@ -23,37 +69,145 @@ class PluginManager:
         self.button_black = button_black
         self.simulate_circuit = simulate_circuit
         self.timedelta_offset = timedelta_offset
+        self.hot_reload = hot_reload
+        self.clock = clock or Clock()
 
         self.plugin_dir = plugin_dir
-        self.plugins = []
+        self.plugin_infos: dict[str, PluginInfo] = {}
+        # A plugin was started or stopped since the widgets were requested the last time
+        self.plugins_changed = False
+        self.scheduler = DeadlineScheduler(logger, self.clock)
+
+    @property
+    def plugins(self) -> list[PluginBase]:
+        """All started plugins"""
+        return [info.instance for info in self.plugin_infos.values() if info.instance is not None]
+
+    def discover_plugin(self, file: Path) -> Optional[PluginInfo]:
+        try:
+            metadata = read_plugin_metadata(file)
+        except (OSError, SyntaxError, ValueError) as e:
+            self.logger.error(f"Unable to read plugin metadata of {file}: {e}")
+            return None
+        if metadata is None:
+            return None
+        return PluginInfo(module_name=f"{self.plugin_dir.name}.{file.stem}", file=file,
+                          name=metadata.get("name", file.stem),
+                          description=metadata.get("description", ""),
+                          enabled=metadata.get("enabled", True),
+                          mtime_ns=file.stat().st_mtime_ns)
 
     async def load_plugins(self):
-        """Dynamically load plugins from the plugin directory"""
-        for file in self.plugin_dir.iterdir():
+        """Discover the plugins in the plugin directory (from their metadata, they are only imported on start)"""
+        for file in sorted(self.plugin_dir.iterdir()):
             if file.is_file() and file.suffix == ".py" and file.stem != "__init__":
-                print(f"load plugin from {file}", f"{self.plugin_dir.name}.{file.stem}")
-                module = importlib.import_module(f"{self.plugin_dir.name}.{file.stem}")
-                plugin_class = getattr(module, "Plugin")
-                if issubclass(plugin_class, PluginBase):
-                    plugin_instance = plugin_class(logger=self.logger,
-                                                   led_rgb_main=self.led_rgb_main,
-                                                   led_rgb_info=self.led_rgb_info,
-                                                   button_black=self.button_black,
-                                                   button_red=self.button_red,
-                                                   simulate_circuit=self.simulate_circuit,
-                                                   timedelta_offset=self.timedelta_offset)
-                    self.plugins.append(plugin_instance)
+                plugin_info = self.discover_plugin(file)
+                if plugin_info is None:
+                    continue
+                self.logger.info(f"Found plugin {plugin_info.name} ({plugin_info.module_name}, "
+                                 f"{plugin_info.enabled=}): {plugin_info.description}")
+                self.plugin_infos[plugin_info.module_name] = plugin_info
+
+    def import_plugin(self, plugin_info: PluginInfo) -> ModuleType:
+        """Import (or reload if it was already imported) the plugin module (blocking)"""
+        if plugin_info.module_name in sys.modules:
+            return importlib.reload(sys.modules[plugin_info.module_name])
+        return importlib.import_module(plugin_info.module_name)
+
+    async def start_plugin(self, plugin_info: PluginInfo):
+        """Import the plugin module on a thread (so multiple plugins can be imported in parallel) and start it"""
+        if not plugin_info.enabled:
+            return
+        import_start_time = time.perf_counter()
+        try:
+            plugin_info.module = await asyncio.to_thread(self.import_plugin, plugin_info)
+            import_duration = time.perf_counter() - import_start_time
+            plugin_class = getattr(plugin_info.module, "Plugin")
+            if not issubclass(plugin_class, PluginBase):
+                self.logger.error(f"Plugin class of {plugin_info.module_name} is not a subclass of PluginBase")
+                return
+            plugin_info.instance = plugin_class(logger=self.logger,
+                                                led_rgb_main=self.led_rgb_main,
+                                                led_rgb_info=self.led_rgb_info,
+                                                button_black=self.button_black,
+                                                button_red=self.button_red,
+                                                simulate_circuit=self.simulate_circuit,
+                                                timedelta_offset=self.timedelta_offset,
+                                                scheduler=self.scheduler,
+                                                clock=self.clock)
+        except Exception as e:
+            self.logger.exception(f"Unable to load plugin {plugin_info.module_name}: {e}")
+            return
+        plugin_info.task = asyncio.create_task(plugin_info.instance.run(), name=f"plugin {plugin_info.name}")
+        plugin_info.task.add_done_callback(lambda task: self.on_plugin_task_done(plugin_info, task))
+        self.plugins_changed = True
+        self.logger.info(f"Started plugin {plugin_info.name} (import took {import_duration * 1000:.0f} ms)")
+
+    def on_plugin_task_done(self, plugin_info: PluginInfo, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"Plugin {plugin_info.name} stopped with an error: {task.exception()!r}")
+
+    async def stop_plugin(self, plugin_info: PluginInfo):
+        """Cancel the task of the plugin and wait for it to finish"""
+        if plugin_info.task is not None:
+            plugin_info.task.cancel()
+            try:
+                await plugin_info.task
+            except BaseException:
+                pass
+        if plugin_info.instance is not None:
+            try:
+                plugin_info.instance.release()
+            except Exception as e:
+                self.logger.exception(f"Unable to release plugin {plugin_info.name}: {e}")
+        plugin_info.task = None
+        plugin_info.instance = None
+        self.plugins_changed = True
+
+    async def reload_plugin(self, plugin_info: PluginInfo):
+        """Restart a single plugin with the changed source file (the other plugins keep running)"""
+        self.logger.info(f"Reload plugin {plugin_info.name}")
+        await self.stop_plugin(plugin_info)
+        new_plugin_info = self.discover_plugin(plugin_info.file)
+        if new_plugin_info is None:
+            self.plugin_infos.pop(plugin_info.module_name, None)
+            return
+        self.plugin_infos[new_plugin_info.module_name] = new_plugin_info
+        await self.start_plugin(new_plugin_info)
+
+    async def watch_plugins(self):
+        """Reload plugins which source file changed, start new and stop removed plugins (forever loop)"""
+        while True:
+            await asyncio.sleep(PLUGIN_WATCH_INTERVAL_SECONDS)
+            files = {file for file in self.plugin_dir.glob("*.py") if file.stem != "__init__"}
+            for plugin_info in list(self.plugin_infos.values()):
+                if plugin_info.file not in files:
+                    self.logger.info(f"Stop removed plugin {plugin_info.name}")
+                    await self.stop_plugin(plugin_info)
+                    del self.plugin_infos[plugin_info.module_name]
+                elif plugin_info.file.stat().st_mtime_ns != plugin_info.mtime_ns:
+                    await self.reload_plugin(plugin_info)
+            known_files = {plugin_info.file for plugin_info in self.plugin_infos.values()}
+            for file in files - known_files:
+                plugin_info = self.discover_plugin(file)
+                if plugin_info is not None:
+                    self.plugin_infos[plugin_info.module_name] = plugin_info
+                    await self.start_plugin(plugin_info)
 
     async def start_plugins(self):
-        """Start all loaded plugins"""
-        tasks = [plugin.run() for plugin in self.plugins]
+        """Start all discovered plugins and the scheduler they share"""
+        tasks = [self.scheduler.run()]
+        if self.hot_reload:
+            tasks.append(self.watch_plugins())
+        await asyncio.gather(*(self.start_plugin(plugin_info) for plugin_info in list(self.plugin_infos.values())))
         await asyncio.gather(*tasks)
 
     async def request_actions(self) -> tuple[dict[str, list[Action]], ChangeDetected]:
         results = {}
         change_detected = ChangeDetected(False)
         for plugin in self.plugins:
-            plugin_actions, plugin_change_detected = await plugin.request_actions()
+            with METRIC_PLUGIN_REQUEST_SECONDS.time(plugin=plugin.name, request="actions"):
+                plugin_actions, plugin_change_detected = await plugin.request_actions()
             results[plugin.name] = plugin_actions
             if plugin_change_detected:
                 change_detected = ChangeDetected(True)
@@ -61,15 +215,17 @@ class PluginManager:
 
     async def request_widgets(self) -> tuple[dict[str, list[Widget]], ChangeDetected]:
         results = {}
-        change_detected = ChangeDetected(False)
+        change_detected = ChangeDetected(self.plugins_changed)
+        self.plugins_changed = False
         for plugin in self.plugins:
-            plugin_widgets, plugin_change_detected = await plugin.request_widgets()
+            with METRIC_PLUGIN_REQUEST_SECONDS.time(plugin=plugin.name, request="widgets"):
+                plugin_widgets, plugin_change_detected = await plugin.request_widgets()
             results[plugin.name] = plugin_widgets
             if plugin_change_detected:
                 change_detected = ChangeDetected(True)
         return results, change_detected
 
     def debug_set_timedelta_offset(self, timedelta_offset: timedelta):
+        self.timedelta_offset = timedelta_offset
         for plugin in self.plugins:
             plugin.debug_set_timedelta_offset(timedelta_offset)
-
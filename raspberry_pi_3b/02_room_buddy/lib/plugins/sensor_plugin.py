@@ -0,0 +1,148 @@
+import asyncio
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from lib.metrics.metrics import REGISTRY
+from lib.plugins.plugin import PluginBase, ChangeDetected
+from lib.render.render import Widget
+from lib.weather_db.weather_db import initialize_database, add_database_entries, is_transient_error
+
+
+METRIC_DB_ROWS_WRITTEN = REGISTRY.counter("room_buddy_db_rows_written_total",
+                                          "Measurement rows written to the databases per plugin")
+
+# Maximum number of queued values per table that are kept to retry after a (transient) database error
+MAX_PENDING_ENTRIES = 1000
+
+
+@dataclass
+class SensorMeasurement:
+    id: str = field(metadata={"description": "Unique id of the measurement (e.g. 'dht22_temperature_celsius')"})
+    unit: str = field(metadata={"description": "Unit that is appended to the formatted value (e.g. '°C')"})
+    tolerance: float = field(metadata={"description": "Values that differ less are not considered a change"})
+    value_range: tuple[float, float] = field(metadata={"description": "Values outside of this range are ignored"})
+    table: str = field(metadata={"description": "Database table name"})
+    column: str = field(metadata={"description": "Database column name of the value"})
+    data_type: str = field(default="REAL", metadata={"description": "Database column data type"})
+    format_spec: str = field(default=".1f", metadata={"description": "Format specification of the value"})
+    scale: float = field(default=1, metadata={"description": "Value is divided by it before formatting"})
+
+
+class SensorPluginBase(PluginBase):
+    """
+    Base class for plugins that periodically acquire values of declared measurements.
+    It does the change detection (tolerance + range), the batched database persistence and the widget invalidation
+    so a sensor plugin only needs to implement `acquire` (update the measurements) and `create_widgets`.
+    """
+
+    def __init__(self, name: str, measurements: list[SensorMeasurement], database: Path, update_interval: float,
+                 **kwargs):
+        super().__init__(name, **kwargs)
+        self.measurements: dict[str, SensorMeasurement] = {measurement.id: measurement for measurement in measurements}
+        self.database = database
+        self.update_interval = update_interval
+        # Latest (changed) value and time per measurement
+        self.values: dict[str, tuple[float, datetime]] = {}
+        # Value per measurement when the widgets were requested the last time
+        self.rendered_values: dict[str, float] = {}
+        # Database entries that were not yet written
+        self.pending_entries: dict[tuple[str, str], list[tuple[datetime, float]]] = {}
+
+    def value_changed(self, measurement: SensorMeasurement, old_value: Optional[float], new_value: float) -> bool:
+        return old_value is None or abs(new_value - old_value) > measurement.tolerance
+
+    def value(self, measurement_id: str) -> Optional[float]:
+        value_time = self.values.get(measurement_id)
+        return None if value_time is None else value_time[0]
+
+    def format_value(self, measurement_id: str) -> str:
+        measurement = self.measurements[measurement_id]
+        return f"{self.value(measurement_id) / measurement.scale:{measurement.format_spec}}{measurement.unit}"
+
+    def update_measurement(self, measurement_id: str, value: float, time: datetime, persist: bool = True) -> bool:
+        """
+        Update the value of a measurement if it is in range and changed more than the tolerance.
+        Changed values are queued to be written to the database (if persist is True).
+        Returns True if the value changed.
+        """
+        measurement = self.measurements[measurement_id]
+        if not measurement.value_range[0] <= value <= measurement.value_range[1]:
+            self.logger.warning(f"[{measurement_id}] Ignore value outside of range {measurement.value_range}: {value}")
+            return False
+        if not self.value_changed(measurement, self.value(measurement_id), value):
+            return False
+        self.logger.info(f"[{measurement_id}] Detected change: {value=:{measurement.format_spec}}")
+        self.values[measurement_id] = value, time
+        if persist:
+            self.record_measurement(measurement_id, value, time)
+        return True
+
+    def record_measurement(self, measurement_id: str, value: float, time: datetime):
+        """Queue a value of a measurement to be written to the database (without change detection)"""
+        measurement = self.measurements[measurement_id]
+        self.pending_entries.setdefault((measurement.table, measurement.column), []).append((time, value))
+
+    def flush_measurements(self):
+        """Write all queued values to the database (a transaction per table)"""
+        if len(self.pending_entries) == 0:
+            return
+        try:
+            added, errors = add_database_entries(self.database, self.pending_entries)
+        except sqlite3.Error as e:
+            # e.g. the database can't be opened, all tables failed
+            added, errors = 0, {table_column: e for table_column in self.pending_entries}
+        pending_entries, self.pending_entries = self.pending_entries, {}
+        for (table, column), e in errors.items():
+            if not is_transient_error(e):
+                self.logger.error(f"Unable to add database entries to {table}.{column} (dropped): {e}")
+                continue
+            # Keep the queued values to retry with the next flush (duplicate entries are ignored), but only the
+            # latest ones so the queue does not grow without bound while the database stays unavailable
+            rows = pending_entries[(table, column)][-MAX_PENDING_ENTRIES:]
+            self.logger.warning(f"Unable to add database entries to {table}.{column} (retry {len(rows)} with the "
+                                f"next flush): {e}")
+            self.pending_entries[(table, column)] = rows
+        METRIC_DB_ROWS_WRITTEN.inc(added, plugin=self.name)
+        self.logger.debug(f"Added {added} database entries")
+
+    async def setup(self):
+        """Prepare the acquisition (overwrite to e.g. read environment variables or start a sensor thread)"""
+
+    async def teardown(self):
+        """Clean up after the acquisition stopped (overwrite to e.g. stop a sensor thread)"""
+
+    async def acquire(self):
+        """Acquire new values and update the measurements (overwrite, is called every update interval)"""
+        raise NotImplementedError("SensorPluginBase subclasses must implement 'acquire'")
+
+    def create_widgets(self) -> list[Widget]:
+        """Create the widgets of the measurements (overwrite, only called if all measurements have a value)"""
+        return []
+
+    async def run(self):
+        initialize_database(self.database, list({
+            (measurement.table, measurement.column, measurement.data_type)
+            for measurement in self.measurements.values()
+        }))
+        await self.setup()
+        try:
+            while True:
+                await self.acquire()
+                self.flush_measurements()
+                await asyncio.sleep(self.update_interval)
+        finally:
+            await self.teardown()
+
+    async def request_widgets(self):
+        if any(measurement_id not in self.values for measurement_id in self.measurements):
+            return [], ChangeDetected(False)
+        change_detected = ChangeDetected(False)
+        for measurement_id, measurement in self.measurements.items():
+            value = self.value(measurement_id)
+            if self.value_changed(measurement, self.rendered_values.get(measurement_id), value):
+                self.rendered_values[measurement_id] = value
+                change_detected = ChangeDetected(True)
+        return self.create_widgets(), change_detected
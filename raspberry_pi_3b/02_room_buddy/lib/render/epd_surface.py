@@ -0,0 +1,124 @@
+import weakref
+from collections import OrderedDict
+from typing import Optional
+
+# requires 'Pillow'
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+PANEL_ROTATIONS = {
+    0: None,
+    90: Image.Transpose.ROTATE_90,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_270,
+}
+"""Rotation of the content on the panel (degrees, counterclockwise like Image.rotate) -> transpose to the panel"""
+
+# Number of pasted images (e.g. the cached QR codes and icons) that are kept inverted and rotated (see `paste`)
+PREPARED_IMAGE_CACHE_SIZE = 32
+
+
+class EpdSurface:
+    """
+    Render target in the frame format of the e-paper display controller: 1 bit per pixel, MSB first, rows in the
+    scan order of the panel and 1 = black (inverted compared to PIL, where 0 is black).
+    The surface is drawn with inverted colors (`INK` = 255, `PAPER` = 0), so the packed PIL image already is the
+    controller format and `pack` only has to copy it into the preallocated frame (no getbuffer conversion).
+
+    A rotated panel (e.g. mounted in portrait) is handled at layout time: the content is laid out for `size`
+    (width and height swapped for 90 and 270 degrees) and drawn with `rectangle`, `text` and `paste`, which map the
+    layout coordinates to the panel and draw rotated glyphs (`ImageFont.TransposedFont`) and rotated images.
+    The image of the surface always has the panel size, so the pixels are never rotated when a frame is packed.
+    """
+    INK = 255
+    PAPER = 0
+
+    def __init__(self, panel_width: int, panel_height: int, rotation: int = 0):
+        if rotation not in PANEL_ROTATIONS:
+            raise ValueError(f"Unsupported panel rotation {rotation} (supported: {', '.join(map(str, PANEL_ROTATIONS))})")
+        if panel_width % 8 != 0:
+            raise ValueError(f"The panel width must be a multiple of 8 (packed rows), got {panel_width}")
+        self.panel_size = (panel_width, panel_height)
+        self.rotation = rotation
+        self.transpose = PANEL_ROTATIONS[rotation]
+        self.size = (panel_height, panel_width) if rotation in (90, 270) else (panel_width, panel_height)
+        self.image = Image.new("1", self.panel_size, self.PAPER)
+        self.buffer = bytearray(panel_width // 8 * panel_height)
+        # Sent as it is (spidev writebytes2 takes any buffer)
+        self.frame = memoryview(self.buffer)
+        # Inverted and rotated images by the id of the source image (a weak reference detects a reused id)
+        self.prepared_images: OrderedDict[int, tuple[weakref.ref, Image]] = OrderedDict()
+
+    def clear(self) -> Image:
+        """Clear the surface for the next frame and return the image to draw on (panel size)"""
+        self.image.paste(self.PAPER, (0, 0) + self.panel_size)
+        return self.image
+
+    def pack(self, image: Optional[Image] = None) -> memoryview:
+        """
+        Pack the surface (or another image of the panel size with the surface colors) into the frame.
+        The returned memoryview is overwritten by the next call.
+        """
+        image = self.image if image is None else image
+        self.buffer[:] = image.tobytes()
+        return self.frame
+
+    def unpack(self, frame: bytes | bytearray | memoryview) -> Image:
+        """Image (panel size, surface colors) of a packed frame, e.g. to redraw a part of it"""
+        return Image.frombytes("1", self.panel_size, bytes(frame))
+
+    def panel_box(self, box: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """Map a box of the layout (left, top, right, bottom, right and bottom exclusive) to the panel"""
+        left, top, right, bottom = box
+        width, height = self.size
+        if self.transpose == Image.Transpose.ROTATE_90:
+            return top, width - right, bottom, width - left
+        if self.transpose == Image.Transpose.ROTATE_180:
+            return width - right, height - bottom, width - left, height - top
+        if self.transpose == Image.Transpose.ROTATE_270:
+            return height - bottom, left, height - top, right
+        return box
+
+    def rectangle(self, image: Image, box: tuple[int, int, int, int], fill: int):
+        """Draw a filled rectangle (layout coordinates, inclusive like ImageDraw.rectangle)"""
+        left, top, right, bottom = self.panel_box((box[0], box[1], box[2] + 1, box[3] + 1))
+        ImageDraw.Draw(image).rectangle((left, top, right - 1, bottom - 1), fill=fill)
+
+    def text(self, image: Image, position: tuple[float, float], text: str, font: ImageFont, fill: int):
+        """Draw a text (layout coordinates, the position is truncated to full pixels on a rotated panel)"""
+        draw = ImageDraw.Draw(image)
+        if self.transpose is None:
+            draw.text(position, text, fill=fill, font=font)
+            return
+        if text == "":
+            return
+        # Layout box of the rasterized text (the mask ImageDraw.text pastes at the position + its offset)
+        x, y = int(position[0]), int(position[1])
+        left, top, right, bottom = font.getbbox(text, draw.fontmode)
+        panel_left, panel_top, _, _ = self.panel_box((x + left, y + top, x + right, y + bottom))
+        draw.text((panel_left, panel_top), text, fill=fill, font=ImageFont.TransposedFont(font, self.transpose))
+
+    def prepare_image(self, content: Image) -> Image:
+        """
+        Convert an image to 1-bit like Image.paste does, invert it to the surface colors and rotate it to the panel.
+        The result is cached for the image object (e.g. the cached QR codes), so it must not be modified.
+        """
+        key = id(content)
+        prepared = self.prepared_images.get(key)
+        if prepared is not None and prepared[0]() is content:
+            self.prepared_images.move_to_end(key)
+            return prepared[1]
+        # Converted before it is rotated (the dithering depends on the orientation)
+        image = ImageChops.invert(content.convert("1"))
+        if self.transpose is not None:
+            image = image.transpose(self.transpose)
+        self.prepared_images[key] = weakref.ref(content), image
+        if len(self.prepared_images) > PREPARED_IMAGE_CACHE_SIZE:
+            self.prepared_images.popitem(last=False)
+        return image
+
+    def paste(self, image: Image, content: Image, position: tuple[int, int]):
+        """Paste an image (layout coordinates of its top left corner, normal colors)"""
+        prepared = self.prepare_image(content)
+        x, y = position
+        left, top, _, _ = self.panel_box((x, y, x + content.width, y + content.height))
+        image.paste(prepared, (left, top))
@@ -1,15 +1,14 @@
 from datetime import date
 from pathlib import Path
 from dataclasses import dataclass, field
+import functools
 import os
 from typing import Callable, Optional, NewType
 
-# requires 'qrcode'
-import qrcode
 # requires 'Pillow'
 from PIL import Image, ImageDraw, ImageFont
-# requires 'cairosvg'
-import cairosvg
+
+from lib.render.epd_surface import EpdSurface
 
 
 Width = NewType('Width', int)
@@ -64,6 +63,9 @@ PILLOW_IMAGE_MODE_GRAYSCALE_BINARY = "1"
 ACTION_SPACING = 2
 WIDGET_SPACING = 2
 
+# Number of QR code images that are kept (see create_qr_code)
+QR_CODE_CACHE_SIZE = 32
+
 
 def get_text_dimensions(text_string, font) -> tuple[int, int]:
     if text_string == "":
@@ -74,7 +76,15 @@ def get_text_dimensions(text_string, font) -> tuple[int, int]:
     return text_width, text_height
 
 
-def render_display_bw(actions: list[Action], widgets: list[Widget], display_resolution: tuple[Width, Height]) -> Image:
+@functools.lru_cache(maxsize=None)
+def load_icon(icon_file: Path) -> Image:
+    """Load a cached icon once (converted to 1-bit like Image.paste does), it must not be modified"""
+    with Image.open(icon_file) as icon:
+        return icon.convert(PILLOW_IMAGE_MODE_GRAYSCALE_BINARY)
+
+
+def render_display_bw(actions: list[Action], widgets: list[Widget], display_resolution: tuple[Width, Height],
+                      surface: Optional[EpdSurface] = None) -> Image:
     """
     Create image (black and white)
 
@@ -91,13 +101,39 @@ def render_display_bw(actions: list[Action], widgets: list[Widget], display_reso
     :param actions: The actions to be rendered
     :param widgets: The widgets to be rendered
     :param display_resolution: The resolution of the display (in pixels)
-    :return: The generated image
+    :param surface: Draw into this surface in the display controller format instead of a new image
+                    (its layout size is used as resolution, the colors are inverted and a rotated panel is drawn
+                    rotated)
+    :return: The generated image (the image of the surface in the panel orientation if given)
     """
-    display_width, display_height = display_resolution
-
     # setup drawable image object
-    image = Image.new(PILLOW_IMAGE_MODE_GRAYSCALE_BINARY, display_resolution, COLOR_WHITE)
-    draw = ImageDraw.Draw(image)
+    if surface is None:
+        image = Image.new(PILLOW_IMAGE_MODE_GRAYSCALE_BINARY, display_resolution, COLOR_WHITE)
+        ink, paper = COLOR_BLACK, COLOR_WHITE
+        draw = ImageDraw.Draw(image)
+
+        def draw_rectangle(box: tuple[int, int, int, int], fill: int):
+            draw.rectangle(box, fill=fill)
+
+        def draw_text(position: tuple[float, float], text: str, font: ImageFont, fill: int):
+            draw.text(position, text=text, fill=fill, font=font)
+
+        def draw_image(content: Image, position: tuple[int, int]):
+            image.paste(content, position)
+    else:
+        display_resolution = surface.size
+        image = surface.clear()
+        ink, paper = surface.INK, surface.PAPER
+
+        def draw_rectangle(box: tuple[int, int, int, int], fill: int):
+            surface.rectangle(image, box, fill)
+
+        def draw_text(position: tuple[float, float], text: str, font: ImageFont, fill: int):
+            surface.text(image, position, text, font, fill)
+
+        def draw_image(content: Image, position: tuple[int, int]):
+            surface.paste(image, content, position)
+    display_width, display_height = display_resolution
 
     # setup fonts
     existing_font: Optional[ImageFont] = None
@@ -126,6 +162,8 @@ def render_display_bw(actions: list[Action], widgets: list[Widget], display_reso
             if not original_icon_file.exists():
                 raise RuntimeError(f"Could not find {original_icon_file=}")
             if not cached_icon_file.exists():
+                # requires 'cairosvg' (imported on first use since it is slow to import and only needed once per icon)
+                import cairosvg
                 with open(original_icon_file, "rb") as svg_file:
                     print(f"cairosvg {original_icon_file=} -> {cached_icon_file=}")
                     cairosvg.svg2png(file_obj=svg_file, write_to=str(cached_icon_file),
@@ -142,25 +180,23 @@ def render_display_bw(actions: list[Action], widgets: list[Widget], display_reso
             break
         action_icon, action_description, action_text = action.generate_content()
         # draw action bg
-        draw.rectangle((0, y_position, display_width, y_position + action_height),
-                       fill=COLOR_BLACK)
+        draw_rectangle((0, y_position, display_width, y_position + action_height), ink)
         x_position_action_content = calculated_font_spacings["big"]
         y_position_action_content = y_position + calculated_font_spacings["big"]
         # draw action icon
         if action_icon is not None and action_icon in loaded_icons:
-            image_action_icon = Image.open(loaded_icons[action_icon]["big"])
-            image.paste(image_action_icon, (x_position_action_content, y_position_action_content))
+            image_action_icon = load_icon(loaded_icons[action_icon]["big"])
+            draw_image(image_action_icon, (x_position_action_content, y_position_action_content))
             x_position_action_content += calculated_font_spacings["big"] + calculated_font_sizes["big"]
         # draw action description
         if action_description is not None:
             text_width_big, text_height_big = get_text_dimensions(action_text, loaded_fonts["big"])
             text_width, text_height = get_text_dimensions(action_description, loaded_fonts["text"])
-            draw.text((x_position_action_content, y_position_action_content + text_height_big - text_height),
-                      text=action_description, fill=COLOR_WHITE, font=loaded_fonts["text"])
+            draw_text((x_position_action_content, y_position_action_content + text_height_big - text_height),
+                      action_description, loaded_fonts["text"], paper)
             x_position_action_content += (calculated_font_spacings["text"] * 2 + text_width)
         # draw action text
-        draw.text((x_position_action_content, y_position_action_content),
-                  text=action_text, fill=COLOR_WHITE, font=loaded_fonts["big"])
+        draw_text((x_position_action_content, y_position_action_content), action_text, loaded_fonts["big"], paper)
         y_position += action_height + ACTION_SPACING
 
     # draw widgets
@@ -191,39 +227,49 @@ def render_display_bw(actions: list[Action], widgets: list[Widget], display_reso
                     "A" + content.text, loaded_fonts["big"]
                 )
                 text_width, text_height = get_text_dimensions(content.description, loaded_fonts["text"])
-                draw.text((x_position_widget_content_element, y_position_widget_content + text_height_big - text_height + 4),
-                          text=content.description, fill=COLOR_BLACK, font=loaded_fonts["text"])
+                draw_text((x_position_widget_content_element, y_position_widget_content + text_height_big - text_height + 4),
+                          content.description, loaded_fonts["text"], ink)
                 x_position_widget_content_element += (calculated_font_spacings["text"] * 2 + text_width)
             # draw widget text
-            draw.text((x_position_widget_content_element, y_position_widget_content),
-                      text=content.text, fill=COLOR_BLACK, font=loaded_fonts["big"])
+            draw_text((x_position_widget_content_element, y_position_widget_content), content.text, loaded_fonts["big"],
+                      ink)
             y_position_widget_content += calculated_font_spacings["big"] + calculated_font_sizes["big"]
             if content.images is not None and len(content.images) > 0:
                 for content_image in content.images:
-                    image.paste(content_image, (x_position_widget_content_element, int(y_position_widget_content)))
+                    draw_image(content_image, (x_position_widget_content_element, int(y_position_widget_content)))
                     x_position_widget_content_element += content_image.width
         y_position += widget_height + WIDGET_SPACING
 
     return image
 
+@functools.lru_cache(maxsize=QR_CODE_CACHE_SIZE)
 def create_qr_code(content: str, size: int) -> Image:
-    data = content
-    desired_size = size
-    # Calculate appropriate box_size and border
-    box_size = desired_size // 41  # Approximation (maximum QR size is 41x41 for version 1)
-    border = 4  # Standard minimum border size
+    """
+    Create a QR code image (mode "1", size x size pixels) that can be pasted into the display image.
+    The images are cached by (content, size) and shared by all plugins, so they must not be modified.
+    """
+    # requires 'qrcode' (imported on first use since most plugins don't need it)
+    import qrcode
     qr = qrcode.QRCode(
         version=1,  # Size of QR code (higher version = more data capacity)
         error_correction=qrcode.constants.ERROR_CORRECT_L,
-        box_size=box_size,
-        border=border
+        box_size=1,
+        border=4  # Standard minimum border size
     )
-    # Add data and create image
-    qr.add_data(data)
+    qr.add_data(content)
     qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-    # Ensure exact dimensions
-    img = img.resize((desired_size, desired_size))
-    new_img = Image.new("RGB", img.size, "white")
-    new_img.paste(img, (0, 0))
-    return new_img
\ No newline at end of file
+    # One pixel per module (including the border)
+    matrix = qr.get_matrix()
+    modules = len(matrix)
+    img = Image.new(PILLOW_IMAGE_MODE_GRAYSCALE_BINARY, (modules, modules), COLOR_WHITE)
+    img.putdata([COLOR_BLACK if module else COLOR_WHITE for row in matrix for module in row])
+    # Scale by an integer factor (nearest neighbor keeps the modules sharp and equally sized)
+    scale = max(size // modules, 1)
+    img = img.resize((modules * scale, modules * scale), Image.Resampling.NEAREST)
+    if img.width > size:
+        # Content too long for the size (unlikely to be readable)
+        return img.resize((size, size), Image.Resampling.NEAREST)
+    # Center it on an image with the exact dimensions
+    qr_code_image = Image.new(PILLOW_IMAGE_MODE_GRAYSCALE_BINARY, (size, size), COLOR_WHITE)
+    qr_code_image.paste(img, ((size - img.width) // 2, (size - img.height) // 2))
+    return qr_code_image
@@ -0,0 +1,102 @@
+import asyncio
+import heapq
+import itertools
+from datetime import datetime, timedelta
+from logging import Logger
+from typing import Callable, Optional
+
+from lib.clock.clock import Clock
+
+# The wall clock can jump (e.g. NTP synchronization after booting) so the next deadline is rechecked at least this often
+MAX_SLEEP = timedelta(minutes=15)
+
+
+class ScheduledCall:
+    """Handle of a callback registered at the scheduler (can be used to cancel it)"""
+
+    def __init__(self, deadline: datetime, callback: Callable[[], None], name: str):
+        self.deadline = deadline
+        self.callback = callback
+        self.name = name
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class DeadlineScheduler:
+    """
+    Calls callbacks at (wall clock) deadlines.
+    All deadlines are kept in a heap and the scheduler only sleeps until the next one instead of polling.
+    The scheduler is shared between all plugins and needs to be run as a task (see `run`).
+    """
+
+    def __init__(self, logger: Logger, clock: Optional[Clock] = None):
+        self.logger = logger
+        self.clock = clock or Clock()
+        self.heap: list[tuple[datetime, int, ScheduledCall]] = []
+        self.counter = itertools.count()
+        self.changed = asyncio.Event()
+
+    def call_at(self, deadline: datetime, callback: Callable[[], None], name: str = "") -> ScheduledCall:
+        """Call the callback (once) when the deadline is reached"""
+        scheduled_call = ScheduledCall(deadline, callback, name)
+        heapq.heappush(self.heap, (deadline, next(self.counter), scheduled_call))
+        # Wake up the scheduler in case the new deadline is earlier than the one it sleeps until
+        self.changed.set()
+        return scheduled_call
+
+    def call_later(self, delay: timedelta, callback: Callable[[], None], name: str = "") -> ScheduledCall:
+        """Call the callback (once) after the delay"""
+        return self.call_at(self.clock.now() + delay, callback, name)
+
+    async def sleep_until(self, deadline: datetime, wakeup: Optional[asyncio.Event] = None) -> bool:
+        """
+        Sleep until the deadline is reached or until the (optional) wakeup event is set.
+        Returns True if the deadline was reached.
+        The wakeup event is not cleared (a wakeup that was set before returns immediately), the caller has to clear it
+        after it consumed the wakeup.
+        """
+        wakeup = wakeup or asyncio.Event()
+        deadline_reached = False
+
+        def reached():
+            nonlocal deadline_reached
+            deadline_reached = True
+            wakeup.set()
+
+        scheduled_call = self.call_at(deadline, reached, name=f"sleep until {deadline}")
+        try:
+            await wakeup.wait()
+        finally:
+            scheduled_call.cancel()
+        return deadline_reached
+
+    def next_deadline(self) -> Optional[datetime]:
+        # Drop cancelled calls so they don't cause wakeups
+        while len(self.heap) > 0 and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if len(self.heap) > 0 else None
+
+    def run_due(self, now: datetime):
+        """Run all callbacks which deadline was reached"""
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            _, _, scheduled_call = heapq.heappop(self.heap)
+            if scheduled_call.cancelled:
+                continue
+            try:
+                scheduled_call.callback()
+            except Exception as e:
+                self.logger.error(f"[Scheduler] Error in '{scheduled_call.name}': {e}")
+
+    async def run(self):
+        """Run the callbacks when their deadline is reached (forever loop)"""
+        while True:
+            self.changed.clear()
+            self.run_due(self.clock.now())
+            next_deadline = self.next_deadline()
+            timeout = MAX_SLEEP if next_deadline is None else min(next_deadline - self.clock.now(), MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self.changed.wait(), timeout=max(timeout.total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
@@ -7,3 +7,15 @@ RelativeHumidityPercent = NewType('RelativeHumidityPercent', float)
 DHT22_UPDATE_FREQUENCY = FrequencyHertz(0.5)
 DHT22_TOLERANCE_TEMPERATURE = TemperatureCelsius(0.5)
 DHT22_TOLERANCE_HUMIDITY = RelativeHumidityPercent(2)
+DHT22_MEDIAN_COUNT = 5
+
+
+def read_dht22(dht_sensor) -> tuple[TemperatureCelsius, RelativeHumidityPercent]:
+    """
+    Blocking read of an 'adafruit_dht.DHT22' sensor (can take hundreds of ms).
+    Raises RuntimeError if the read failed (e.g. checksum errors) so it can be retried.
+    """
+    temperature, humidity = dht_sensor.temperature, dht_sensor.humidity
+    if temperature is None or humidity is None:
+        raise RuntimeError("DHT22 returned no data")
+    return TemperatureCelsius(temperature), RelativeHumidityPercent(humidity)
@@ -0,0 +1,154 @@
+import asyncio
+import random
+import statistics
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from logging import Logger, LoggerAdapter
+from typing import Callable, Optional
+
+from lib.clock.clock import Clock
+
+
+@dataclass
+class SensorSample:
+    values: tuple[float, ...] = field(metadata={"description": "Median of the last good readings (per value)"})
+    time: datetime = field(metadata={"description": "Time of the last good reading"})
+
+
+class ThreadedSensor:
+    """
+    Reads a sensor with a blocking read function (e.g. a bit-banged protocol) on a dedicated thread so it never
+    stalls the asyncio loop.
+    Failed reads (the read function raises, e.g. a RuntimeError for a checksum error) are retried with a jittered
+    exponential backoff and the returned sample is the median of the last N good readings to filter outliers.
+    The (optional) release function is called on the thread after its loop ended, so the sensor (e.g. its GPIO pin)
+    is never freed while a read is still running.
+    """
+
+    def __init__(self, name: str, read: Callable[[], tuple[float, ...]], logger: Logger | LoggerAdapter,
+                 interval: float, median_count: int = 5, retries: int = 3,
+                 retry_delay: float = 2.0, retry_delay_max: float = 30.0, clock: Optional[Clock] = None,
+                 release: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.clock = clock or Clock()
+        self.read_function = read
+        self.release_function = release
+        self.logger = logger
+        self.interval = interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.retry_delay_max = retry_delay_max
+        self.readings: deque[tuple[float, ...]] = deque(maxlen=median_count)
+        self.latest: Optional[SensorSample] = None
+        self.counter_good = 0
+        self.counter_error = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        # Futures of coroutines that wait for the first sample
+        self.waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def start(self):
+        if self.thread is not None:
+            return
+        # A new event per thread, so a thread that is still finishing a read after stop() keeps its stop signal
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"sensor {self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Signal the thread to stop (without joining it, this is called on the event loop and a read can block)"""
+        self.stop_event.set()
+        self.thread = None
+
+    async def stop_and_wait(self, timeout: float):
+        """Signal the thread to stop and wait (without blocking the loop) until it ended and released the sensor"""
+        thread = self.thread
+        self.stop()
+        if thread is None:
+            return
+        await asyncio.to_thread(thread.join, timeout)
+        if thread.is_alive():
+            self.logger.warning(f"[{self.name}] Thread did not stop within {timeout}s (releases the sensor when done)")
+
+    def acquire(self, stop_event: threading.Event) -> Optional[tuple[float, ...]]:
+        """Read the sensor (blocking) and retry failed reads"""
+        for attempt in range(self.retries + 1):
+            try:
+                values = tuple(self.read_function())
+                self.counter_good += 1
+                return values
+            except Exception as e:
+                self.counter_error += 1
+                # Exponential backoff with jitter so the retries don't lock into a bad timing
+                delay = min(self.retry_delay * 2 ** attempt, self.retry_delay_max) * random.uniform(0.5, 1.5)
+                if isinstance(e, RuntimeError):
+                    # Expected from time to time (e.g. DHT22 checksum or timing errors)
+                    self.logger.debug(f"[{self.name}] Read failed ({attempt=}, retry in {delay:.1f}s): {e}")
+                else:
+                    self.logger.warning(f"[{self.name}] Read failed ({attempt=}, retry in {delay:.1f}s): {e!r}")
+                if stop_event.wait(delay):
+                    break
+        return None
+
+    def update(self, values: tuple[float, ...]):
+        """Add a good reading and resolve the coroutines that wait for a sample"""
+        with self.lock:
+            self.readings.append(values)
+            self.latest = SensorSample(
+                values=tuple(statistics.median(reading[i] for reading in self.readings)
+                             for i in range(len(values))),
+                time=self.clock.now(),
+            )
+            sample = self.latest
+            waiters, self.waiters = self.waiters, []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self.resolve_waiter, future, sample)
+
+    def run(self):
+        """Thread loop: read the sensor every interval and update the latest sample"""
+        stop_event = self.stop_event
+        try:
+            while not stop_event.is_set():
+                values = self.acquire(stop_event)
+                if values is not None:
+                    try:
+                        self.update(values)
+                    except Exception as e:
+                        # e.g. a reading with another number of values, start over instead of ending the thread
+                        self.logger.exception(f"[{self.name}] Unable to process reading {values}: {e!r}")
+                        with self.lock:
+                            self.readings.clear()
+                else:
+                    self.logger.warning(f"[{self.name}] Failed to read data after {self.retries + 1} attempts")
+                stop_event.wait(self.interval)
+        finally:
+            if self.release_function is not None:
+                try:
+                    self.release_function()
+                except Exception as e:
+                    self.logger.exception(f"[{self.name}] Unable to release the sensor: {e!r}")
+
+    @staticmethod
+    def resolve_waiter(future: asyncio.Future, sample: SensorSample):
+        if not future.done():
+            future.set_result(sample)
+
+    async def read(self, timeout: Optional[float] = None) -> Optional[SensorSample]:
+        """
+        Get the latest (filtered) sample without blocking the loop.
+        Waits for the first good reading if there is none yet (returns None on timeout).
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.latest is not None:
+                return self.latest
+            future = loop.create_future()
+            self.waiters.append((loop, future))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return None
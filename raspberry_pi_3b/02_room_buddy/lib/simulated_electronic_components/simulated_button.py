@@ -1,14 +1,15 @@
+import asyncio
 import time
-from threading import Thread, Event
 
 
 class SimulatedButton:
     """Simulates a button."""
     def __init__(self, pin):
         self.pin = pin
-        self._when_pressed = None
-        self._when_released = None
+        self.when_pressed = None
+        self.when_released = None
         self._is_pressed = False
+        self.press_count = 0
         print(f"Simulated Button initialized on pin {pin}")
 
     @property
@@ -17,21 +18,26 @@ class SimulatedButton:
 
     @is_pressed.setter
     def is_pressed(self, value):
+        if value and not self._is_pressed:
+            # Every press is counted (also if no callback is assigned to handle it)
+            self.press_count += 1
         self._is_pressed = value
-        if value and self._when_pressed:
-            self._when_pressed()
-        elif not value and self._when_released:
-            self._when_released()
+        # Like gpiozero the callbacks are assigned as attributes (e.g. `button.when_pressed = callback`)
+        if value and self.when_pressed:
+            self.when_pressed()
+        elif not value and self.when_released:
+            self.when_released()
 
-    def when_pressed(self, callback):
-        self._when_pressed = callback
-
-    def when_released(self, callback):
-        self._when_released = callback
-
-    def simulate_press(self):
-        """Simulate a button press."""
+    def simulate_press(self, duration: float = 0.1):
+        """Simulate a button press (the release is scheduled on the running loop instead of blocking it)."""
         print("Simulated button press.")
         self.is_pressed = True
-        time.sleep(0.1)  # Simulate press duration
+        try:
+            asyncio.get_running_loop().call_later(duration, self.simulate_release)
+        except RuntimeError:
+            # Not called from the loop thread
+            time.sleep(duration)
+            self.simulate_release()
+
+    def simulate_release(self):
         self.is_pressed = False
@@ -1,6 +1,16 @@
+from datetime import datetime
+from typing import Optional
+
+from lib.clock.clock import Clock
+
+
 class SimulatedRGBLED:
     """Simulates an RGB LED."""
-    def __init__(self, rgb_pins: tuple[int, int, int]):
+    def __init__(self, rgb_pins: tuple[int, int, int], clock: Optional[Clock] = None):
+        self.clock = clock or Clock()
+        # Time and color of every change (e.g. to check a simulation)
+        self.history: list[tuple[datetime, tuple[float, float, float]]] = []
+        self._color = None
         self.color = (0, 0, 0)  # Initial color (off)
         self.red_pin, self.green_pin, self.blue_pin = rgb_pins
         print(f"Simulated RGBLED initialized on pins: {rgb_pins}")
@@ -11,5 +21,9 @@ class SimulatedRGBLED:
 
     @color.setter
     def color(self, value):
+        # Plugins set the color on every request, only changes are relevant
+        if value == self._color:
+            return
         self._color = value
+        self.history.append((self.clock.now(), value))
         print(f"Simulated RGBLED color set to R:{value[0]:.2f}, G:{value[1]:.2f}, B:{value[2]:.2f}")
@@ -0,0 +1,77 @@
+import asyncio
+import selectors
+import time
+from typing import Optional
+
+from lib.clock.clock import VirtualClock
+
+
+class VirtualTimeSelector(selectors.BaseSelector):
+    """
+    Selector of the `VirtualTimeEventLoop`.
+    Instead of blocking until the next timer is due it advances the virtual clock to it, unless real work is pending
+    (executor jobs or I/O like HTTP requests). Then it blocks for real and the real duration is added to the clock.
+    """
+
+    def __init__(self, loop: "VirtualTimeEventLoop"):
+        self.loop = loop
+        self.selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self.selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self.selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self.selector.modify(fileobj, events, data)
+
+    def get_map(self):
+        return self.selector.get_map()
+
+    def close(self):
+        self.selector.close()
+
+    def real_work_pending(self) -> bool:
+        # The loop always has its self-pipe registered (used by call_soon_threadsafe)
+        return self.loop.pending_executor_jobs > 0 or len(self.selector.get_map()) > 1
+
+    def select(self, timeout: Optional[float] = None):
+        if timeout is not None and timeout <= 0:
+            return self.selector.select(0)
+        if self.real_work_pending() or timeout is None:
+            # Nothing is scheduled (timeout None) means only another thread can wake up the loop
+            start_time = time.perf_counter()
+            ready = self.selector.select(timeout)
+            self.loop.clock.advance(time.perf_counter() - start_time)
+            return ready
+        ready = self.selector.select(0)
+        if len(ready) == 0:
+            self.loop.clock.advance(timeout)
+        return ready
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop that runs on the time of a `VirtualClock` so `asyncio.sleep`, `wait_for` timeouts and the
+    scheduler deadlines pass instantly when nothing else is to do (e.g. a week of plugin behavior in seconds).
+    Jobs of `asyncio.to_thread` (executor) are waited for in real time.
+    Threads that are not started by the loop (e.g. `ThreadedSensor`) don't hold back the virtual time.
+    """
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.pending_executor_jobs = 0
+        super().__init__(selector=VirtualTimeSelector(self))
+
+    def time(self) -> float:
+        return self.clock.monotonic()
+
+    def run_in_executor(self, executor, func, *args):
+        future = super().run_in_executor(executor, func, *args)
+        self.pending_executor_jobs += 1
+        future.add_done_callback(self.executor_job_done)
+        return future
+
+    def executor_job_done(self, future: asyncio.Future):
+        self.pending_executor_jobs -= 1
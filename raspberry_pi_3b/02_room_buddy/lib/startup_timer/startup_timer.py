@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class StartupTimer:
+    """
+    Measures the durations of the startup phases (e.g. imports, hardware init, plugin loading, first frame).
+    Sequential phases are measured with `mark` (time since the previous mark), phases that run in the background
+    (overlapping others) with the `phase` context manager.
+    """
+
+    def __init__(self):
+        self.start_time = perf_counter()
+        self.last_mark_time = self.start_time
+        self.phases: list[tuple[str, float]] = []
+        self.reported = False
+
+    def mark(self, name: str):
+        """End a sequential phase"""
+        now = perf_counter()
+        self.phases.append((name, now - self.last_mark_time))
+        self.last_mark_time = now
+
+    @contextmanager
+    def phase(self, name: str):
+        """Measure a phase that may overlap with others (it is not part of the sequential phases)"""
+        start_time = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((f"{name} (overlapped)", perf_counter() - start_time))
+
+    def report(self) -> str:
+        self.reported = True
+        lines = [f"{name:<40} {duration * 1000:8.1f} ms" for name, duration in self.phases]
+        lines.append(f"{'total':<40} {(perf_counter() - self.start_time) * 1000:8.1f} ms")
+        return "Startup timing:\n" + "\n".join(lines)
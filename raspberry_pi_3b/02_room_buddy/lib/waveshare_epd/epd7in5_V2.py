@@ -41,6 +41,9 @@ GRAY2  = 0xC0
 GRAY3  = 0x80 #gray
 GRAY4  = 0x00 #Blackest
 
+# Translation table that inverts every byte (bytes.translate runs in C, no per-byte Python loop)
+INVERT_TABLE = bytes(range(0xFF, -1, -1))
+
 logger = logging.getLogger(__name__)
 
 class EPD:
@@ -55,6 +58,8 @@ class EPD:
         self.GRAY2  = GRAY2
         self.GRAY3  = GRAY3 #gray
         self.GRAY4  = GRAY4 #Blackest
+        # Bytes sent over SPI (commands + data, read by the metrics when they are collected)
+        self.spi_bytes_sent = 0
     
     # Hardware reset
     def reset(self):
@@ -70,18 +75,29 @@ class EPD:
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([command])
         epdconfig.digital_write(self.cs_pin, 1)
+        self.spi_bytes_sent += 1
 
     def send_data(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
         epdconfig.spi_writebyte([data])
         epdconfig.digital_write(self.cs_pin, 1)
+        self.spi_bytes_sent += 1
 
+    # data: bytes, bytearray or memoryview (sent without conversion) or a list
     def send_data2(self, data):
         epdconfig.digital_write(self.dc_pin, 1)
         epdconfig.digital_write(self.cs_pin, 0)
-        epdconfig.SPI.writebytes2(data)
+        epdconfig.spi_writebyte2(data)
         epdconfig.digital_write(self.cs_pin, 1)
+        self.spi_bytes_sent += len(data)
+
+    # Command followed by its parameters with a single DC transition (instead of a transaction per byte)
+    def send_command_data(self, command, data):
+        epdconfig.digital_write(self.cs_pin, 0)
+        epdconfig.spi_write_command(command, data)
+        epdconfig.digital_write(self.cs_pin, 1)
+        self.spi_bytes_sent += 1 + len(data)
 
     def ReadBusy(self):
         logger.debug("e-Paper busy")
@@ -99,46 +115,29 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0x06)     # btst
-        self.send_data(0x17)
-        self.send_data(0x17)
-        self.send_data(0x28)        # If an exception is displayed, try using 0x38
-        self.send_data(0x17)
+        self.send_command_data(0x06, b'\x17\x17\x28\x17')  # btst (If an exception is displayed, try using 0x38 as 3rd byte)
         
-        self.send_command(0x01)			#POWER SETTING
-        self.send_data(0x07)
-        self.send_data(0x07)    #VGH=20V,VGL=-20V
-        self.send_data(0x28)		#VDH=15V
-        self.send_data(0x17)		#VDL=-15V
+        self.send_command_data(0x01, b'\x07\x07\x28\x17')  #POWER SETTING VGH=20V,VGL=-20V VDH=15V VDL=-15V
 
         self.send_command(0x04) #POWER ON
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_data(0X00, b'\x1F')  #PANNEL SETTING KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
 
-        self.send_command(0x61)        	#tres
-        self.send_data(0x03)		#source 800
-        self.send_data(0x20)
-        self.send_data(0x01)		#gate 480
-        self.send_data(0xE0)
+        self.send_command_data(0x61, b'\x03\x20\x01\xE0')  #tres source 800 gate 480
 
-        self.send_command(0X15)
-        self.send_data(0x00)
+        self.send_command_data(0X15, b'\x00')
 
         # If the screen appears gray, use the annotated initialization command
-        self.send_command(0X50)
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send_command_data(0X50, b'\x10\x07')
         # self.send_command(0X50)
         # self.send_data(0x10)
         # self.send_data(0x17)
         # self.send_command(0X52)		
         # self.send_data(0x03)
 
-        self.send_command(0X60)			#TCON SETTING
-        self.send_data(0x22)
+        self.send_command_data(0X60, b'\x22')  #TCON SETTING
 
         # EPD hardware init end
         return 0
@@ -149,13 +148,10 @@ class EPD:
         # EPD hardware init start
         self.reset()
         
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_data(0X00, b'\x1F')  #PANNEL SETTING KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
 
         # If the screen appears gray, use the annotated initialization command
-        self.send_command(0X50)
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send_command_data(0X50, b'\x10\x07')
         # self.send_command(0X50)
         # self.send_data(0x10)
         # self.send_data(0x17)
@@ -167,16 +163,10 @@ class EPD:
         self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
 
         #Enhanced display drive(Add 0x06 command)
-        self.send_command(0x06)			#Booster Soft Start 
-        self.send_data (0x27)
-        self.send_data (0x27)   
-        self.send_data (0x18)		
-        self.send_data (0x17)		
+        self.send_command_data(0x06, b'\x27\x27\x18\x17')  #Booster Soft Start
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x5A)
+        self.send_command_data(0xE0, b'\x02')
+        self.send_command_data(0xE5, b'\x5A')
 
         # EPD hardware init end
         return 0
@@ -187,17 +177,14 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_data(0X00, b'\x1F')  #PANNEL SETTING KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
 
         self.send_command(0x04) #POWER ON
         epdconfig.delay_ms(100) 
         self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x6E)
+        self.send_command_data(0xE0, b'\x02')
+        self.send_command_data(0xE5, b'\x6E')
 
         # EPD hardware init end
         return 0
@@ -209,28 +196,19 @@ class EPD:
         # EPD hardware init start
         self.reset()
 
-        self.send_command(0X00)			#PANNEL SETTING
-        self.send_data(0x1F)   #KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
+        self.send_command_data(0X00, b'\x1F')  #PANNEL SETTING KW-3f   KWR-2F	BWROTP 0f	BWOTP 1f
         
-        self.send_command(0X50)
-        self.send_data(0x10)
-        self.send_data(0x07)
+        self.send_command_data(0X50, b'\x10\x07')
 
         self.send_command(0x04) #POWER ON
         epdconfig.delay_ms(100) 
         self.ReadBusy()        #waiting for the electronic paper IC to release the idle signal
 
         #Enhanced display drive(Add 0x06 command)
-        self.send_command(0x06)			#Booster Soft Start 
-        self.send_data (0x27)
-        self.send_data (0x27)   
-        self.send_data (0x18)		
-        self.send_data (0x17)	
+        self.send_command_data(0x06, b'\x27\x27\x18\x17')  #Booster Soft Start
 
-        self.send_command(0xE0)
-        self.send_data(0x02)
-        self.send_command(0xE5)
-        self.send_data(0x5F)
+        self.send_command_data(0xE0, b'\x02')
+        self.send_command_data(0xE5, b'\x5F')
 
         # EPD hardware init end
         return 0
@@ -248,12 +226,9 @@ class EPD:
             # return a blank buffer
             return [0x00] * (int(self.width/8) * self.height)
 
-        buf = bytearray(img.tobytes('raw'))
         # The bytes need to be inverted, because in the PIL world 0=black and 1=white, but
         # in the e-paper world 0=white and 1=black.
-        for i in range(len(buf)):
-            buf[i] ^= 0xFF
-        return buf
+        return img.tobytes('raw').translate(INVERT_TABLE)
     
     def getbuffer_4Gray(self, image):
         # logger.debug("bufsiz = ",int(self.width/8) * self.height)
@@ -297,25 +272,21 @@ class EPD:
         else:
             Width = self.width // 8 +1
         Height = self.height
-        image1 = [0xFF] * int(self.width * self.height / 8)
-        for j in range(Height):
-                for i in range(Width):
-                    image1[i + j * Width] = ~image[i + j * Width]
-        self.send_command(0x10)
-        self.send_data2(image1)
+        # A packed frame (bytes or a memoryview of a render surface) is sent as it is, only the inverted copy is built
+        if not isinstance(image, (bytes, bytearray, memoryview)):
+            image = bytes(image)
+        image = memoryview(image)[:Width * Height]
+        self.send_command_data(0x10, image.tobytes().translate(INVERT_TABLE))
 
-        self.send_command(0x13)
-        self.send_data2(image)
+        self.send_command_data(0x13, image)
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
     def Clear(self):
-        self.send_command(0x10)
-        self.send_data2([0xFF] * int(self.width * self.height / 8))
-        self.send_command(0x13)
-        self.send_data2([0x00] * int(self.width * self.height / 8))
+        self.send_command_data(0x10, b'\xFF' * int(self.width * self.height / 8))
+        self.send_command_data(0x13, b'\x00' * int(self.width * self.height / 8))
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
@@ -335,39 +306,27 @@ class EPD:
         Width = (Xend - Xstart) // 8
         Height = Yend - Ystart
 	
-        self.send_command(0x50)
-        self.send_data(0xA9)
-        self.send_data(0x07)
+        self.send_command_data(0x50, b'\xA9\x07')
 
         self.send_command(0x91)		#This command makes the display enter partial mode
-        self.send_command(0x90)		#resolution setting
-        self.send_data (Xstart//256)
-        self.send_data (Xstart%256)   #x-start    
+        self.send_command_data(0x90, bytes([		#resolution setting
+            Xstart//256, Xstart%256,            #x-start
+            (Xend-1)//256, (Xend-1)%256,        #x-end
+            Ystart//256, Ystart%256,            #y-start
+            (Yend-1)//256, (Yend-1)%256,        #y-end
+            0x01]))
 
-        self.send_data ((Xend-1)//256)		
-        self.send_data ((Xend-1)%256)  #x-end	
+        image1 = bytes(Image[:Width * Height]).translate(INVERT_TABLE)
+        image1 += b'\xFF' * (int(self.width * self.height / 8) - len(image1))
 
-        self.send_data (Ystart//256)  #
-        self.send_data (Ystart%256)   #y-start    
-
-        self.send_data ((Yend-1)//256)		
-        self.send_data ((Yend-1)%256)  #y-end
-        self.send_data (0x01)
-
-        image1 = [0xFF] * int(self.width * self.height / 8)
-        for j in range(Height):
-                for i in range(Width):
-                    image1[i + j * Width] = ~Image[i + j * Width]
-
-        self.send_command(0x13)   #Write Black and White image to RAM
-        self.send_data2(image1)
+        self.send_command_data(0x13, image1)   #Write Black and White image to RAM
 
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
     def display_4Gray(self, image):
-        self.send_command(0x10)
+        buf = bytearray()
         for i in range(0, 48000):     
             temp3=0
             for j in range(0, 2):
@@ -397,9 +356,11 @@ class EPD:
                     if(j!=1 or k!=1):				
                         temp3 <<= 1
                     temp1 <<= 2
-            self.send_data(temp3)
+            buf.append(temp3)
+        self.send_command_data(0x10, buf)
+
             
-        self.send_command(0x13)	       
+        buf = bytearray()
         for i in range(0, 48000):       
             temp3=0
             for j in range(0, 2):
@@ -429,21 +390,20 @@ class EPD:
                     if(j!=1 or k!=1):					
                         temp3 <<= 1
                     temp1 <<= 2
-            self.send_data(temp3)
+            buf.append(temp3)
+        self.send_command_data(0x13, buf)
         
         self.send_command(0x12)
         epdconfig.delay_ms(100)
         self.ReadBusy()
 
     def sleep(self):
-        self.send_command(0x50)
-        self.send_data(0XF7)
+        self.send_command_data(0x50, b'\xF7')
         
         self.send_command(0x02) # POWER_OFF
         self.ReadBusy()
         
-        self.send_command(0x07) # DEEP_SLEEP
-        self.send_data(0XA5)
+        self.send_command_data(0x07, b'\xA5') # DEEP_SLEEP
         
         epdconfig.delay_ms(2000)
         epdconfig.module_exit()
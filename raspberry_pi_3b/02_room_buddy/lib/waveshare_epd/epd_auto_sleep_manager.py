@@ -1,93 +1,264 @@
+import functools
 import threading
 from datetime import datetime, timedelta
 from typing import Optional
 
 # requires 'Pillow'
-from PIL import ImageChops, Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw, ImageFont
 
+from lib.metrics.metrics import REGISTRY
+from lib.render.epd_surface import EpdSurface
 from lib.waveshare_epd.epd7in5_V2 import EPD
+from lib.waveshare_epd.refresh_policy import RefreshPolicy, RefreshMode, REFRESH_FULL, REFRESH_FAST, REFRESH_PARTIAL, \
+    changed_pixels
 
+METRIC_BUFFER_SECONDS = REGISTRY.histogram("room_buddy_display_buffer_conversion_seconds",
+                                           "Duration of the image to display buffer conversion "
+                                           "(getbuffer or packing the render surface)")
+METRIC_REFRESH_SECONDS = REGISTRY.histogram("room_buddy_display_refresh_seconds",
+                                            "Duration of the display refreshes (SPI transfer + busy)")
+METRIC_REFRESHES = REGISTRY.counter("room_buddy_display_refreshes_total", "Display refreshes per mode")
 
-def add_text_to_image(image: Image, text, font_path=None, font_size=20, text_color=0) -> Image:
+
+@functools.cache
+def load_font(font_path=None, font_size=20) -> ImageFont:
+    """Load a font once (the status line is stamped on every display update)"""
+    return ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default()
+
+
+def add_text_to_image(image: Image, text, font_path=None, font_size=20, text_color=0,
+                      surface: Optional[EpdSurface] = None) -> Image:
     """
-    Adds text to the bottom-right corner of a PIL.Image.
+    Adds text to the bottom-right corner of a PIL.Image (an image of the surface in the panel orientation if given).
     """
     # Create a drawing context
     draw = ImageDraw.Draw(image)
 
     # Load the font
-    font = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default()
+    font = load_font(font_path, font_size)
 
     # Get the size of the text
     bbox = draw.textbbox((0, 0), text, font=font)
     text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
 
-    # Calculate the position for the bottom-right corner
-    x = image.width - text_width - 10  # 10px padding from the right edge
-    y = image.height - text_height - 10  # 10px padding from the bottom edge
+    # Calculate the position for the bottom-right corner (of the layout on a surface)
+    width, height = image.size if surface is None else surface.size
+    x = width - text_width - 10  # 10px padding from the right edge
+    y = height - text_height - 10  # 10px padding from the bottom edge
 
     # Add the text to the image
-    draw.text((x, y), text, fill=text_color, font=font)
+    if surface is None:
+        draw.text((x, y), text, fill=text_color, font=font)
+    else:
+        surface.text(image, (x, y), text, font, text_color)
 
     return image
 
 
 class EPaperDisplayManager:
-    def __init__(self, epd: EPD):
+    def __init__(self, epd: EPD, refresh_policy: Optional[RefreshPolicy] = None):
         self.epd = epd
+        self.refresh_policy = refresh_policy or RefreshPolicy()
+        # Refresh mode the display controller is initialized for (None if it is sleeping)
+        self.initialized_mode: Optional[RefreshMode] = None
+        # The display is updated from the loop and from the timers
+        self.lock = threading.RLock()
+        self.ghost_clearing_timer: Optional[threading.Timer] = None
         self.last_displayed_image: Optional[Image] = None
+        # Surface of the displayed frame if it was rendered in the display format (see update_surface)
+        self.last_surface: Optional[EpdSurface] = None
+        # Two preallocated packed (1 bit per pixel) frames: the displayed one and the one that is filled next.
+        # New frames are compared to the displayed one with a memcmp and the buffers are swapped instead of copied.
+        frame_size = (epd.width + 7) // 8 * epd.height
+        self.frame_buffers = [bytearray(frame_size), bytearray(frame_size)]
+        self.displayed_frame_index: Optional[int] = None
+        # Preallocated image the status line is stamped on (the frames of the caller are not modified)
+        self.canvas = Image.new("1", (epd.width, epd.height), 255)
         self.last_update_time = datetime.now()
         self.sleep_timer = None
         self.sleep_delay = timedelta(minutes=1)
         self.sleeping = True
+        REGISTRY.counter("room_buddy_display_spi_bytes_total", "Bytes sent to the display over SPI",
+                         function=lambda: self.epd.spi_bytes_sent)
+        REGISTRY.gauge("room_buddy_display_partial_refreshes_since_clear",
+                       "Partial refreshes since the last fast or full refresh",
+                       function=lambda: self.refresh_policy.partial_refreshes)
+
+    def _init_for(self, mode: RefreshMode):
+        """Initialize the display controller for the refresh mode (only if it is not already)"""
+        if self.initialized_mode == mode:
+            return
+        if mode == REFRESH_FULL:
+            self.epd.init()
+        elif mode == REFRESH_FAST:
+            self.epd.init_fast()
+        else:
+            self.epd.init_part()
+        self.initialized_mode = mode
 
-    def _update_display(self, image: Image, status: str):
+    def _update_display(self, image: Image, status: str, changed_area: float = 0.0,
+                        mode: Optional[RefreshMode] = None):
         """
-        Updates the e-paper display if the image is different and resets the sleep timer.
+        Updates the e-paper display with the refresh mode of the policy (or the given mode).
         """
         if image is not None:
             current_datetime = datetime.now()
             formatted_datetime = current_datetime.strftime('%Y-%m-%d %H:%M:%S')
             status_text = f"{status} {formatted_datetime}"
 
-            image_new = add_text_to_image(image, status_text)
+            if image.size == self.canvas.size and image.mode == self.canvas.mode:
+                self.canvas.paste(image)
+                image_new = add_text_to_image(self.canvas, status_text)
+            else:
+                image_new = add_text_to_image(image.copy(), status_text)
+
+            with METRIC_BUFFER_SECONDS.time():
+                buffer = self.epd.getbuffer(image_new)
+            self._send_frame(buffer, changed_area, mode)
+
+    def _update_surface(self, surface: EpdSurface, image: Image, status: str, changed_area: float = 0.0,
+                        mode: Optional[RefreshMode] = None):
+        """
+        Stamps the status line on the image of the surface (panel size, surface colors) and sends the packed frame.
+        """
+        formatted_datetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        add_text_to_image(image, f"{status} {formatted_datetime}", text_color=surface.INK, surface=surface)
+        with METRIC_BUFFER_SECONDS.time():
+            frame = surface.pack(image)
+        self._send_frame(frame, changed_area, mode)
 
-            if self.last_displayed_image is None:
-                self.epd.display(self.epd.getbuffer(image_new))
+    def _send_frame(self, frame, changed_area: float, mode: Optional[RefreshMode]):
+        """
+        Sends a packed frame with the refresh mode of the policy (or the given mode).
+        """
+        mode = mode or self.refresh_policy.choose(changed_area)
+        with METRIC_REFRESH_SECONDS.time(mode=mode):
+            self._init_for(mode)
+            if mode == REFRESH_PARTIAL:
+                self.epd.display_Partial(frame, 0, 0, self.epd.width, self.epd.height)
             else:
-                self.epd.display_Partial(self.epd.getbuffer(image_new), 0, 0, image_new.width, image_new.height)
+                self.epd.display(frame)
+        self.refresh_policy.record(mode, changed_area)
+        METRIC_REFRESHES.inc(mode=mode)
+
+    def _redraw(self, status: str, mode: Optional[RefreshMode] = None):
+        """
+        Redraws the displayed frame with another status line.
+        """
+        if self.last_surface is not None and self.displayed_frame_index is not None:
+            # The surface may already be drawn with the next frame, so start from the displayed packed frame
+            image = self.last_surface.unpack(self.frame_buffers[self.displayed_frame_index])
+            self._update_surface(self.last_surface, image, status, mode=mode)
+        elif self.last_displayed_image is not None:
+            self._update_display(self.last_displayed_image, status, mode=mode)
+
+    def wake(self, mode: Optional[RefreshMode] = None):
+        """
+        Initializes the e-paper display for the refresh mode of the next update if it is sleeping.
+        Without a mode (e.g. at startup) it is initialized for the mode the policy needs at least.
+        Blocking, so it can be run on a thread while other things are loaded (e.g. at startup).
+        """
+        if self.sleeping:
+            self.sleeping = False
+            if mode is None:
+                # The first frame is always a full refresh, so init for it
+                mode = REFRESH_FULL if self.refresh_policy.needs_full_refresh else REFRESH_PARTIAL
+            self._init_for(mode)
+
+    def is_displayed(self, packed_frame: bytes) -> bool:
+        """Compare a packed frame to the displayed one (memcmp, no allocation)"""
+        return self.displayed_frame_index is not None and \
+            self.frame_buffers[self.displayed_frame_index] == packed_frame
 
     def update_display(self, image: Image):
         """
         Updates the e-paper display if the image is different and resets the sleep timer.
+        The image must not be modified afterward (it is kept to redraw the status line).
         """
-        if not self.images_are_equal(image, self.last_displayed_image):
-            if self.sleeping:
-                self.sleeping = False
-                self.epd.init()
+        with self.lock:
+            self._update_display_if_changed(image)
 
-            self._update_display(image.copy(), "waiting")
-            self.last_displayed_image = image.copy()
-            self.last_update_time = datetime.now()
-
-            # Reset the sleep timer
-            if self.sleep_timer:
-                self.sleep_timer.cancel()
-            self._start_sleep_timer()
+    def _update_display_if_changed(self, image: Image):
+        changed_area = 1.0
+        if image.size != self.canvas.size or image.mode != self.canvas.mode:
+            # e.g. a rotated or not 1-bit image, compare it to the last one instead
+            if self.images_are_equal(image, self.last_displayed_image):
+                print("Image unchanged. No update to display.")
+                return
+            self.displayed_frame_index = None
         else:
-            print("Image unchanged. No update to display.")
+            packed_frame = image.tobytes()
+            if self.is_displayed(packed_frame):
+                print("Image unchanged. No update to display.")
+                return
+            if self.displayed_frame_index is not None:
+                changed_area = changed_pixels(self.frame_buffers[self.displayed_frame_index], packed_frame) / \
+                    (image.width * image.height)
+            # Fill the back buffer and swap
+            next_frame_index = 1 if self.displayed_frame_index == 0 else 0
+            self.frame_buffers[next_frame_index][:] = packed_frame
+            self.displayed_frame_index = next_frame_index
+
+        # Choose the mode first so a sleeping controller is only initialized (reset) once for it
+        mode = self.refresh_policy.choose(changed_area)
+        self.wake(mode)
+
+        self._update_display(image, "waiting", changed_area, mode)
+        self.last_displayed_image = image
+        self.last_surface = None
+        self._restart_sleep_timer()
+
+    def update_surface(self, surface: EpdSurface):
+        """
+        Updates the e-paper display with a frame rendered into a surface in the display format (see
+        `render_display_bw`) if it is different and resets the sleep timer.
+        The packed frame is sent without a conversion. The status line is stamped on the image of the surface.
+        """
+        if surface.panel_size != (self.epd.width, self.epd.height):
+            raise ValueError(f"Surface of the panel size {surface.panel_size} expected "
+                             f"({self.epd.width}x{self.epd.height})")
+        with self.lock:
+            with METRIC_BUFFER_SECONDS.time():
+                packed_frame = surface.pack()
+            if self.is_displayed(packed_frame):
+                print("Image unchanged. No update to display.")
+                return
+            changed_area = 1.0
+            if self.displayed_frame_index is not None:
+                changed_area = changed_pixels(self.frame_buffers[self.displayed_frame_index], packed_frame) / \
+                    (self.epd.width * self.epd.height)
+            # Fill the back buffer and swap
+            next_frame_index = 1 if self.displayed_frame_index == 0 else 0
+            self.frame_buffers[next_frame_index][:] = packed_frame
+            self.displayed_frame_index = next_frame_index
+
+            # Choose the mode first so a sleeping controller is only initialized (reset) once for it
+            mode = self.refresh_policy.choose(changed_area)
+            self.wake(mode)
+
+            self._update_surface(surface, surface.image, "waiting", changed_area, mode)
+            self.last_surface = surface
+            self.last_displayed_image = None
+            self._restart_sleep_timer()
+
+    def _restart_sleep_timer(self):
+        self.last_update_time = datetime.now()
+        if self.sleep_timer:
+            self.sleep_timer.cancel()
+        self._start_sleep_timer()
 
     @staticmethod
     def images_are_equal(img1: Image, img2: Optional[Image]):
         """
-        Compares two PIL images for equality.
+        Compares two PIL images for equality (raw data, no difference image).
         """
         if img1 is None or img2 is None:
             return False
+        if img1 is img2:
+            return True
         if img1.size != img2.size or img1.mode != img2.mode:
             return False
-        diff = ImageChops.difference(img1, img2)
-        return not diff.getbbox()
+        return img1.tobytes() == img2.tobytes()
 
     def _start_sleep_timer(self):
         """
@@ -100,14 +271,49 @@ class EPaperDisplayManager:
         """
         Puts the e-paper display to sleep if the displayed image has not changed for the sleep delay period.
         """
-        if datetime.now() - self.last_update_time >= self.sleep_delay:
-            print("Image unchanged for 1 minute. E-paper display is going to sleep.")
+        with self.lock:
+            if datetime.now() - self.last_update_time >= self.sleep_delay:
+                print("Image unchanged for 1 minute. E-paper display is going to sleep.")
+
+                # Only the status line changes
+                self._redraw("sleeping")
+
+                self._sleep()
+                self._start_ghost_clearing_timer()
+
+    def _sleep(self):
+        self.epd.sleep()
+        self.sleeping = True
+        self.initialized_mode = None
 
-            if self.last_displayed_image is not None:
-                self._update_display(self.last_displayed_image, "sleeping")
+    def _start_ghost_clearing_timer(self):
+        """
+        Starts a timer to clear the ghosting of the partial/fast refreshes with a full refresh in the quiet hours.
+        """
+        if self.ghost_clearing_timer is not None:
+            self.ghost_clearing_timer.cancel()
+            self.ghost_clearing_timer = None
+        now = datetime.now()
+        clearing_time = self.refresh_policy.next_ghost_clearing_time(now)
+        if clearing_time is None:
+            return
+        self.ghost_clearing_timer = threading.Timer((clearing_time - now).total_seconds(), self._clear_ghosting)
+        self.ghost_clearing_timer.daemon = True
+        self.ghost_clearing_timer.start()
 
-            self.epd.sleep()
-            self.sleeping = True
+    def _clear_ghosting(self):
+        """
+        Redraws the last image with a full refresh (if the display is still idle and in the quiet hours).
+        """
+        with self.lock:
+            self.ghost_clearing_timer = None
+            if not self.sleeping or (self.last_displayed_image is None and self.last_surface is None) or \
+                    not self.refresh_policy.in_quiet_hours(datetime.now()):
+                return
+            print("Clear the ghosting with a full refresh.")
+            self.sleeping = False
+            self._redraw("sleeping", mode=REFRESH_FULL)
+            self._sleep()
 
     def cancel_sleep_timer(self):
         """
@@ -116,3 +322,6 @@ class EPaperDisplayManager:
         if self.sleep_timer:
             self.sleep_timer.cancel()
             self.sleep_timer = None
+        if self.ghost_clearing_timer:
+            self.ghost_clearing_timer.cancel()
+            self.ghost_clearing_timer = None
@@ -32,12 +32,24 @@ import os
 import logging
 import sys
 import time
-import subprocess
 
 from ctypes import *
 
 logger = logging.getLogger(__name__)
 
+# SPI clock of the display controller, can be set with EPD_SPI_SPEED_HZ
+SPI_SPEED_HZ_DEFAULT = 4000000
+# Write clock limit of the UC8179 controller (100 ns serial clock cycle)
+SPI_SPEED_HZ_MAX = 10000000
+
+
+def clamp_spi_speed(speed_hz):
+    return max(1, min(int(speed_hz), SPI_SPEED_HZ_MAX))
+
+
+def spi_speed_from_env():
+    return clamp_spi_speed(os.getenv('EPD_SPI_SPEED_HZ', SPI_SPEED_HZ_DEFAULT))
+
 
 class RaspberryPi:
     # Pin definition
@@ -54,25 +66,32 @@ class RaspberryPi:
         import gpiozero
         
         self.SPI = spidev.SpiDev()
+        self.spi_speed_hz = spi_speed_from_env()
         self.GPIO_RST_PIN    = gpiozero.LED(self.RST_PIN)
         self.GPIO_DC_PIN     = gpiozero.LED(self.DC_PIN)
         # self.GPIO_CS_PIN     = gpiozero.LED(self.CS_PIN)
         self.GPIO_PWR_PIN    = gpiozero.LED(self.PWR_PIN)
         self.GPIO_BUSY_PIN   = gpiozero.Button(self.BUSY_PIN, pull_up = False)
-
-        
+        # DC is switched between every command and its data: write the pin state directly
+        # (skips the locking and value conversion of the gpiozero device) and only if it changes.
+        # CS is driven by the SPI controller (CE0) for every transfer.
+        self.dc_pin = self.GPIO_DC_PIN.pin
+        self.dc_value = None
+
+    def set_dc(self, value):
+        value = 1 if value else 0
+        if value != self.dc_value:
+            self.dc_pin.state = value
+            self.dc_value = value
 
     def digital_write(self, pin, value):
-        if pin == self.RST_PIN:
+        if pin == self.DC_PIN:
+            self.set_dc(value)
+        elif pin == self.RST_PIN:
             if value:
                 self.GPIO_RST_PIN.on()
             else:
                 self.GPIO_RST_PIN.off()
-        elif pin == self.DC_PIN:
-            if value:
-                self.GPIO_DC_PIN.on()
-            else:
-                self.GPIO_DC_PIN.off()
         # elif pin == self.CS_PIN:
         #     if value:
         #         self.GPIO_CS_PIN.on()
@@ -102,9 +121,24 @@ class RaspberryPi:
     def spi_writebyte(self, data):
         self.SPI.writebytes(data)
 
+    # data: bytes, bytearray, memoryview (buffer protocol, sent without conversion) or a list of any length
     def spi_writebyte2(self, data):
         self.SPI.writebytes2(data)
 
+    # Command byte followed by its data with a single DC transition
+    def spi_write_command(self, command, data=b''):
+        self.set_dc(0)
+        self.SPI.writebytes([command])
+        if len(data) > 0:
+            self.set_dc(1)
+            self.SPI.writebytes2(data)
+
+    def set_spi_speed(self, speed_hz):
+        self.spi_speed_hz = clamp_spi_speed(speed_hz)
+        if self.SPI.fileno() >= 0:
+            self.SPI.max_speed_hz = self.spi_speed_hz
+        return self.spi_speed_hz
+
     def DEV_SPI_write(self, data):
         self.DEV_SPI.DEV_SPI_SendData(data)
 
@@ -142,8 +176,9 @@ class RaspberryPi:
         else:
             # SPI device, bus = 0, device = 0
             self.SPI.open(0, 0)
-            self.SPI.max_speed_hz = 4000000
+            self.SPI.max_speed_hz = self.spi_speed_hz
             self.SPI.mode = 0b00
+        self.dc_value = None
         return 0
 
     def module_exit(self, cleanup=False):
@@ -152,6 +187,7 @@ class RaspberryPi:
 
         self.GPIO_RST_PIN.off()
         self.GPIO_DC_PIN.off()
+        self.dc_value = 0
         self.GPIO_PWR_PIN.off()
         logger.debug("close 5V, Module enters 0 power consumption ...")
         
@@ -209,6 +245,17 @@ class JetsonNano:
         for i in range(len(data)):
             self.SPI.SYSFS_software_spi_transfer(data[i])
 
+    def spi_write_command(self, command, data=b''):
+        self.GPIO.output(self.DC_PIN, 0)
+        self.SPI.SYSFS_software_spi_transfer(command)
+        if len(data) > 0:
+            self.GPIO.output(self.DC_PIN, 1)
+            self.spi_writebyte2(data)
+
+    def set_spi_speed(self, speed_hz):
+        # software SPI, the clock is given by the GPIO speed
+        return None
+
     def module_init(self):
         self.GPIO.setmode(self.GPIO.BCM)
         self.GPIO.setwarnings(False)
@@ -250,6 +297,7 @@ class SunriseX3:
 
         self.GPIO = Hobot.GPIO
         self.SPI = spidev.SpiDev()
+        self.spi_speed_hz = spi_speed_from_env()
 
     def digital_write(self, pin, value):
         self.GPIO.output(pin, value)
@@ -268,6 +316,19 @@ class SunriseX3:
         #     self.SPI.writebytes([data[i]])
         self.SPI.xfer3(data)
 
+    def spi_write_command(self, command, data=b''):
+        self.GPIO.output(self.DC_PIN, 0)
+        self.SPI.writebytes([command])
+        if len(data) > 0:
+            self.GPIO.output(self.DC_PIN, 1)
+            self.SPI.xfer3(data)
+
+    def set_spi_speed(self, speed_hz):
+        self.spi_speed_hz = clamp_spi_speed(speed_hz)
+        if self.Flag:
+            self.SPI.max_speed_hz = self.spi_speed_hz
+        return self.spi_speed_hz
+
     def module_init(self):
         if self.Flag == 0:
             self.Flag = 1
@@ -283,7 +344,7 @@ class SunriseX3:
         
             # SPI device, bus = 0, device = 0
             self.SPI.open(2, 0)
-            self.SPI.max_speed_hz = 4000000
+            self.SPI.max_speed_hz = self.spi_speed_hz
             self.SPI.mode = 0b00
             return 0
         else:
@@ -302,22 +363,234 @@ class SunriseX3:
         self.GPIO.cleanup([self.RST_PIN, self.DC_PIN, self.CS_PIN, self.BUSY_PIN], self.PWR_PIN)
 
 
-if sys.version_info[0] == 2:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE)
-else:
-    process = subprocess.Popen("cat /proc/cpuinfo | grep Raspberry", shell=True, stdout=subprocess.PIPE, text=True)
-output, _ = process.communicate()
-if sys.version_info[0] == 2:
-    output = output.decode(sys.stdout.encoding)
+class SimulatedTransferStatistics:
+    """Counters of the simulated SPI transfers (modeled times instead of real sleeps)"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0       # chip select low -> high
+        self.spi_transfers = 0      # ioctl calls (spidev splits long writes into chunks of SPI_BUFSIZ)
+        self.command_bytes = 0
+        self.data_bytes = 0
+        self.spi_time_s = 0.0
+        self.busy_time_s = 0.0
+        self.delay_time_s = 0.0
+        self.refreshes = {}         # refresh mode -> count
+
+    @property
+    def modeled_time_s(self):
+        return self.spi_time_s + self.busy_time_s + self.delay_time_s
+
+    def as_dict(self):
+        return {
+            "transactions": self.transactions,
+            "spi_transfers": self.spi_transfers,
+            "command_bytes": self.command_bytes,
+            "data_bytes": self.data_bytes,
+            "spi_time_ms": round(self.spi_time_s * 1000, 3),
+            "busy_time_ms": round(self.busy_time_s * 1000, 3),
+            "delay_time_ms": round(self.delay_time_s * 1000, 3),
+            "modeled_time_ms": round(self.modeled_time_s * 1000, 3),
+            "refreshes": dict(self.refreshes),
+        }
+
+
+class SimulatedSpiDev:
+    """Stand-in for spidev.SpiDev that forwards every write to the simulated implementation"""
+
+    def __init__(self, simulated):
+        self.simulated = simulated
+        self.max_speed_hz = simulated.spi_clock_hz
+        self.mode = 0b00
+
+    def open(self, bus, device):
+        pass
+
+    def close(self):
+        pass
+
+    def writebytes(self, data):
+        if len(data) > Simulated.SPI_BUFSIZ:
+            raise OverflowError("Argument list size exceeds %d bytes." % Simulated.SPI_BUFSIZ)
+        self.simulated.spi_write(data)
+
+    def writebytes2(self, data):
+        self.simulated.spi_write(data)
+
+    def xfer3(self, data):
+        self.simulated.spi_write(data)
+        return [0] * len(data)
+
+
+class Simulated:
+    """
+    Hardware-free implementation that records every command and data byte sent to the display controller.
+    SPI clock time, the per-transaction GPIO overhead, delays and BUSY periods are modeled (added up) instead of slept,
+    so display, display_Partial and display_4Gray can be measured and compared without a panel.
+    Selected with EPD_SIMULATED=1 or if no supported board is found.
+    """
+    # Pin definition
+    RST_PIN  = 17
+    DC_PIN   = 25
+    CS_PIN   = 8
+    BUSY_PIN = 24
+    PWR_PIN  = 18
+    MOSI_PIN = 10
+    SCLK_PIN = 11
+
+    SPI_BUFSIZ = 4096
+    # Waveshare datasheet values of the 7.5inch V2 panel
+    REFRESH_DURATIONS_S = {"full": 5.0, "fast": 1.5, "partial": 0.4, "4gray": 2.1}
+    POWER_ON_DURATION_S = 0.04
+
+    def __init__(self, spi_clock_hz=None, transaction_overhead_s=50e-6, record=True):
+        if spi_clock_hz is None:
+            spi_clock_hz = spi_speed_from_env()
+        self.spi_clock_hz = spi_clock_hz
+        self.transaction_overhead_s = transaction_overhead_s
+        self.record = record
+        self.SPI = SimulatedSpiDev(self)
+        self.pins = {self.RST_PIN: 0, self.DC_PIN: 0, self.CS_PIN: 1, self.PWR_PIN: 0}
+        self.statistics = SimulatedTransferStatistics()
+        # (is_command, bytes) in the order they were sent
+        self.transactions = []
+        self.busy_remaining_s = 0.0
+        self.refresh_mode = "full"
+        self.partial_window = False
+        self.last_command = None
+
+    def reset_recording(self):
+        self.statistics.reset()
+        self.transactions.clear()
+
+    def digital_write(self, pin, value):
+        self.pins[pin] = value
+        if pin == self.CS_PIN and value:
+            self.statistics.transactions += 1
+            self.statistics.spi_time_s += self.transaction_overhead_s
+        elif pin == self.RST_PIN and not value:
+            # a hardware reset restores the controller defaults
+            self.refresh_mode = "full"
+            self.partial_window = False
+            self.busy_remaining_s = 0.0
+
+    def digital_read(self, pin):
+        if pin == self.BUSY_PIN:
+            # BUSY is released at the first poll, the remaining busy time is added to the modeled time
+            self.statistics.busy_time_s += self.busy_remaining_s
+            self.busy_remaining_s = 0.0
+            return 1
+        return self.pins.get(pin, 0)
+
+    def delay_ms(self, delaytime):
+        self.statistics.delay_time_s += delaytime / 1000.0
+        self.busy_remaining_s = max(0.0, self.busy_remaining_s - delaytime / 1000.0)
+
+    def spi_writebyte(self, data):
+        self.SPI.writebytes(data)
+
+    def spi_writebyte2(self, data):
+        self.SPI.writebytes2(data)
+
+    def spi_write_command(self, command, data=b''):
+        self.pins[self.DC_PIN] = 0
+        self.spi_write([command])
+        if len(data) > 0:
+            self.pins[self.DC_PIN] = 1
+            self.spi_write(data)
+
+    def set_spi_speed(self, speed_hz):
+        self.spi_clock_hz = self.SPI.max_speed_hz = clamp_spi_speed(speed_hz)
+        return self.spi_clock_hz
+
+    def spi_write(self, data):
+        try:
+            data = bytes(data)
+        except ValueError:
+            # spidev truncates ints to 8 bit (e.g. the inverted values '~byte' of EPD.display)
+            data = bytes(value & 0xFF for value in data)
+        is_command = not self.pins[self.DC_PIN]
+        if is_command:
+            self.statistics.command_bytes += len(data)
+            if len(data) > 0:
+                self.on_command(data[0])
+        else:
+            self.statistics.data_bytes += len(data)
+            self.on_data(data)
+        self.statistics.spi_transfers += max(1, -(-len(data) // self.SPI_BUFSIZ))
+        self.statistics.spi_time_s += len(data) * 8 / self.spi_clock_hz
+        if self.record:
+            self.transactions.append((is_command, data))
+
+    def on_command(self, command):
+        if command == 0x04:  # POWER ON
+            self.busy_remaining_s = self.POWER_ON_DURATION_S
+        elif command == 0x91:  # partial in
+            self.partial_window = True
+        elif command == 0x92:  # partial out
+            self.partial_window = False
+        elif command == 0x12:  # display refresh
+            mode = "partial" if self.partial_window else self.refresh_mode
+            self.statistics.refreshes[mode] = self.statistics.refreshes.get(mode, 0) + 1
+            self.busy_remaining_s = self.REFRESH_DURATIONS_S[mode]
+        self.last_command = command
+
+    def on_data(self, data):
+        # the temperature value of the cascade setting (0xE5) selects the waveform of the init variants
+        if self.last_command == 0xE5 and len(data) > 0:
+            self.refresh_mode = {0x5A: "fast", 0x6E: "partial", 0x5F: "4gray"}.get(data[0], "full")
 
-if "Raspberry" in output:
+    def module_init(self, cleanup=False):
+        self.pins[self.PWR_PIN] = 1
+        return 0
+
+    def module_exit(self, cleanup=False):
+        logger.debug("spi end (simulated)")
+        self.pins[self.RST_PIN] = 0
+        self.pins[self.DC_PIN] = 0
+        self.pins[self.PWR_PIN] = 0
+
+
+# use the cached platform detection instead of spawning 'cat /proc/cpuinfo | grep Raspberry'
+try:
+    from ..is_raspberry_pi.is_raspberry_pi import is_raspberry_pi
+except ImportError:
+    # imported as top-level package 'waveshare_epd' (lib directory in sys.path)
+    from is_raspberry_pi.is_raspberry_pi import is_raspberry_pi
+
+if os.getenv('EPD_SIMULATED', '') == '1':
+    implementation = Simulated()
+elif is_raspberry_pi():
     implementation = RaspberryPi()
 elif os.path.exists('/sys/bus/platform/drivers/gpio-x3'):
     implementation = SunriseX3()
 else:
-    implementation = JetsonNano()
+    try:
+        implementation = JetsonNano()
+    except (RuntimeError, ImportError) as e:
+        logger.warning("No supported board found (%r), using the simulated implementation", e)
+        implementation = Simulated()
 
 for func in [x for x in dir(implementation) if not x.startswith('_')]:
     setattr(sys.modules[__name__], func, getattr(implementation, func))
 
+
+def spi_throughput_test(size=48000, repeats=10, command=0x13):
+    """
+    Measures the SPI throughput (MB/s) with the transfers of a frame (command and data in a single transaction).
+    The data is written to the new data RAM of the controller (0x13) without a refresh, the next frame overwrites it.
+    """
+    data = bytes(size)
+    simulated = isinstance(implementation, Simulated)
+    start_time = implementation.statistics.spi_time_s if simulated else time.perf_counter()
+    for _ in range(repeats):
+        digital_write(CS_PIN, 0)
+        spi_write_command(command, data)
+        digital_write(CS_PIN, 1)
+    # the simulated implementation models the transfer time instead of spending it
+    end_time = implementation.statistics.spi_time_s if simulated else time.perf_counter()
+    return (size + 1) * repeats / (end_time - start_time) / 1e6
+
 ### END OF FILE ###
@@ -0,0 +1,90 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, time
+from typing import NewType, Optional
+
+RefreshMode = NewType('RefreshMode', str)
+REFRESH_FULL = RefreshMode("full")
+"""Slow full refresh (init), clears all ghosting"""
+REFRESH_FAST = RefreshMode("fast")
+"""Fast full refresh (init_fast), clears most ghosting"""
+REFRESH_PARTIAL = RefreshMode("partial")
+"""Partial refresh (init_part), fastest but leaves ghosting behind"""
+
+
+@dataclass
+class RefreshPolicyConfig:
+    partial_refreshes_max: int = field(default=20, metadata={
+        "description": "Partial refreshes until a fast refresh clears the ghosting"})
+    accumulated_changed_area_max: float = field(default=4.0, metadata={
+        "description": "Sum of the changed area ratios of the partial refreshes until a fast refresh"})
+    changed_area_fast: float = field(default=0.4, metadata={
+        "description": "Changed area ratio from which a fast refresh is used instead of a partial one"})
+    fast_refreshes_max: int = field(default=6, metadata={
+        "description": "Fast refreshes until a full refresh is done"})
+    quiet_hours: tuple[int, int] = field(default=(2, 5), metadata={
+        "description": "Hours (start, end) in which the ghosting is cleared with a full refresh"})
+
+
+def changed_pixels(frame_a: bytes | bytearray, frame_b: bytes | bytearray) -> int:
+    """Number of different pixels of two packed (1 bit per pixel) frames"""
+    return (int.from_bytes(frame_a, "big") ^ int.from_bytes(frame_b, "big")).bit_count()
+
+
+class RefreshPolicy:
+    """
+    Picks the refresh mode of the next display update.
+    Partial refreshes are the fastest, but every one of them (especially of big areas) leaves some ghosting behind,
+    so after a budget of partial refreshes (count and accumulated changed area) a fast full refresh is done and
+    after a few fast ones a slow full refresh. Ghosting that is left is cleared with a full refresh in the quiet
+    hours (e.g. at night) so that the visible updates during the day can stay fast.
+    """
+
+    def __init__(self, config: Optional[RefreshPolicyConfig] = None):
+        self.config = config or RefreshPolicyConfig()
+        self.partial_refreshes = 0
+        self.accumulated_changed_area = 0.0
+        self.fast_refreshes = 0
+        # No frame was displayed yet (or the panel content is unknown)
+        self.needs_full_refresh = True
+
+    def choose(self, changed_area: float) -> RefreshMode:
+        """Refresh mode for an update that changes the given ratio (0-1) of the display area"""
+        if self.needs_full_refresh:
+            return REFRESH_FULL
+        if changed_area >= self.config.changed_area_fast or \
+                self.partial_refreshes >= self.config.partial_refreshes_max or \
+                self.accumulated_changed_area + changed_area > self.config.accumulated_changed_area_max:
+            return REFRESH_FULL if self.fast_refreshes >= self.config.fast_refreshes_max else REFRESH_FAST
+        return REFRESH_PARTIAL
+
+    def record(self, mode: RefreshMode, changed_area: float):
+        """Track a refresh that was done"""
+        if mode == REFRESH_FULL:
+            self.partial_refreshes = 0
+            self.accumulated_changed_area = 0.0
+            self.fast_refreshes = 0
+            self.needs_full_refresh = False
+        elif mode == REFRESH_FAST:
+            self.partial_refreshes = 0
+            self.accumulated_changed_area = 0.0
+            self.fast_refreshes += 1
+        else:
+            self.partial_refreshes += 1
+            self.accumulated_changed_area += changed_area
+
+    def ghosting_left(self) -> bool:
+        """There were partial or fast refreshes since the last full refresh"""
+        return not self.needs_full_refresh and (self.partial_refreshes > 0 or self.fast_refreshes > 0)
+
+    def in_quiet_hours(self, now: datetime) -> bool:
+        start, end = self.config.quiet_hours
+        return start <= now.hour < end if start <= end else (now.hour >= start or now.hour < end)
+
+    def next_ghost_clearing_time(self, now: datetime) -> Optional[datetime]:
+        """Time of the next ghost clearing full refresh (None if there is no ghosting to clear)"""
+        if not self.ghosting_left():
+            return None
+        if self.in_quiet_hours(now):
+            return now
+        quiet_hours_start = datetime.combine(now.date(), time(self.config.quiet_hours[0]))
+        return quiet_hours_start if quiet_hours_start > now else quiet_hours_start + timedelta(days=1)
@@ -0,0 +1,91 @@
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+
+def initialize_database(db_path: Path, tables: list[tuple[str, str, str]]):
+    """
+    Initialize a SQLite database.
+    """
+    if not db_path.parent.exists():
+        db_path.parent.mkdir(parents=True)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    # Create tables if not existing
+    for table_name, column_name, data_type in tables:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table_name} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                {column_name} {data_type} NOT NULL,
+                UNIQUE(timestamp, {column_name})
+            )
+        """)
+        migrate_value_column(cursor, table_name, column_name)
+    conn.commit()
+    conn.close()
+
+
+def migrate_value_column(cursor: sqlite3.Cursor, table_name: str, column_name: str):
+    """
+    Rename the value column of an existing table if it has another name (e.g. older databases used the table name
+    'dht22_relative_humidity_percent' as the column name too).
+    """
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({table_name})")]
+    if column_name in columns:
+        return
+    value_columns = [column for column in columns if column not in ("id", "timestamp")]
+    if len(value_columns) != 1:
+        # The inserts into this table fail (and are logged) but the other tables can still be used
+        print(f"Unable to migrate table {table_name}, no single value column to rename to {column_name}: {columns}")
+        return
+    cursor.execute(f"ALTER TABLE {table_name} RENAME COLUMN {value_columns[0]} TO {column_name}")
+    print(f"Renamed column {table_name}.{value_columns[0]} to {column_name}")
+
+
+def is_transient_error(error: sqlite3.Error) -> bool:
+    """Errors that can succeed when retried later (e.g. the database is locked by another process)"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def add_database_entry(db_name: Path, table_name: str, column_name: str, time: datetime, value):
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    # Add table entry
+    try:
+        cursor.execute(f"""
+            INSERT INTO {table_name} (timestamp, {column_name})
+            VALUES (?, ?)
+        """, (time.isoformat(timespec='seconds'), value))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        print(f"Duplicate entry ignored: {time=}, {value=}")
+    conn.close()
+
+
+def add_database_entries(db_name: Path, entries: dict[tuple[str, str], list[tuple[datetime, object]]]) \
+        -> tuple[int, dict[tuple[str, str], sqlite3.Error]]:
+    """
+    Add multiple entries per (table name, column name) using a single connection and a transaction per table (so an
+    error in one table does not roll back the entries of the others).
+    Duplicate entries are ignored. Returns the number of added entries and the errors per (table name, column name).
+    """
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    added = 0
+    errors: dict[tuple[str, str], sqlite3.Error] = {}
+    try:
+        for (table_name, column_name), rows in entries.items():
+            try:
+                with conn:
+                    cursor.executemany(f"""
+                        INSERT OR IGNORE INTO {table_name} (timestamp, {column_name})
+                        VALUES (?, ?)
+                    """, [(time.isoformat(timespec='seconds'), value) for time, value in rows])
+                    added += max(cursor.rowcount, 0)
+            except sqlite3.Error as e:
+                errors[(table_name, column_name)] = e
+    finally:
+        conn.close()
+    return added, errors
@@ -5,6 +5,9 @@ from pathlib import Path
 from datetime import timedelta, datetime
 import logging
 
+from lib.startup_timer.startup_timer import StartupTimer
+startup_timer = StartupTimer()
+
 # requires 'gpiozero'
 from gpiozero import Button, RGBLED
 
@@ -25,6 +28,9 @@ if os.path.exists(libdir):
 
 import pins
 from lib.render.render import render_display_bw
+from lib.render.epd_surface import EpdSurface
+from lib.metrics.metrics import REGISTRY
+from lib.metrics.metrics_server import MetricsServer, monitor_event_loop_lag, register_process_metrics
 from lib.plugins.plugin_manager import PluginManager
 from lib.is_raspberry_pi.is_raspberry_pi import is_raspberry_pi
 detected_raspberry_pi = is_raspberry_pi()
@@ -32,10 +38,7 @@ if detected_raspberry_pi:
     # when running on a raspberry pi it loads the e-paper display library
     from lib.waveshare_epd import epd7in5_V2
     from lib.waveshare_epd.epd_auto_sleep_manager import EPaperDisplayManager
-else:
-    # when running on a dev pc it loads tkinter to simulate the e-paper display
-    import tkinter as tk
-    from PIL import ImageTk
+startup_timer.mark("imports")
 
 
 # Global variables
@@ -50,6 +53,13 @@ if has_journal_systemd_library:
     logger.addHandler(journal.JournalHandler(SYSLOG_IDENTIFIER=logger_id))
 # > Debugging
 timedelta_offset = timedelta(days=0)
+# > Metrics (local Prometheus endpoint, METRICS_PORT=0 disables it)
+metrics_port = int(os.getenv('METRICS_PORT', '9105') or 0)
+# > Display (rotation of the content on the panel in degrees, e.g. 90 for a panel mounted in portrait)
+epd_rotation = int(os.getenv('EPD_ROTATION', '0') or 0)
+metric_render_seconds = REGISTRY.histogram("room_buddy_render_seconds", "Duration of rendering a frame")
+metric_display_update_seconds = REGISTRY.histogram("room_buddy_display_update_seconds",
+                                                   "Duration of showing a frame (e-paper display or Tk window)")
 
 
 async def main():
@@ -57,7 +67,9 @@ async def main():
     if detected_raspberry_pi:
         epd = epd7in5_V2.EPD()
         epd_manager = EPaperDisplayManager(epd)
-        display_resolution = epd.width, epd.height
+        # Frames are rendered in the display format (no conversion before they are sent)
+        surface = EpdSurface(epd.width, epd.height, epd_rotation)
+        display_resolution = surface.size
         button_red = Button(pins.gpio_pin_input_pullup_button_red)
         button_black = Button(pins.gpio_pin_input_pullup_button_black)
         led_rgb_main = RGBLED(*pins.gpio_pins_output_pwm_led_rgb_main)
@@ -74,9 +86,21 @@ async def main():
             led_rgb_main.color = 0, 0, 0
 
         button_black.when_pressed = turn_off
+
+        # initialize the e-paper display on a thread while the plugins are loaded
+        async def init_display():
+            with startup_timer.phase("e-paper display init"):
+                await asyncio.to_thread(epd_manager.wake)
+
+        display_init_task = asyncio.create_task(init_display())
     else:
+        # when running on a dev pc it loads tkinter to simulate the e-paper display
+        import tkinter as tk
+        from PIL import ImageTk
+
         # Simulate hardware for debugging on a PC that is not a Raspberry Pi (and has no GPIO connections)
-        display_resolution = 800, 480
+        surface = None
+        display_resolution = (480, 800) if epd_rotation in (90, 270) else (800, 480)
         button_red = SimulatedButton(pins.gpio_pin_input_pullup_button_red)
         button_black = SimulatedButton(pins.gpio_pin_input_pullup_button_black)
         led_rgb_main = SimulatedRGBLED(pins.gpio_pins_output_pwm_led_rgb_main)
@@ -185,13 +209,25 @@ async def main():
             root.after(50, update_canvas)
 
         update_canvas()
+        display_init_task = None
+    startup_timer.mark("hardware setup")
 
     global timedelta_offset
     plugin_manager = PluginManager(Path("plugins"), logger,
                                    led_rgb_main=led_rgb_main, led_rgb_info=led_rgb_info,
                                    button_red=button_red, button_black=button_black,
-                                   simulate_circuit=not detected_raspberry_pi, timedelta_offset=timedelta_offset)
+                                   simulate_circuit=not detected_raspberry_pi, timedelta_offset=timedelta_offset,
+                                   hot_reload=os.getenv('PLUGIN_HOT_RELOAD', '') == '1')
     await plugin_manager.load_plugins()
+    startup_timer.mark("plugin discovery")
+    if metrics_port:
+        register_process_metrics()
+        try:
+            await MetricsServer(logger, port=metrics_port).start()
+        except OSError as e:
+            logger.error(f"Unable to start the metrics endpoint on port {metrics_port}: {e}")
+        # noinspection PyAsyncCall
+        asyncio.create_task(monitor_event_loop_lag())
     # schedule to start all plugins (without awaiting it since it is a forever loop!)
     # noinspection PyAsyncCall
     asyncio.create_task(plugin_manager.start_plugins())
@@ -200,21 +236,34 @@ async def main():
     while True:
         actions, actions_changed = await plugin_manager.request_actions()
         widgets, widgets_changed = await plugin_manager.request_widgets()
-        logger.debug(f"{actions=}, {actions_changed=}, {widgets=}, {widgets_changed=}")
 
         if actions_changed or widgets_changed:
-            logger.debug(f"update")
-            image = render_display_bw(
-                [action for group in actions.values() for action in group],
-                [widget for group in widgets.values() for widget in group],
-                display_resolution=display_resolution
-            )
-            if detected_raspberry_pi:
-                epd_manager.update_display(image)
-            else:
-                new_photo = ImageTk.PhotoImage(image)
-                label.config(image=new_photo)
-                label.image = new_photo
+            # Only the counts since formatting all actions/widgets on every tick is expensive
+            logger.debug("update: %d actions (%s), %d widgets (%s)",
+                         sum(len(group) for group in actions.values()), actions_changed,
+                         sum(len(group) for group in widgets.values()), widgets_changed)
+            if not startup_timer.reported:
+                startup_timer.mark("plugins ready (first data)")
+            with metric_render_seconds.time():
+                image = render_display_bw(
+                    [action for group in actions.values() for action in group],
+                    [widget for group in widgets.values() for widget in group],
+                    display_resolution=display_resolution,
+                    surface=surface
+                )
+            if display_init_task is not None:
+                await display_init_task
+                display_init_task = None
+            with metric_display_update_seconds.time():
+                if detected_raspberry_pi:
+                    epd_manager.update_surface(surface)
+                else:
+                    new_photo = ImageTk.PhotoImage(image)
+                    label.config(image=new_photo)
+                    label.image = new_photo
+            if not startup_timer.reported:
+                startup_timer.mark("first frame (render + display)")
+                logger.info(startup_timer.report())
             logger.debug(f"sleep")
             await asyncio.sleep(10)
         else:
@@ -1,16 +1,14 @@
-import asyncio
 import os
 import sys
-from datetime import datetime
 from pathlib import Path
-from typing import Optional, NewType
+from typing import Optional
 
-
-from lib.plugins.plugin import PluginBase, ChangeDetected
+from lib.plugins.sensor_plugin import SensorPluginBase, SensorMeasurement
 from lib.render.render import Widget, WidgetContent
 from lib.is_raspberry_pi.is_raspberry_pi import is_raspberry_pi
-from lib.sensors.dht22 import DHT22_TOLERANCE_TEMPERATURE, DHT22_TOLERANCE_HUMIDITY, DHT22_UPDATE_FREQUENCY
-from .weather_db.weather_db import initialize_database, add_database_entry
+from lib.sensors.dht22 import DHT22_TOLERANCE_TEMPERATURE, DHT22_TOLERANCE_HUMIDITY, DHT22_UPDATE_FREQUENCY, \
+    DHT22_MEDIAN_COUNT, read_dht22
+from lib.sensors.threaded_sensor import ThreadedSensor
 
 detected_raspberry_pi = is_raspberry_pi()
 if detected_raspberry_pi:
@@ -19,79 +17,68 @@ if detected_raspberry_pi:
     import board
 
 
-TemperatureCelsius = NewType('TemperatureCelsius', float)
-RelativeHumidityPercent = NewType('RelativeHumidityPercent', float)
-
-
 # GPIO pin where the DHT22 is connected (BCM numbering)
 DHT22_PIN = board.D6 if detected_raspberry_pi else None
+# Maximum time to wait for the sensor thread to free the GPIO pin when the plugin is stopped
+DHT22_STOP_TIMEOUT = 5
+
+# database (ROOM_BUDDY_DATA_DIR can be used to keep e.g. simulations separate)
+DB_INDOOR_WEATHER = Path(os.getenv('ROOM_BUDDY_DATA_DIR', '') or
+                         Path(os.path.dirname(os.path.realpath(sys.argv[0]))).joinpath("data")
+                         ).joinpath("indoor_weather.db")
 
-# database
-DB_INDOOR_WEATHER = Path(os.path.dirname(os.path.realpath(sys.argv[0]))).joinpath("data", "indoor_weather.db")
+# Read without importing the plugin (see PluginManager)
+PLUGIN_METADATA = {
+    "name": "IndoorWeather",
+    "description": "Indoor temperature and humidity (DHT22)",
+}
 
 
-class Plugin(PluginBase):
+class Plugin(SensorPluginBase):
     def __init__(self, tolerance_temp=DHT22_TOLERANCE_TEMPERATURE, tolerance_humidity=DHT22_TOLERANCE_HUMIDITY,
                  **kwargs):
-        super().__init__("IndoorWeather", **kwargs)
-        self.temp: Optional[tuple[TemperatureCelsius, datetime]] = None
-        self.humidity: Optional[tuple[RelativeHumidityPercent, datetime]] = None
-        self.tolerance_temp = tolerance_temp
-        self.tolerance_humidity = tolerance_humidity
-        self.last_temp: Optional[TemperatureCelsius] = None
-        self.last_humidity: Optional[RelativeHumidityPercent] = None
-        self.dht_sensor = None if self.simulate_circuit else adafruit_dht.DHT22(DHT22_PIN)
+        super().__init__(PLUGIN_METADATA["name"], [
+            SensorMeasurement(id="dht22_temperature_celsius", unit="°C", tolerance=tolerance_temp,
+                              value_range=(-40, 80),
+                              table="dht22_temperature_celsius", column="temperature_celsius"),
+            SensorMeasurement(id="dht22_relative_humidity_percent", unit="%", tolerance=tolerance_humidity,
+                              value_range=(0, 100), format_spec=".0f",
+                              table="dht22_relative_humidity_percent", column="relative_humidity_percent"),
+        ], DB_INDOOR_WEATHER, update_interval=1 / DHT22_UPDATE_FREQUENCY, **kwargs)
+        self.dht_sensor_reader: Optional[ThreadedSensor] = None
 
-    def temp_changed(self, old_temp: TemperatureCelsius | None, new_temp: TemperatureCelsius):
-        return old_temp is None or abs(new_temp - old_temp) > self.tolerance_temp
+    async def setup(self):
+        # Created when the plugin runs (a stopped plugin waited in `teardown` until its DHT22 freed the GPIO pin)
+        dht_sensor = None if self.simulate_circuit else adafruit_dht.DHT22(DHT22_PIN)
+        # Read the sensor on its own thread (blocking bit-banged reads), which frees the GPIO pin after it stopped
+        self.dht_sensor_reader = ThreadedSensor(
+            "DHT22",
+            (lambda: (23.0, 50.0)) if dht_sensor is None else (lambda: read_dht22(dht_sensor)),
+            self.logger,
+            interval=1 / DHT22_UPDATE_FREQUENCY,
+            median_count=DHT22_MEDIAN_COUNT,
+            clock=self.clock,
+            release=None if dht_sensor is None else dht_sensor.exit,
+        )
+        self.dht_sensor_reader.start()
 
-    def humidity_changed(self, old_humidity: RelativeHumidityPercent | None, new_humidity: RelativeHumidityPercent):
-        return old_humidity is None or abs(new_humidity - old_humidity) > self.tolerance_humidity
+    async def teardown(self):
+        await self.dht_sensor_reader.stop_and_wait(DHT22_STOP_TIMEOUT)
 
-    async def run(self):
-        """Simulate temperature data collection"""
-        initialize_database(DB_INDOOR_WEATHER, [
-            ("dht22_temperature_celsius", "temperature_celsius", "REAL"),
-            ("dht22_relative_humidity_percent", "dht22_relative_humidity_percent", "REAL")
-        ])
-        while True:
-            try:
-                current_time = datetime.now()
-                if self.dht_sensor is not None:
-                    temp, humidity = self.dht_sensor.temperature, self.dht_sensor.humidity
-                else:
-                    temp, humidity = 23.0, 50.0
-                if temp is not None and humidity is not None:
-                    self.logger.info(f"Read from DHT22: {temp=:.1f}°C {humidity=:.1f}%")
-                    if self.temp_changed(None if self.temp is None else self.temp[0], temp):
-                        self.logger.info(f"Detected change: {temp=:.1f}")
-                        self.temp = temp, current_time
-                        add_database_entry(DB_INDOOR_WEATHER, "dht22_temperature_celsius", "temperature_celsius",
-                                           current_time, temp)
-                    if self.humidity_changed(None if self.humidity is None else self.humidity[0], humidity):
-                        self.logger.info(f"Detected change: {humidity=:.1f}")
-                        self.humidity = humidity, current_time
-                        add_database_entry(DB_INDOOR_WEATHER, "dht22_relative_humidity_percent", "relative_humidity_percent",
-                                           current_time, humidity)
-                else:
-                    self.logger.warning(f"Read from DHT22: Failed to read data.")
-            except RuntimeError as e:
-                self.logger.warning(f"Error from DHT22: {e}")
-            await asyncio.sleep(1 / DHT22_UPDATE_FREQUENCY)
+    async def acquire(self):
+        sample = await self.dht_sensor_reader.read(timeout=10 / DHT22_UPDATE_FREQUENCY)
+        if sample is None:
+            self.logger.warning(f"Read from DHT22: Failed to read data.")
+            return
+        temp, humidity = sample.values
+        self.logger.debug(f"Read from DHT22: {temp=:.1f}°C {humidity=:.1f}%")
+        self.update_measurement("dht22_temperature_celsius", temp, sample.time)
+        self.update_measurement("dht22_relative_humidity_percent", humidity, sample.time)
 
-    async def request_widgets(self):
-        """Return the current list of temperatures"""
-        if self.temp is not None and self.humidity is not None:
-            change_detected = ChangeDetected(False)
-            if self.temp_changed(self.last_temp, self.temp[0]):
-                self.last_temp = self.temp[0]
-                change_detected = ChangeDetected(True)
-            if self.humidity_changed(self.last_humidity, self.humidity[0]):
-                self.last_humidity = self.humidity[0]
-                change_detected = ChangeDetected(True)
-            return [Widget(generate_content=lambda: [
-                WidgetContent(description="Indoor:", text=""),
-                WidgetContent(text=f"{self.temp[0]:.1f}°C / {self.humidity[0]:.0f}%"),
-            ])], change_detected
-        else:
-            return [], ChangeDetected(False)
+    def create_widgets(self) -> list[Widget]:
+        text = (f"{self.format_value('dht22_temperature_celsius')} / "
+                f"{self.format_value('dht22_relative_humidity_percent')}")
+        return [Widget(generate_content=lambda: [
+            WidgetContent(description="Indoor:", text=""),
+            WidgetContent(text=text),
+        ])]
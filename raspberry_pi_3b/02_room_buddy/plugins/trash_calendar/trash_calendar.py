@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+CalendarEvent = tuple[datetime, str]
+
+# Increase if the format of the parsed calendar cache changes
+PARSED_CALENDAR_VERSION = 1
+
+
+class UnsupportedCalendarError(ValueError):
+    """The ICS file uses features the lightweight parser can't handle (use the 'ics' library instead)"""
+
+
+def unescape_text(value: str) -> str:
+    """
+    Unescape an ICS text value (RFC 5545 3.3.11).
+    """
+    result = []
+    escaped = False
+    for char in value:
+        if escaped:
+            result.append("\n" if char in "nN" else char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        else:
+            result.append(char)
+    return "".join(result)
+
+
+def parse_date_time(parameters: list[str], value: str) -> datetime:
+    """
+    Parse a DTSTART value into a datetime (like the 'ics' library dates without a time zone are UTC).
+    """
+    for parameter in parameters:
+        if parameter.upper().startswith("TZID="):
+            raise UnsupportedCalendarError(f"Time zone parameter is not supported: {parameter}")
+    try:
+        if len(value) == 8:
+            return datetime.strptime(value, "%Y%m%d").replace(tzinfo=timezone.utc)
+        return datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise UnsupportedCalendarError(f"Date format is not supported: {value}")
+
+
+def iter_unfolded_lines(file):
+    """
+    Yield the content lines of an ICS file with folded lines (starting with a space or tab) joined.
+    """
+    current_line: Optional[str] = None
+    for line in file:
+        line = line.rstrip("\r\n")
+        if line.startswith((" ", "\t")) and current_line is not None:
+            current_line += line[1:]
+            continue
+        if current_line:
+            yield current_line
+        current_line = line
+    if current_line:
+        yield current_line
+
+
+def parse_ics_events(ics_file: Path) -> list[CalendarEvent]:
+    """
+    Parse the start date and summary of all events of an ICS file line by line.
+    This is much faster than the 'ics' library but only supports what is needed for the trash calendar
+    (raises UnsupportedCalendarError otherwise).
+    """
+    events: list[CalendarEvent] = []
+    in_event = False
+    begin: Optional[datetime] = None
+    summary = ""
+    with open(ics_file, "r", encoding="utf-8-sig") as f:
+        for line in iter_unfolded_lines(f):
+            name_parameters, separator, value = line.partition(":")
+            if not separator:
+                raise UnsupportedCalendarError(f"Malformed content line: {line!r}")
+            name, *parameters = name_parameters.split(";")
+            name = name.upper()
+            if name == "BEGIN" and value.upper() == "VEVENT":
+                if in_event:
+                    raise UnsupportedCalendarError("Nested events are not supported")
+                in_event = True
+                begin = None
+                summary = ""
+            elif name == "END" and value.upper() == "VEVENT":
+                if not in_event:
+                    raise UnsupportedCalendarError("Event end without begin")
+                in_event = False
+                if begin is not None:
+                    events.append((begin, summary))
+            elif in_event and name == "DTSTART":
+                begin = parse_date_time(parameters, value)
+            elif in_event and name == "SUMMARY":
+                summary = unescape_text(value)
+    if in_event:
+        raise UnsupportedCalendarError("Event is not closed")
+    return events
+
+
+def file_digest(file: Path) -> str:
+    with open(file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_parsed_calendar(ics_file: Path, parsed_file: Path) -> Optional[list[CalendarEvent]]:
+    """
+    Load the parsed events of the ICS file if they were stored for the current version of the file.
+    The file is only hashed if its modification time or size changed.
+    """
+    try:
+        with open(parsed_file, "r", encoding="utf-8") as f:
+            parsed = json.load(f)
+        stat = os.stat(ics_file)
+        if parsed["version"] != PARSED_CALENDAR_VERSION:
+            return None
+        if parsed["source_mtime_ns"] != stat.st_mtime_ns or parsed["source_size"] != stat.st_size:
+            if parsed["source_sha256"] != file_digest(ics_file):
+                return None
+            # Same content (e.g. the file was downloaded again), remember the new modification time
+            parsed["source_mtime_ns"] = stat.st_mtime_ns
+            parsed["source_size"] = stat.st_size
+            write_json_atomic(parsed_file, parsed)
+        return [(datetime.fromisoformat(begin), summary) for begin, summary in parsed["events"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def store_parsed_calendar(ics_file: Path, parsed_file: Path, events: list[CalendarEvent]):
+    """
+    Store the parsed events together with the modification time, size and hash of the ICS file.
+    """
+    stat = os.stat(ics_file)
+    write_json_atomic(parsed_file, {
+        "version": PARSED_CALENDAR_VERSION,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_size": stat.st_size,
+        "source_sha256": file_digest(ics_file),
+        "events": [(begin.isoformat(), summary) for begin, summary in events],
+    })
+
+
+def write_json_atomic(file: Path, data: dict):
+    # Write to a temporary file first so a crash never leaves a partially written cache
+    temporary_file = file.with_name(file.name + ".tmp")
+    with open(temporary_file, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(temporary_file, file)
+
+
+def load_json(file: Path) -> Optional[dict]:
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else None
+    except (OSError, ValueError):
+        return None
@@ -1,7 +1,7 @@
 import asyncio
 import os
 import re
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta, time, date
 from pathlib import Path
 from tempfile import gettempdir
 from typing import Optional, NewType
@@ -15,6 +15,8 @@ from tatsu.exceptions import FailedToken
 
 from lib.plugins.plugin import PluginBase, ChangeDetected
 from lib.render.render import Widget, WidgetContent, Action, ActionContent
+from .trash_calendar.trash_calendar import CalendarEvent, UnsupportedCalendarError, parse_ics_events, \
+    load_parsed_calendar, store_parsed_calendar, load_json, write_json_atomic
 
 TrashType = NewType('TrashType', str)
 TrashEvent = tuple[datetime, TrashType]
@@ -33,6 +35,12 @@ FETCH_USER_AGENT = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
 }
 CACHE_FILE: Path = Path(gettempdir()) / "trash_dates.ics"
+PARSED_CACHE_FILE: Path = Path(gettempdir()) / "trash_dates.json"
+# Requested URL/time period and the HTTP validators (ETag, Last-Modified) of the cached ICS file
+FETCH_INFO_FILE: Path = Path(gettempdir()) / "trash_dates_fetch_info.json"
+
+# Check the calendar for changes (conditional request, usually no download)
+CALENDAR_CHECK_INTERVAL = timedelta(minutes=15)
 
 # Debugging
 DEBUG_DAY_OFFSET = timedelta(days=0)
@@ -48,11 +56,19 @@ def remove_measurements_ending_with_l(input_string):
     # Remove extra spaces caused by deletion
     return ' '.join(filtered_string.split())
 
+# Read without importing the plugin (see PluginManager)
+PLUGIN_METADATA = {
+    "name": "TrashNotifier",
+    "description": "Notifies when the trash needs to be taken out or brought in (ICS calendar)",
+}
+
 
 class Plugin(PluginBase):
     def __init__(self, **kwargs):
-        super().__init__("TrashNotifier", **kwargs)
+        super().__init__(PLUGIN_METADATA["name"], **kwargs)
         self.calendar_url: Optional[str] = None
+        # Local ICS file that is used instead of the calendar URL (e.g. for simulations)
+        self.calendar_file: Optional[Path] = None
         self.current_trash_dates: Optional[list[TrashEvent]] = []
         self.hour_offset_trash_notification: int = 8
         # Keep track if there was an update between the last widget/action request
@@ -64,34 +80,84 @@ class Plugin(PluginBase):
         # Keep track of trash that was already taken out or brought in
         self.trash_taken_out: dict[TrashType, datetime] = dict()
         self.trash_brought_in: dict[TrashType, datetime] = dict()
+        # Wakes up the run loop before the next deadline
+        self.wakeup = asyncio.Event()
+
+    def parse_ics(self, cache_file: Path) -> list[CalendarEvent]:
+        # Skip parsing if the ICS file did not change since it was parsed the last time
+        events = load_parsed_calendar(cache_file, PARSED_CACHE_FILE)
+        if events is not None:
+            self.logger.debug(f"Loaded parsed ICS file from cache: {len(events)} events")
+            return events
 
-    def parse_ics(self, cache_file: Path) -> Calendar:
         self.logger.info("Parse ICS to calendar")
-        with open(cache_file, "r") as f:
-            calendar_raw = f.read()
-            self.logger.debug("Read ICS file: '%s'", calendar_raw)
-            calendar = Calendar(calendar_raw)
-            self.logger.debug(f"Parsed ICS file content: {len(calendar.events)} events")
-            return calendar
-
-    def get_trash_dates(self, calendar: Calendar) -> list[TrashEvent]:
-        today = datetime.now() + DEBUG_DAY_OFFSET
+        try:
+            events = parse_ics_events(cache_file)
+        except UnsupportedCalendarError as e:
+            self.logger.info(f"Parse ICS file with the 'ics' library: {e}")
+            with open(cache_file, "r") as f:
+                calendar_raw = f.read()
+                self.logger.debug("Read ICS file: %i characters", len(calendar_raw))
+                calendar = Calendar(calendar_raw)
+                events = [(event.begin.datetime, event.name) for event in calendar.events]
+        self.logger.debug(f"Parsed ICS file content: {len(events)} events")
+        store_parsed_calendar(cache_file, PARSED_CACHE_FILE, events)
+        return events
+
+    def get_trash_dates(self, events: list[CalendarEvent]) -> list[TrashEvent]:
+        today = self.clock.now() + DEBUG_DAY_OFFSET
         trash_dates: list[tuple[datetime, TrashType]] = []
 
-        for event in calendar.events:
-            event_date = event.begin.datetime
+        for event_date, event_name in events:
             if event_date.date() >= today.date():
-                trash_dates.append((event_date, TrashType(remove_measurements_ending_with_l(event.name))))
+                trash_dates.append((event_date, TrashType(remove_measurements_ending_with_l(event_name))))
 
         # Sort by date just to ensure they are in chronological order
         trash_dates.sort(key=lambda x: x[0])
 
-        self.logger.debug("Found %i trash dates and filtered them to %i dates", len(calendar.events), len(trash_dates))
+        self.logger.debug("Found %i trash dates and filtered them to %i dates", len(events), len(trash_dates))
         for trash_date, trash_type in trash_dates:
             self.logger.debug("%s - %s %s", trash_date.strftime('%m %d'), trash_type, TRASH_COLORS.get(trash_type))
 
         return trash_dates
 
+    async def fetch_ics(self, cache_file: Path, fetch_info: dict) -> bool:
+        """
+        Fetches the ICS file into the cache file.
+        If the fetch info contains validators of the cached file a conditional request is sent which
+        does not download the file again if it was not modified.
+        """
+        headers = {}
+        if fetch_info.get("etag"):
+            headers["If-None-Match"] = fetch_info["etag"]
+        if fetch_info.get("last_modified"):
+            headers["If-Modified-Since"] = fetch_info["last_modified"]
+        self.logger.debug("Requesting '%s' (%s)", fetch_info["url"], headers)
+
+        try:
+            async with aiohttp.ClientSession(headers=FETCH_USER_AGENT) as session:
+                async with session.get(fetch_info["url"], headers=headers) as response:
+                    if response.status == 304:
+                        self.logger.debug("Calendar was not modified")
+                    elif response.status == 200:
+                        content = await response.read()
+                        self.logger.debug("Fetched %i bytes", len(content))
+                        with open(cache_file, "wb") as f:
+                            f.write(content)
+                            self.logger.debug("Cached request in '%s'", cache_file)
+                        fetch_info["etag"] = response.headers.get("ETag")
+                        fetch_info["last_modified"] = response.headers.get("Last-Modified")
+                    else:
+                        self.logger.error(f"HTTP error {response.status} while fetching calendar URL")
+                        return False
+        except aiohttp.ClientError as e:
+            self.logger.error(f"Error fetching calendar URL: {e}")
+            return False
+
+        fetch_info["checked"] = self.clock.now().isoformat(timespec="seconds")
+        write_json_atomic(FETCH_INFO_FILE, fetch_info)
+        return True
+
     async def fetch_and_parse_ics(self, cache_file: Path) -> Optional[list[TrashEvent]]:
         self.logger.info("fetch_and_parse_ics")
         """
@@ -99,120 +165,169 @@ class Plugin(PluginBase):
         Caches the file locally to reduce web requests.
         """
 
-        if self.calendar_url is None:
+        if self.calendar_file is not None:
+            # Local calendar, nothing to fetch
+            cache_file = self.calendar_file
+        elif self.calendar_url is None:
             self.logger.error("calendar_url is None")
             return None
-
-        # Fetch ICS file if not cached or older than 100 days
-        today = datetime.now().date() + DEBUG_DAY_OFFSET
-        future_date = today + timedelta(days=DAY_DELTA * 2)
-        date_range = f"{today.strftime('%Y%m%d')}-{future_date.strftime('%Y%m%d')}"
-
-        # Check if the cache file needs to be updated
-        if not os.path.exists(cache_file) or \
-                datetime.now() - datetime.fromtimestamp(os.path.getmtime(cache_file)) > timedelta(days=DAY_DELTA):
-            calendar_url = f"{self.calendar_url}&timeperiod={date_range}"
-            self.logger.debug("Requesting '%s'", calendar_url)
-
-            try:
-                async with aiohttp.ClientSession(headers=FETCH_USER_AGENT) as session:
-                    async with session.get(calendar_url) as response:
-                        if response.status == 200:
-                            content = await response.read()
-                            self.logger.debug("Fetched '%s'", content)
-                            with open(cache_file, "wb") as f:
-                                f.write(content)
-                                self.logger.debug("Cached request in '%s'", cache_file)
-                        else:
-                            self.logger.error(f"HTTP error {response.status} while fetching calendar URL")
-                            return None
-            except aiohttp.ClientError as e:
-                self.logger.error(f"Error fetching calendar URL: {e}")
-                return None
+        else:
+            # Request a new time period if the ICS file is not cached or its time period started too long ago
+            today = self.clock.now().date() + DEBUG_DAY_OFFSET
+            fetch_info = load_json(FETCH_INFO_FILE)
+            period_start: Optional[date] = None
+            # Invalid (e.g. corrupt) fetch info or fetch info of another calendar URL is treated like missing info
+            if fetch_info is not None and "url" in fetch_info and \
+                    fetch_info.get("calendar_url") == self.calendar_url:
+                try:
+                    period_start = date.fromisoformat(fetch_info.get("period_start"))
+                except (TypeError, ValueError) as e:
+                    self.logger.warning(f"Invalid fetch info in '{FETCH_INFO_FILE}': {e}")
+            if not os.path.exists(cache_file) or period_start is None or \
+                    today - period_start > timedelta(days=DAY_DELTA):
+                future_date = today + timedelta(days=DAY_DELTA * 2)
+                date_range = f"{today.strftime('%Y%m%d')}-{future_date.strftime('%Y%m%d')}"
+                fetch_info = {"url": f"{self.calendar_url}&timeperiod={date_range}", "calendar_url": self.calendar_url,
+                              "period_start": today.isoformat()}
+                if not await self.fetch_ics(cache_file, fetch_info):
+                    return None
+            # Otherwise only check if the calendar of the current time period changed
+            elif not await self.fetch_ics(cache_file, fetch_info):
+                self.logger.warning(f"Use cached calendar from {fetch_info.get('checked')}")
 
         # Parse ICS file
         try:
-            calendar = self.parse_ics(cache_file)
-            trash_dates = self.get_trash_dates(calendar)
+            events = self.parse_ics(cache_file)
+            trash_dates = self.get_trash_dates(events)
             return trash_dates
         except FailedToken as e:
             self.logger.error(f"Parsing failed: {e}")
         except ParseError as e:
             self.logger.error(f"Parsing error: {e}")
 
-        # Remove cache file on error
-        if os.path.exists(cache_file):
-            os.remove(cache_file)
-            self.logger.warning(f"Removed cache file after errors: {cache_file}")
+        # Remove cache files on error
+        for file in (PARSED_CACHE_FILE,) if self.calendar_file is not None else \
+                (cache_file, PARSED_CACHE_FILE, FETCH_INFO_FILE):
+            if os.path.exists(file):
+                os.remove(file)
+                self.logger.warning(f"Removed cache file after errors: {file}")
         return None
 
+    def update_trash_notifications(self):
+        """Update which trash needs to be taken out or brought in (and register the button callbacks)"""
+        self.trash_type_take_out = []
+        self.trash_type_bring_in = []
+
+        if self.current_trash_dates is not None and len(self.current_trash_dates) > 0:
+            current_time = self.clock.now() + self.timedelta_offset
+            tomorrow_time = current_time + timedelta(days=1)
+            notification_time_take_out = datetime.combine(tomorrow_time.date(), time(0, 0)) - timedelta(hours=self.hour_offset_trash_notification)
+            notification_time_bring_in = datetime.combine(current_time.date(), time(0, 0)) + timedelta(hours=self.hour_offset_trash_notification)
+
+            for trash_date, trash_type in self.current_trash_dates:
+                trash_was_taken_out = trash_type in self.trash_taken_out and trash_date == self.trash_taken_out[trash_type]
+                trash_should_be_taken_out = trash_date.date() == tomorrow_time.date() and current_time >= notification_time_take_out
+                if trash_should_be_taken_out and not trash_was_taken_out:
+                    self.trash_type_take_out.append(trash_type)
+
+                    def take_out_trash(current_trash_date: datetime, current_trash_type: TrashType):
+                        self.logger.debug(f"clicked black button: take_out_trash")
+                        self.led_rgb_main.color = 0, 0, 0
+                        self.led_rgb_info.color = 0, 0, 0
+                        self.trash_taken_out[current_trash_type] = current_trash_date
+                        self.trash_type_take_out = list(filter(lambda x: x != current_trash_type, self.trash_type_take_out))
+                        self.logger.debug(f"deregistered when pressed black button: take_out_trash {current_trash_type} ({current_trash_date})")
+                        self.button_black.when_pressed = None
+
+                    self.logger.debug(f"registered when pressed black button: take_out_trash")
+                    self.button_black.when_pressed = lambda current_trash_date=trash_date, current_trash_type=trash_type: take_out_trash(current_trash_date, current_trash_type)
+
+                trash_was_brought_in = trash_type in self.trash_brought_in and trash_date == self.trash_brought_in[trash_type]
+                trash_should_be_taken_in = trash_date.date() == current_time.date() and current_time >= notification_time_bring_in
+                if trash_should_be_taken_in and not trash_was_brought_in:
+                    self.trash_type_bring_in.append(trash_type)
+
+                    def bring_in_trash(current_trash_date: datetime, current_trash_type: TrashType):
+                        self.logger.debug(f"clicked black button: take_out_trash")
+                        self.led_rgb_main.color = 0, 0, 0
+                        self.led_rgb_info.color = 0, 0, 0
+                        self.trash_brought_in[current_trash_type] = current_trash_date
+                        self.trash_type_bring_in = list(filter(lambda x: x != current_trash_type, self.trash_type_bring_in))
+                        self.logger.debug(f"deregistered when pressed black button: bring_in_trash {current_trash_type} ({current_trash_date})")
+                        self.button_black.when_pressed = None
+
+                    self.logger.debug(f"registered when pressed black button: bring_in_trash")
+                    self.button_black.when_pressed = lambda current_trash_date=trash_date, current_trash_type=trash_type: bring_in_trash(current_trash_date, current_trash_type)
+
+    def get_next_notification_time(self, current_time: datetime) -> Optional[datetime]:
+        """
+        Get the next time a take-out (the day before) or bring-in (the day of the trash date) notification window
+        opens or closes.
+        """
+        next_notification_time: Optional[datetime] = None
+        for trash_date, _ in self.current_trash_dates or []:
+            trash_day_start = datetime.combine(trash_date.date(), time(0, 0))
+            for notification_time in (
+                    trash_day_start - timedelta(hours=self.hour_offset_trash_notification),  # take out
+                    trash_day_start,  # take out ends
+                    trash_day_start + timedelta(hours=self.hour_offset_trash_notification),  # bring in
+                    trash_day_start + timedelta(days=1),  # bring in ends
+            ):
+                if notification_time > current_time and \
+                        (next_notification_time is None or notification_time < next_notification_time):
+                    next_notification_time = notification_time
+            # The trash dates are sorted so all later ones are only relevant if nothing was found yet
+            if next_notification_time is not None and trash_day_start > next_notification_time:
+                break
+        return next_notification_time
+
     async def run(self):
+        calendar_file = os.getenv('CALENDAR_FILE', '')
         calendar_url = os.getenv('CALENDAR_URL', '')
-        if not calendar_url:
-            raise RuntimeError("CALENDAR_URL environment variable not set.")
+        if calendar_file:
+            self.calendar_file = Path(calendar_file)
+        elif not calendar_url:
+            raise RuntimeError("CALENDAR_URL (or CALENDAR_FILE) environment variable not set.")
         self.calendar_url = calendar_url
 
         # Schedule periodic checks and button handling
         retry_delay_ics = 1
+        next_calendar_check = self.clock.now()
 
         while True:
-            self.logger.debug("Run loop...")
-            trash_dates = await self.fetch_and_parse_ics(CACHE_FILE)
-            if trash_dates is None:
-                self.logger.warning(f"Unable to get trash dates ({retry_delay_ics=}s)")
-                await asyncio.sleep(retry_delay_ics)
-                retry_delay_ics = min(2 * retry_delay_ics, 60 * 60)
-                continue
-            retry_delay_ics = 1
-            self.current_trash_dates = trash_dates
-
-            self.trash_type_take_out = []
-            self.trash_type_bring_in = []
-
-            if self.current_trash_dates is not None and len(self.current_trash_dates) > 0:
-                current_time = datetime.now() + self.timedelta_offset
-                tomorrow_time = current_time + timedelta(days=1)
-                notification_time_take_out = datetime.combine(tomorrow_time.date(), time(0, 0)) - timedelta(hours=self.hour_offset_trash_notification)
-                notification_time_bring_in = datetime.combine(current_time.date(), time(0, 0)) + timedelta(hours=self.hour_offset_trash_notification)
-
-                for trash_date, trash_type in self.current_trash_dates:
-                    trash_was_taken_out = trash_type in self.trash_taken_out and trash_date == self.trash_taken_out[trash_type]
-                    trash_should_be_taken_out = trash_date.date() == tomorrow_time.date() and current_time >= notification_time_take_out
-                    if trash_should_be_taken_out and not trash_was_taken_out:
-                        self.trash_type_take_out.append(trash_type)
-
-                        def take_out_trash(current_trash_date: datetime, current_trash_type: TrashType):
-                            self.logger.debug(f"clicked black button: take_out_trash")
-                            self.led_rgb_main.color = 0, 0, 0
-                            self.led_rgb_info.color = 0, 0, 0
-                            self.trash_taken_out[current_trash_type] = current_trash_date
-                            self.trash_type_take_out = list(filter(lambda x: x != current_trash_type, self.trash_type_take_out))
-                            self.logger.debug(f"deregistered when pressed black button: take_out_trash {current_trash_type} ({current_trash_date})")
-                            self.button_black.when_pressed = None
-
-                        self.logger.debug(f"registered when pressed black button: take_out_trash")
-                        self.button_black.when_pressed = lambda current_trash_date=trash_date, current_trash_type=trash_type: take_out_trash(current_trash_date, current_trash_type)
-
-                    trash_was_brought_in = trash_type in self.trash_brought_in and trash_date == self.trash_brought_in[trash_type]
-                    trash_should_be_taken_in = trash_date.date() == current_time.date() and current_time >= notification_time_bring_in
-                    if trash_should_be_taken_in and not trash_was_brought_in:
-                        self.trash_type_bring_in.append(trash_type)
-
-                        def bring_in_trash(current_trash_date: datetime, current_trash_type: TrashType):
-                            self.logger.debug(f"clicked black button: take_out_trash")
-                            self.led_rgb_main.color = 0, 0, 0
-                            self.led_rgb_info.color = 0, 0, 0
-                            self.trash_brought_in[current_trash_type] = current_trash_date
-                            self.trash_type_bring_in = list(filter(lambda x: x != current_trash_type, self.trash_type_bring_in))
-                            self.logger.debug(f"deregistered when pressed black button: bring_in_trash {current_trash_type} ({current_trash_date})")
-                            self.button_black.when_pressed = None
-
-                        self.logger.debug(f"registered when pressed black button: bring_in_trash")
-                        self.button_black.when_pressed = lambda current_trash_date=trash_date, current_trash_type=trash_type: bring_in_trash(current_trash_date, current_trash_type)
-
-
-            #await asyncio.sleep(10)  # For debugging update this to be 1!
-            await asyncio.sleep(60 * 60)  # Check once every hour
+            if self.clock.now() >= next_calendar_check:
+                self.logger.debug("Run loop...")
+                trash_dates = await self.fetch_and_parse_ics(CACHE_FILE)
+                if trash_dates is None:
+                    self.logger.warning(f"Unable to get trash dates ({retry_delay_ics=}s)")
+                    await asyncio.sleep(retry_delay_ics)
+                    retry_delay_ics = min(2 * retry_delay_ics, 60 * 60)
+                    continue
+                retry_delay_ics = 1
+                self.current_trash_dates = trash_dates
+                next_calendar_check = self.clock.now() + CALENDAR_CHECK_INTERVAL
+
+            self.update_trash_notifications()
+
+            # Sleep until the next notification window opens/closes or the calendar needs to be checked again
+            current_time = self.clock.now() + self.timedelta_offset
+            next_notification_time = self.get_next_notification_time(current_time)
+            deadline = next_calendar_check
+            if next_notification_time is not None:
+                deadline = min(deadline, next_notification_time - self.timedelta_offset)
+            self.logger.debug(f"Sleep until {deadline} ({next_notification_time=})")
+            await self.scheduler.sleep_until(deadline, self.wakeup)
+            # Consumed, the notifications are recalculated for a wakeup that was set while fetching or sleeping
+            self.wakeup.clear()
+
+    def release(self):
+        # The take out/bring in callbacks reference this instance
+        self.button_black.when_pressed = None
+
+    def debug_set_timedelta_offset(self, timedelta_offset: timedelta):
+        super().debug_set_timedelta_offset(timedelta_offset)
+        # Recalculate the notifications for the new time
+        self.wakeup.set()
 
     async def request_widgets(self):
         if self.current_trash_dates is not None:
@@ -241,14 +356,14 @@ class Plugin(PluginBase):
             actions.append(Action(generate_content=lambda: ActionContent(
                 ("info_white", "Take trash out", trash_type_take_out)
             )))
-            checksum += trash_type_take_out + datetime.now().strftime('%d.%m')
+            checksum += trash_type_take_out + self.clock.now().strftime('%d.%m')
         for trash_type_bring_in in self.trash_type_bring_in:
             self.led_rgb_main.color = 1, 1, 0
             self.led_rgb_info.color = TRASH_COLORS.get(trash_type_bring_in, (0, 0, 0))
             actions.append(Action(generate_content=lambda: ActionContent(
                 ("info_white", "Bring trash in", trash_type_bring_in)
             )))
-            checksum += trash_type_bring_in + datetime.now().strftime('%d.%m')
+            checksum += trash_type_bring_in + self.clock.now().strftime('%d.%m')
         change_detected = ChangeDetected(self.last_checksum_actions != checksum)
         self.last_checksum_actions = checksum
         return actions, change_detected
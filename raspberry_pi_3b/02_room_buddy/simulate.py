@@ -0,0 +1,167 @@
+# Run this file to simulate the room buddy headless in virtual time (e.g. a week of plugin behavior in seconds)
+# The rendered frames and the LED changes are written to the output directory.
+# CALENDAR_FILE=res/trash_dates.ics python simulate.py --days 7 --press black@2025-01-07T20:00
+# python simulate.py --start 2025-01-06T00:00 --days 1 --press red@+6h --press black@+30m
+
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from lib.clock.clock import VirtualClock
+from lib.simulation.virtual_time import VirtualTimeEventLoop
+from lib.simulated_electronic_components.simulated_button import SimulatedButton
+from lib.simulated_electronic_components.simulated_led_rgb import SimulatedRGBLED
+
+import pins
+from lib.render.render import render_display_bw
+from lib.plugins.plugin_manager import PluginManager
+
+SCRIPT_DIR = Path(__file__).parent
+OUTPUT_DIR = SCRIPT_DIR.joinpath("data", "simulation")
+
+logger_id = "room_buddy"
+
+
+def parse_time(value: str, start: datetime) -> datetime:
+    """Absolute ISO time (2025-01-07T20:00) or an offset to the start (+1d, +6h, +30m, +1d2h)"""
+    match = re.fullmatch(r"\+(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?", value)
+    if match is None:
+        return datetime.fromisoformat(value)
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return start + timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def parse_press(value: str, start: datetime) -> tuple[str, datetime]:
+    """Button press in the format BUTTON@TIME (e.g. black@+1d6h)"""
+    button, _, press_time = value.partition("@")
+    if button not in ("red", "black") or not press_time:
+        raise argparse.ArgumentTypeError(f"Invalid button press '{value}' (expected red@TIME or black@TIME)")
+    return button, parse_time(press_time, start)
+
+
+class VirtualTimeLogFilter(logging.Filter):
+    """Adds the virtual time to the log records (the record time is the real time)"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.virtual_time = self.clock.now().strftime('%Y-%m-%d %H:%M:%S')
+        return True
+
+
+async def simulate(clock: VirtualClock, end: datetime, presses: list[tuple[str, datetime]], output_dir: Path,
+                   display_resolution: tuple[int, int], poll_interval: float, update_interval: float,
+                   logger: logging.Logger) -> dict:
+    button_red = SimulatedButton(pins.gpio_pin_input_pullup_button_red)
+    button_black = SimulatedButton(pins.gpio_pin_input_pullup_button_black)
+    led_rgb_main = SimulatedRGBLED(pins.gpio_pins_output_pwm_led_rgb_main, clock)
+    led_rgb_info = SimulatedRGBLED(pins.gpio_pins_output_pwm_led_rgb_info, clock)
+
+    # Script the button presses
+    loop = asyncio.get_running_loop()
+    buttons = {"red": button_red, "black": button_black}
+    for button, press_time in presses:
+        loop.call_later((press_time - clock.now()).total_seconds(), buttons[button].simulate_press)
+
+    plugin_manager = PluginManager(Path("plugins"), logger,
+                                   led_rgb_main=led_rgb_main, led_rgb_info=led_rgb_info,
+                                   button_red=button_red, button_black=button_black,
+                                   simulate_circuit=True, timedelta_offset=timedelta(days=0), clock=clock)
+    await plugin_manager.load_plugins()
+    plugins_task = asyncio.create_task(plugin_manager.start_plugins())
+
+    frames_dir = output_dir.joinpath("frames")
+    frames_dir.mkdir(parents=True, exist_ok=True)
+    frames = 0
+    render_duration = 0.0
+    # Same display loop as main.py
+    while clock.now() < end:
+        actions, actions_changed = await plugin_manager.request_actions()
+        widgets, widgets_changed = await plugin_manager.request_widgets()
+        if actions_changed or widgets_changed:
+            render_start_time = time.perf_counter()
+            image = render_display_bw(
+                [action for group in actions.values() for action in group],
+                [widget for group in widgets.values() for widget in group],
+                display_resolution=display_resolution
+            )
+            render_duration += time.perf_counter() - render_start_time
+            image.save(frames_dir.joinpath(f"{frames:05d}_{clock.now().strftime('%Y%m%d_%H%M%S')}.png"))
+            frames += 1
+            await asyncio.sleep(update_interval)
+        else:
+            await asyncio.sleep(poll_interval)
+
+    plugins_task.cancel()
+    for plugin_info in list(plugin_manager.plugin_infos.values()):
+        await plugin_manager.stop_plugin(plugin_info)
+
+    with open(output_dir.joinpath("leds.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["led", "time", "red", "green", "blue"])
+        for name, led in (("main", led_rgb_main), ("info", led_rgb_info)):
+            for change_time, color in led.history:
+                writer.writerow([name, change_time.isoformat(timespec="seconds"), *color])
+
+    return {
+        "frames": frames,
+        "render_ms": render_duration * 1000,
+        "button_presses": {name: button.press_count for name, button in buttons.items()},
+        "led_changes": len(led_rgb_main.history) + len(led_rgb_info.history),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the room buddy headless in virtual time")
+    parser.add_argument("--start", default=None, help="Virtual start time (ISO format, default: now)")
+    parser.add_argument("--days", type=float, default=7, help="Simulated duration in days")
+    parser.add_argument("--press", action="append", default=[], metavar="BUTTON@TIME",
+                        help="Scripted button press (e.g. black@2025-01-07T20:00 or red@+1d6h), can be repeated")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR,
+                        help="Directory of the frames, LED changes and databases")
+    parser.add_argument("--resolution", default="800x480")
+    parser.add_argument("--poll-interval", type=float, default=2, help="Seconds between the plugin requests")
+    parser.add_argument("--update-interval", type=float, default=10, help="Seconds after a display update")
+    args = parser.parse_args()
+
+    start = datetime.fromisoformat(args.start) if args.start else datetime.now()
+    presses = [parse_press(value, start) for value in args.press]
+    display_resolution = tuple(int(x) for x in args.resolution.split("x"))
+    output_dir: Path = args.output
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Keep the simulated measurements out of the real databases
+    os.environ.setdefault("ROOM_BUDDY_DATA_DIR", str(output_dir.joinpath("data")))
+
+    clock = VirtualClock(start)
+    logging.basicConfig(format="[%(virtual_time)s] %(levelname)s %(message)s")
+    logger = logging.getLogger(logger_id)
+    logger.setLevel(logging.INFO)
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(VirtualTimeLogFilter(clock))
+
+    loop = VirtualTimeEventLoop(clock)
+    asyncio.set_event_loop(loop)
+    real_start_time = time.perf_counter()
+    try:
+        result = loop.run_until_complete(simulate(
+            clock, start + timedelta(days=args.days), presses, output_dir, display_resolution,
+            args.poll_interval, args.update_interval, logger))
+    except KeyboardInterrupt:
+        print("Received exit, exiting safely")
+        return
+    real_duration = time.perf_counter() - real_start_time
+    print(f"Simulated {clock.now() - start} in {real_duration:.1f}s: {result['frames']} frames "
+          f"({result['render_ms']:.0f} ms rendering), {result['led_changes']} LED changes, "
+          f"button presses {result['button_presses']} -> {output_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# Measures the SPI throughput (MB/s) to the e-paper display controller at different SPI clocks
+# (the controller is initialized and put back to sleep, the panel content is not changed)
+
+# python -m venv test_epd_spi
+# source test_epd_spi/bin/activate
+# pip install gpiozero lgpio spidev
+# python -m test_epd_spi
+# EPD_SIMULATED=1 python -m test_epd_spi
+
+import sys
+import os
+libdir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'lib')
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+import logging
+from waveshare_epd import epd7in5_V2, epdconfig
+
+logging.basicConfig(level=logging.INFO)
+
+SPI_SPEEDS_HZ = [2000000, 4000000, 8000000, epdconfig.SPI_SPEED_HZ_MAX]
+
+
+def main():
+    epd = epd7in5_V2.EPD()
+    frame_size = epd.width // 8 * epd.height
+    epd.init()
+    try:
+        for speed_hz in SPI_SPEEDS_HZ:
+            speed_hz = epdconfig.set_spi_speed(speed_hz)
+            throughput = epdconfig.spi_throughput_test(frame_size)
+            if speed_hz is None:
+                # software SPI (Jetson Nano), the clock can't be set
+                print(f"SPI: {throughput:6.3f} MB/s ({frame_size / (throughput * 1e6) * 1000:.1f} ms per frame plane)")
+                break
+            print(f"SPI clock {speed_hz / 1e6:5.1f} MHz: {throughput:6.3f} MB/s "
+                  f"({frame_size / (throughput * 1e6) * 1000:.1f} ms per frame plane, "
+                  f"{throughput * 8e6 / speed_hz * 100:.0f}% of the clock)")
+    finally:
+        epdconfig.set_spi_speed(epdconfig.spi_speed_from_env())
+        epd.sleep()
+
+
+if __name__ == '__main__':
+    main()
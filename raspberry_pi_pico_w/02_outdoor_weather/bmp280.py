@@ -1,5 +1,6 @@
 from micropython import const
 from ustruct import unpack as unp
+from utime import sleep_ms, ticks_diff, ticks_ms
 
 # Author David Stenwall (david at stenwall.io)
 
@@ -76,6 +77,18 @@ _BMP280_CASE_MATRIX = [
     [BMP280_POWER_NORMAL, BMP280_OS_ULTRAHIGH, BMP280_IIR_FILTER_16, BMP280_STANDBY_0_5]
 ]
 
+# Forced mode presets (one measurement per trigger, sleep mode in between)
+BMP280_FORCED_WEATHER = const(0)  # Datasheet weather monitoring (lowest power)
+BMP280_FORCED_LOW_NOISE = const(1)
+BMP280_FORCED_HIGH_RESOLUTION = const(2)
+
+# (Oversampling, IIR filter)
+_BMP280_FORCED_MATRIX = [
+    [BMP280_OS_ULTRALOW, BMP280_IIR_FILTER_OFF],
+    [BMP280_OS_STANDARD, BMP280_IIR_FILTER_4],
+    [BMP280_OS_ULTRAHIGH, BMP280_IIR_FILTER_16],
+]
+
 _BMP280_REGISTER_ID = const(0xD0)
 _BMP280_REGISTER_RESET = const(0xE0)
 _BMP280_REGISTER_STATUS = const(0xF3)
@@ -85,6 +98,18 @@ _BMP280_REGISTER_CONFIG = const(0xF5)  # IIR filter config
 _BMP280_REGISTER_DATA = const(0xF7)
 
 
+def _mul_shift(a, b, shift):
+    # Calculate (a * b) >> shift exactly without creating big integer intermediate values
+    # by splitting b into its high and low bits (a * b = a * b_high << shift + a * b_low)
+    return a * (b >> shift) + ((a * (b & ((1 << shift) - 1))) >> shift)
+
+
+def _mul_div(a, b, c):
+    # Calculate (a * b) // c exactly for a >= 0, c > 0 without creating big integer
+    # intermediate values (a * b = (a // c) * c * b + (a % c) * b)
+    return (a // c) * b + ((a % c) * b) // c
+
+
 class BMP280:
     def __init__(self, i2c_bus, addr=0x76, use_case=BMP280_CASE_HANDHELD_DYN):
         self._bmp_i2c = i2c_bus
@@ -107,6 +132,9 @@ class BMP280:
         self._P8 = unp('<h', self._read(0x9C, 2))[0]
         self._P9 = unp('<h', self._read(0x9E, 2))[0]
 
+        # preallocated buffer for reading all data registers at once
+        self._data = bytearray(6)
+
         # output raw
         self._t_raw = 0
         self._t_fine = 0
@@ -133,7 +161,8 @@ class BMP280:
     def _gauge(self):
         # TODO limit new reads
         # read all data at once (as by spec)
-        d = self._read(_BMP280_REGISTER_DATA, 6)
+        d = self._data
+        self._bmp_i2c.readfrom_mem_into(self._i2c_addr, _BMP280_REGISTER_DATA, d)
 
         self._p_raw = (d[0] << 12) + (d[1] << 4) + (d[2] >> 4)
         self._t_raw = (d[3] << 12) + (d[4] << 4) + (d[5] >> 4)
@@ -219,16 +248,61 @@ class BMP280:
             self._p = p / 256.0
         return self._p
 
+    def read(self):
+        """
+        Read temperature and pressure using a single burst read of the data registers.
+        Returns the temperature in 0.01 degrees Celsius and the pressure in Pascal as
+        integers calculated with the 32-bit integer compensation of the datasheet
+        (no floats and no big integers are created for normal sensor values).
+        """
+        self._gauge()
+        return self._compensate()
+
+    def _compensate(self):
+        # From datasheet page 45-46 (32-bit integer compensation formulas)
+        adc_t = self._t_raw
+        var1 = _mul_shift(self._T2, (adc_t >> 3) - (self._T1 << 1), 11)
+        var2 = (adc_t >> 4) - self._T1
+        var2 = _mul_shift(self._T3, _mul_shift(var2, var2, 12), 14)
+        t_fine = var1 + var2
+        self._t_fine = t_fine
+        t = (t_fine * 5 + 128) >> 8
+
+        var1 = (t_fine >> 1) - 64000
+        var1_4 = var1 >> 2
+        var2 = _mul_shift(var1_4, var1_4, 11) * self._P6
+        var2 = var2 + ((var1 * self._P5) << 1)
+        var2 = (var2 >> 2) + (self._P4 << 16)
+        var1 = (
+            _mul_shift(self._P3, _mul_shift(var1_4, var1_4, 13), 3)
+            + _mul_shift(self._P2, var1, 1)
+        ) >> 18
+        # ((32768 + var1) * P1) >> 15
+        var1 = self._P1 + ((var1 * self._P1) >> 15)
+        if var1 == 0:
+            # avoid exception caused by division by zero
+            return t, 0
+        p = 1048576 - self._p_raw - (var2 >> 12)
+        # (p * 3125) is an unsigned 32-bit value in the datasheet
+        if p < 687195:  # p * 3125 < 0x80000000
+            p = _mul_div(p, 3125 << 1, var1)
+        else:
+            p = _mul_div(p, 3125, var1) << 1
+        var1 = (self._P9 * (((p >> 3) * (p >> 3)) >> 13)) >> 12
+        var2 = ((p >> 2) * self._P8) >> 13
+        p = p + ((var1 + var2 + self._P7) >> 4)
+        return t, p
+
     def _write_bits(self, address, value, length, shift=0):
         d = self._read(address)[0]
-        m = int('1' * length, 2) << shift
+        m = ((1 << length) - 1) << shift
         d &= ~m
         d |= m & value << shift
         self._write(address, d)
 
     def _read_bits(self, address, length, shift=0):
         d = self._read(address)[0]
-        return d >> shift & int('1' * length, 2)
+        return d >> shift & ((1 << length) - 1)
 
     @property
     def standby(self):
@@ -319,4 +393,30 @@ class BMP280:
     def oversample(self, oss):
         assert 0 <= oss <= 4
         p_os, t_os, self.read_wait_ms = _BMP280_OS_MATRIX[oss]
-        self._write_bits(_BMP280_REGISTER_CONTROL, p_os + (t_os << 3), 2)
+        self._write_bits(_BMP280_REGISTER_CONTROL, p_os + (t_os << 3), 6, 2)
+
+    def use_forced(self, preset):
+        """
+        Configure oversampling and IIR filter of a forced mode preset and put the
+        sensor to sleep until a measurement is triggered with measure_forced.
+        """
+        assert 0 <= preset <= 2
+        oss, iir = _BMP280_FORCED_MATRIX[preset]
+        self.sleep()
+        self.oversample(oss)
+        self.iir = iir
+
+    def measure_forced(self, timeout_ms=100):
+        """
+        Trigger a single measurement, wait until it's finished and read it
+        (the sensor automatically returns to sleep mode afterwards).
+        Returns the same values as read.
+        """
+        self.force_measure()
+        sleep_ms(self.read_wait_ms)
+        start = ticks_ms()
+        while self.is_measuring:
+            if ticks_diff(ticks_ms(), start) > timeout_ms:
+                raise OSError("BMP280 measurement timed out")
+            sleep_ms(1)
+        return self.read()
@@ -1,16 +1,45 @@
+import os
+import time
+
 from timestamp import get_iso_timestamp
 
 
+LEVELS = {
+    "DEBUG": 10,
+    "INFO": 20,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+}
+
+
+def get_level_number(level, default=20):
+    """
+    Convert a level name (e.g. "DEBUG") or number into its number.
+    """
+    if isinstance(level, int):
+        return level
+    return LEVELS.get(level.upper(), default)
+
+
 class LogRecord:
     """
     Represents a single log record.
+    The message is only built from the arguments when it is accessed for the first time.
     """
 
-    def __init__(self, level, message, name):
+    def __init__(self, level, args, name):
         self.level = level
-        self.message = message
+        self.args = args
         self.name = name
         self.timestamp = get_iso_timestamp()
+        self._message = None
+
+    @property
+    def message(self):
+        if self._message is None:
+            self._message = " ".join(str(arg) for arg in self.args)
+        return self._message
 
 
 class LogFormatter:
@@ -35,12 +64,16 @@ class LogHandler:
     Base class for all log handlers.
     """
 
-    def __init__(self, formatter=None):
+    def __init__(self, formatter=None, level="DEBUG"):
         self.formatter = formatter or LogFormatter()
+        self.level = get_level_number(level)
 
     def setFormatter(self, formatter):
         self.formatter = formatter
 
+    def setLevel(self, level):
+        self.level = get_level_number(level)
+
     def emit(self, record):
         """
         Processes a log record.
@@ -48,6 +81,20 @@ class LogHandler:
         """
         raise NotImplementedError("LogHandler subclasses must implement 'emit' method")
 
+    def flush(self):
+        """
+        Write out any buffered log records.
+        Only needs to be overridden by subclasses that buffer records.
+        """
+        pass
+
+    def flush_if_due(self):
+        """
+        Write out any buffered log records if the handler wants to.
+        Only needs to be overridden by subclasses that buffer records.
+        """
+        pass
+
 
 class LogHandlerConsole(LogHandler):
     """
@@ -64,8 +111,8 @@ class LogHandlerFile(LogHandler):
     A log handler that writes log records to a specified log file.
     """
 
-    def __init__(self, log_file, formatter=None):
-        super().__init__(formatter)
+    def __init__(self, log_file, formatter=None, level="DEBUG"):
+        super().__init__(formatter, level)
         self.log_file = log_file
 
     def emit(self, record):
@@ -77,41 +124,200 @@ class LogHandlerFile(LogHandler):
             print(f"Failed to write log to {self.log_file}: {e}")
 
 
+class LogHandlerFileBuffered(LogHandler):
+    """
+    A log handler that collects log records in memory and appends them to a log file in batches.
+    The buffer is written when it contains too many records, when a record of the flush level
+    is emitted or when the flush interval passed.
+    If the log file gets bigger than the maximum size it is rotated (the previous rotated file
+    is overwritten).
+    """
+
+    def __init__(
+        self,
+        log_file,
+        formatter=None,
+        level="DEBUG",
+        buffer_size=20,
+        flush_interval_ms=60 * 1000,
+        flush_level="ERROR",
+        max_file_size=64 * 1024,
+        backup_count=1,
+    ):
+        super().__init__(formatter, level)
+        self.log_file = log_file
+        self.buffer = []
+        self.buffer_size = buffer_size
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_level = get_level_number(flush_level)
+        self.max_file_size = max_file_size
+        self.backup_count = backup_count
+        self.last_flush = time.ticks_ms()
+
+    def emit(self, record):
+        self.buffer.append(self.formatter.format(record))
+        if (
+            len(self.buffer) >= self.buffer_size
+            or LEVELS[record.level] >= self.flush_level
+        ):
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """
+        Write out the buffered log records if the flush interval passed.
+        """
+        if (
+            len(self.buffer) > 0
+            and time.ticks_diff(time.ticks_ms(), self.last_flush) >= self.flush_interval_ms
+        ):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.ticks_ms()
+        if len(self.buffer) == 0:
+            return
+        try:
+            self.rotate_if_needed()
+            with open(self.log_file, 'a') as file:
+                for log_entry in self.buffer:
+                    file.write(log_entry)
+                    file.write('\n')
+        except Exception as e:
+            print(f"Failed to write log to {self.log_file}: {e}")
+        # Drop the records even on errors to never run out of memory
+        self.buffer.clear()
+
+    def rotate_if_needed(self):
+        """
+        Rotate the log file (logs.log -> logs.log.1 -> logs.log.2 ...) if it is too big.
+        """
+        try:
+            file_size = os.stat(self.log_file)[6]
+        except OSError:
+            # Log file does not exist yet
+            return
+        if file_size < self.max_file_size:
+            return
+        for i in range(self.backup_count, 0, -1):
+            source = self.log_file if i == 1 else f"{self.log_file}.{i - 1}"
+            destination = f"{self.log_file}.{i}"
+            try:
+                os.remove(destination)
+            except OSError:
+                pass
+            try:
+                os.rename(source, destination)
+            except OSError:
+                pass
+        if self.backup_count == 0:
+            os.remove(self.log_file)
+
+
 class Logger:
     """
     A lightweight logger for MicroPython with handler support.
+    Messages are only built if at least one handler is going to emit them and repeated
+    messages can be collapsed into a single "repeated N times" message.
     """
 
-    LEVELS = {
-        "DEBUG": 10,
-        "INFO": 20,
-        "WARNING": 30,
-        "ERROR": 40,
-        "CRITICAL": 50,
-    }
+    LEVELS = LEVELS
 
-    def __init__(self, name, level="INFO"):
+    def __init__(self, name, level="INFO", rate_limit_ms=None):
         self.name = name
-        self.level = self.LEVELS.get(level.upper(), 20)
+        self.level = get_level_number(level)
         self.handlers = []
+        # The lowest level of all handlers
+        self.handlers_level = LEVELS["CRITICAL"] + 1
+        # Rate limiter state (last level and arguments, # of suppressed repetitions, time)
+        self.rate_limit_ms = rate_limit_ms
+        self.last_level = None
+        self.last_args = None
+        self.last_repeat_count = 0
+        self.last_time = 0
 
     def setLevel(self, level):
-        self.level = self.LEVELS.get(level.upper(), 20)
+        self.level = get_level_number(level)
 
     def addHandler(self, handler):
         self.handlers.append(handler)
+        self.update_handlers_level()
+
+    def update_handlers_level(self):
+        """
+        Needs to be called if the level of an already added handler was changed.
+        """
+        self.handlers_level = min(
+            [handler.level for handler in self.handlers], default=LEVELS["CRITICAL"] + 1
+        )
+
+    def isEnabledFor(self, level):
+        """
+        Check if a message of this level would be emitted by any handler.
+        Can be used to skip building expensive log arguments.
+        """
+        level_number = LEVELS[level]
+        return level_number >= self.level and level_number >= self.handlers_level
 
     def log(self, level, *args):
         """
         Log a message if it meets the logging level.
-        Concatenates all arguments into a single message string.
+        Concatenates all arguments into a single message string (only if it is emitted).
         """
-        if self.LEVELS[level] >= self.level:
-            message = " ".join(str(arg) for arg in args)
-            record = LogRecord(level, message, self.name)
-            for handler in self.handlers:
+        if not self.isEnabledFor(level):
+            return
+        if self.rate_limit_ms is not None:
+            now = time.ticks_ms()
+            if (
+                level == self.last_level
+                and args == self.last_args
+                and time.ticks_diff(now, self.last_time) < self.rate_limit_ms
+            ):
+                self.last_repeat_count += 1
+                return
+            self.flush_repeated()
+            self.last_level = level
+            self.last_args = args
+            self.last_time = now
+        self.emit(LogRecord(level, args, self.name))
+
+    def emit(self, record):
+        level_number = LEVELS[record.level]
+        for handler in self.handlers:
+            if level_number >= handler.level:
                 handler.emit(record)
 
+    def flush_repeated(self):
+        """
+        Emit a summary message if the last message was suppressed by the rate limiter.
+        """
+        if self.last_repeat_count > 0:
+            repeat_count = self.last_repeat_count
+            self.last_repeat_count = 0
+            self.emit(
+                LogRecord(
+                    self.last_level,
+                    ("last message repeated", repeat_count, "times"),
+                    self.name,
+                )
+            )
+
+    def flush(self):
+        """
+        Write out suppressed repetitions and all buffered log records of the handlers.
+        """
+        self.flush_repeated()
+        for handler in self.handlers:
+            handler.flush()
+
+    def flush_if_due(self):
+        """
+        Write out buffered log records of the handlers which flush interval passed.
+        """
+        for handler in self.handlers:
+            handler.flush_if_due()
+
     def debug(self, *args):
         self.log("DEBUG", *args)
 
@@ -125,4 +331,4 @@ class Logger:
         self.log("ERROR", *args)
 
     def critical(self, *args):
-        self.log("CRITICAL", *args)
\ No newline at end of file
+        self.log("CRITICAL", *args)
@@ -1,4 +1,5 @@
 import network
+import select
 import socket
 import time
 import os
@@ -43,9 +44,19 @@ from time_difference import get_time_difference
 from log_helper import (
     Logger,
     LogHandlerConsole,
-    LogHandlerFile,
+    LogHandlerFileBuffered,
 )
 from print_history import PrintHistory, PrintHistoryLogHandler
+from measurement import (
+    Sensor,
+    Measurement,
+    MEASUREMENT_RECORDED,
+    MEASUREMENT_CHANGED_RAW,
+    MEASUREMENT_NOT_CHANGED,
+    MEASUREMENT_OUTSIDE_RANGE,
+    MEASUREMENT_STABILIZING,
+)
+from scheduler import Scheduler
 from html_helper import (
     generate_html,
     generate_html_button,
@@ -67,32 +78,43 @@ MICROSD_CARD_FILESYSTEM_PREFIX = const("/sd")
 AUTOMATIC_DEVICE_RESTART = const(not DEBUG)
 # Crashes and corrupts storage after long uptimes
 ENABLE_SD_CARD = const(False)
+# The SPI clock is negotiated up to this value after the initialization
+SD_CARD_BAUDRATE_MAX = const(20_000_000)  # Hertz
+# The amount of 512 byte blocks that are cached (written on filesystem sync)
+SD_CARD_CACHE_BLOCKS = const(8)
 
 BMP280_FREQUENCY_I2C = const(100000)  # Hertz (default 100kHz higher, fast mode 400kHz)
-BMP280_FREQUENCY = const(157)  # Hertz (WARNING: every 6.4ms!)
+# Trigger single measurements (forced mode) instead of measuring continuously every 6.4ms (normal mode)
+BMP280_FORCED_PRESET = BMP280_FORCED_WEATHER
+# The amount of failed readings in a row until the sensor and I2C bus are restarted
+BMP280_MAX_CONSECUTIVE_ERRORS = const(3)
 BMP280_TOLERANCE_AIR_PRESSURE = const(1 * 100)  # Pascal (Pascal * 100 to convert from Hectopascal)
 _BMP280_RANGE_AIR_PRESSURE_MIN = const(300 * 100)
 _BMP280_RANGE_AIR_PRESSURE_MAX = const(1100 * 100)
 BMP280_RANGE_AIR_PRESSURE = (_BMP280_RANGE_AIR_PRESSURE_MIN, _BMP280_RANGE_AIR_PRESSURE_MAX)
+BMP280_SCALE_AIR_PRESSURE = const(1)  # Store as Pascal (BMP280.read)
 BMP280_TOLERANCE_TEMPERATURE = const(0.5)  # Degrees Celsius
 _BMP280_RANGE_TEMPERATURE_MIN = const(-40)
 _BMP280_RANGE_TEMPERATURE_MAX = const(85)
 BMP280_RANGE_TEMPERATURE = (_BMP280_RANGE_TEMPERATURE_MIN, _BMP280_RANGE_TEMPERATURE_MAX)
+BMP280_SCALE_TEMPERATURE = const(100)  # Store as 0.01 Degrees Celsius (BMP280.read)
 
 DHT22_FREQUENCY = const(0.5)  # Hertz
 DHT22_TOLERANCE_TEMPERATURE = const(0.5)  # Degrees Celsius
 _DHT22_RANGE_TEMPERATURE_MIN = const(-40)
 _DHT22_RANGE_TEMPERATURE_MAX = const(80)
 DHT22_RANGE_TEMPERATURE = (_DHT22_RANGE_TEMPERATURE_MIN, _DHT22_RANGE_TEMPERATURE_MAX)
+DHT22_SCALE_TEMPERATURE = const(10)  # Store as 0.1 Degrees Celsius (sensor resolution)
 DHT22_TOLERANCE_RELATIVE_HUMIDITY = const(2.0)  # Percent
 _DHT22_RANGE_RELATIVE_HUMIDITY_MIN = const(0)
 _DHT22_RANGE_RELATIVE_HUMIDITY_MAX = const(100)
 DHT22_RANGE_RELATIVE_HUMIDITY = (_DHT22_RANGE_RELATIVE_HUMIDITY_MIN, _DHT22_RANGE_RELATIVE_HUMIDITY_MAX)
+DHT22_SCALE_RELATIVE_HUMIDITY = const(10)  # Store as 0.1 Percent (sensor resolution)
 
 # Use a slower than possible frequency to save power and reduce errors
 # (but use a multiple of the actual frequency)
 TIMER_FREQ_DHT22 = const(0.25)  # 0.5 Hertz / 4*0.5 [1/0.25=4s]
-TIMER_FREQ_BMP280 = const(0.25)  # 157 Hertz / 4*157 [1/0.25=4s]
+TIMER_FREQ_BMP280 = const(0.25)  # Forced mode measurement [1/0.25=4s]
 
 SENSOR_ID_BMP280 = const("bmp280")
 SENSOR_ID_DHT22 = const("dht22")
@@ -113,75 +135,99 @@ COUNTER_READINGS_ERROR = const("error")
 
 # The amount of time between no web response and an automatic restart (if enabled)
 WEB_SERVER_HEALTH_CHECK_TIME_DIFF_MIN = const(2)
+# The maximum amount of time the web server waits for a request before running pending tasks
+WEB_SERVER_POLL_TIMEOUT_MS = const(100)
 # The amount of values until a sensor is stabilized
 SENSOR_STABILIZE_COUNT = const(50)
 # The amount of values to keep in the buffers
 BUFFER_SIZE = const(10)
+# The minimum level of log messages that are stored in the log history/file
+LOG_LEVEL_HISTORY = "DEBUG" if DEBUG else "INFO"
+# The amount of time in which identical log messages are collapsed into one message
+LOG_RATE_LIMIT_MS = const(60 * 1000)
+# The amount of log messages that are buffered before writing them to the log file
+LOG_FILE_BUFFER_SIZE = const(20)
+LOG_FILE_FLUSH_INTERVAL_MS = const(60 * 1000)
+LOG_FILE_MAX_SIZE = const(64 * 1024)  # Bytes
 
 # Script global variables
 
-# Sensor stabilization
-sensor_stabilized = {  # Stabilized
-    SENSOR_ID_BMP280: False,
-    SENSOR_ID_DHT22: False,
-}
-sensor_last_values = {  # Last value, # of no changes
-    MEASUREMENT_ID_DHT22_TEMPERATURE: (None, SENSOR_STABILIZE_COUNT),
-    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY: (None, SENSOR_STABILIZE_COUNT),
-    MEASUREMENT_ID_BMP280_TEMPERATURE: (None, SENSOR_STABILIZE_COUNT),
-    MEASUREMENT_ID_BMP280_AIR_PRESSURE: (None, SENSOR_STABILIZE_COUNT),
-}
-
-# Sensor information
-sensor_unit = {  # Name of measured value unit
-    MEASUREMENT_ID_DHT22_TEMPERATURE: UNIT_TEMPERATURE_CELSIUS,
-    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY: UNIT_RELATIVE_HUMIDITY_PERCENT,
-    MEASUREMENT_ID_BMP280_TEMPERATURE: UNIT_TEMPERATURE_CELSIUS,
-    MEASUREMENT_ID_BMP280_AIR_PRESSURE: UNIT_AIR_PRESSURE_PA,
-}
-sensor_tolerances = {  # min, max
-    MEASUREMENT_ID_DHT22_TEMPERATURE: DHT22_TOLERANCE_TEMPERATURE,
-    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY: DHT22_TOLERANCE_RELATIVE_HUMIDITY,
-    MEASUREMENT_ID_BMP280_TEMPERATURE: BMP280_TOLERANCE_TEMPERATURE,
-    MEASUREMENT_ID_BMP280_AIR_PRESSURE: BMP280_TOLERANCE_AIR_PRESSURE,
-}
-sensor_ranges = {  # min, max
-    MEASUREMENT_ID_DHT22_TEMPERATURE: DHT22_RANGE_TEMPERATURE,
-    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY: DHT22_RANGE_RELATIVE_HUMIDITY,
-    MEASUREMENT_ID_BMP280_TEMPERATURE: BMP280_RANGE_TEMPERATURE,
-    MEASUREMENT_ID_BMP280_AIR_PRESSURE: BMP280_RANGE_AIR_PRESSURE,
-}
-
-# Store measurements as separate lists for temperature and humidity
-buffer_readings = {  # (value: number, iso timestamp: str)
-    MEASUREMENT_ID_DHT22_TEMPERATURE: [],
-    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY: [],
-    MEASUREMENT_ID_BMP280_TEMPERATURE: [],
-    MEASUREMENT_ID_BMP280_AIR_PRESSURE: [],
-}
-counter_readings = {  # good readings, bad readings
-    MEASUREMENT_ID_DHT22_TEMPERATURE: {COUNTER_READINGS_GOOD: 0, COUNTER_READINGS_OUTSIDE_RANGE: 0},
-    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY: {COUNTER_READINGS_GOOD: 0, COUNTER_READINGS_OUTSIDE_RANGE: 0},
-    MEASUREMENT_ID_BMP280_TEMPERATURE: {COUNTER_READINGS_GOOD: 0, COUNTER_READINGS_OUTSIDE_RANGE: 0},
-    MEASUREMENT_ID_BMP280_AIR_PRESSURE: {COUNTER_READINGS_GOOD: 0, COUNTER_READINGS_OUTSIDE_RANGE: 0},
-    SENSOR_ID_DHT22: {COUNTER_READINGS_GOOD: 0, COUNTER_READINGS_ERROR: 0},
-    SENSOR_ID_BMP280: {COUNTER_READINGS_GOOD: 0, COUNTER_READINGS_ERROR: 0},
-}
+# Sensor state (preallocated so that processing a reading does not allocate memory)
+sensor_dht22 = Sensor(SENSOR_ID_DHT22)
+sensor_bmp280 = Sensor(SENSOR_ID_BMP280)
+sensors = (sensor_dht22, sensor_bmp280)
+
+measurement_dht22_temperature = Measurement(
+    MEASUREMENT_ID_DHT22_TEMPERATURE,
+    sensor_dht22,
+    UNIT_TEMPERATURE_CELSIUS,
+    DHT22_SCALE_TEMPERATURE,
+    DHT22_TOLERANCE_TEMPERATURE,
+    DHT22_RANGE_TEMPERATURE,
+    BUFFER_SIZE,
+    SENSOR_STABILIZE_COUNT,
+)
+measurement_dht22_relative_humidity = Measurement(
+    MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY,
+    sensor_dht22,
+    UNIT_RELATIVE_HUMIDITY_PERCENT,
+    DHT22_SCALE_RELATIVE_HUMIDITY,
+    DHT22_TOLERANCE_RELATIVE_HUMIDITY,
+    DHT22_RANGE_RELATIVE_HUMIDITY,
+    BUFFER_SIZE,
+    SENSOR_STABILIZE_COUNT,
+)
+measurement_bmp280_temperature = Measurement(
+    MEASUREMENT_ID_BMP280_TEMPERATURE,
+    sensor_bmp280,
+    UNIT_TEMPERATURE_CELSIUS,
+    BMP280_SCALE_TEMPERATURE,
+    BMP280_TOLERANCE_TEMPERATURE,
+    BMP280_RANGE_TEMPERATURE,
+    BUFFER_SIZE,
+    SENSOR_STABILIZE_COUNT,
+)
+measurement_bmp280_air_pressure = Measurement(
+    MEASUREMENT_ID_BMP280_AIR_PRESSURE,
+    sensor_bmp280,
+    UNIT_AIR_PRESSURE_PA,
+    BMP280_SCALE_AIR_PRESSURE,
+    BMP280_TOLERANCE_AIR_PRESSURE,
+    BMP280_RANGE_AIR_PRESSURE,
+    BUFFER_SIZE,
+    SENSOR_STABILIZE_COUNT,
+)
+measurements = (
+    measurement_dht22_temperature,
+    measurement_dht22_relative_humidity,
+    measurement_bmp280_temperature,
+    measurement_bmp280_air_pressure,
+)
 
 # Track recent logs
 print_history_instance = PrintHistory(max_size=BUFFER_SIZE)
 print_history_handler = PrintHistoryLogHandler(print_history_instance)
 
 # Configure the logger
-logger = Logger(name=PROGRAM_NAME, level="DEBUG")
+logger = Logger(name=PROGRAM_NAME, level="DEBUG", rate_limit_ms=LOG_RATE_LIMIT_MS)
 if DEBUG:
     console_handler = LogHandlerConsole()
     logger.addHandler(console_handler)
 if ENABLE_SD_CARD:
-    file_handler = LogHandlerFile(f"{MICROSD_CARD_FILESYSTEM_PREFIX}/logs.log")
+    file_handler = LogHandlerFileBuffered(
+        f"{MICROSD_CARD_FILESYSTEM_PREFIX}/logs.log",
+        level=LOG_LEVEL_HISTORY,
+        buffer_size=LOG_FILE_BUFFER_SIZE,
+        flush_interval_ms=LOG_FILE_FLUSH_INTERVAL_MS,
+        max_file_size=LOG_FILE_MAX_SIZE,
+    )
     logger.addHandler(file_handler)
+print_history_handler.setLevel(LOG_LEVEL_HISTORY)
 logger.addHandler(print_history_handler)
-    
+
+
+# Run timer triggered work in the main loop instead of inside the timer callbacks
+scheduler = Scheduler(logger)
 
 # Track uptime
 time_init = time.time()
@@ -205,15 +251,29 @@ if ENABLE_SD_CARD:
         miso=Pin(GPIO_PIN_SPI_MICROSD_CARD_ADAPTER_MISO),
     )
 
+sdcard = None
+
 def mount_sdcard():
+    global sdcard
+
     try:
-        os.unmount(MICROSD_CARD_FILESYSTEM_PREFIX)
+        # Writes all cached blocks
+        os.umount(MICROSD_CARD_FILESYSTEM_PREFIX)
     except Exception as e:
         logger.warning("Could not unmount MicroSD Card on", MICROSD_CARD_FILESYSTEM_PREFIX)
     try:
-        sd = SDCard(microsd_card_adapter_spi, Pin(GPIO_PIN_SPI_MICROSD_CARD_ADAPTER_CS))
-        os.mount(sd, MICROSD_CARD_FILESYSTEM_PREFIX)
-        logger.info("Successfully initialized/mounted MicroSD Card to", MICROSD_CARD_FILESYSTEM_PREFIX)
+        sdcard = SDCard(
+            microsd_card_adapter_spi,
+            Pin(GPIO_PIN_SPI_MICROSD_CARD_ADAPTER_CS),
+            baudrate_max=SD_CARD_BAUDRATE_MAX,
+            cache_blocks=SD_CARD_CACHE_BLOCKS,
+        )
+        os.mount(sdcard, MICROSD_CARD_FILESYSTEM_PREFIX)
+        logger.info(
+            "Successfully initialized/mounted MicroSD Card to",
+            MICROSD_CARD_FILESYSTEM_PREFIX,
+            f"({sdcard.baudrate}Hz)",
+        )
     except Exception as e:
         logger.error("Failed to initialize/mount SD card:", e)
 
@@ -227,14 +287,20 @@ led_onboard = Pin("LED", Pin.OUT)
 dht22_sensor = DHT22(Pin(GPIO_PIN_INPUT_DHT22))
 
 # BMP280
-bmp280_sensor_i2c = I2C(
-    0,
-    sda=Pin(GPIO_PIN_I2C_BMP280_SDA),
-    scl=Pin(GPIO_PIN_I2C_BMP280_SCL),
-    freq=BMP280_FREQUENCY_I2C,
-)
-i2c_scan(bmp280_sensor_i2c, logger.debug)
-bmp280_sensor = BMP280(bmp280_sensor_i2c)
+def init_bmp280():
+    i2c = I2C(
+        0,
+        sda=Pin(GPIO_PIN_I2C_BMP280_SDA),
+        scl=Pin(GPIO_PIN_I2C_BMP280_SCL),
+        freq=BMP280_FREQUENCY_I2C,
+    )
+    i2c_scan(i2c, logger.debug)
+    sensor = BMP280(i2c, use_case=None)
+    sensor.use_forced(BMP280_FORCED_PRESET)
+    return i2c, sensor
+
+bmp280_sensor_i2c, bmp280_sensor = init_bmp280()
+bmp280_consecutive_errors = 0
 
 
 # Watchdog timer that restarts the device if it's not getting fed when the timeout is reached
@@ -279,167 +345,154 @@ def sync_time():
             time.sleep(5)
 
 
-def read_sensor(timer, sensor_id):
-    global sensor_stabilized
-    global sensor_last_values
-    global buffer_readings
-    global counter_readings
+def write_measurement_csv(measurement, value, file_name_prefix="data"):
+    file_name = f"{file_name_prefix}_{measurement.id}.csv"
+    try:
+        append_to_csv(
+            file_name,
+            [measurement.unit, "Timestamp"],
+            [[measurement.to_value(value), get_iso_timestamp()]],
+            file_path_prefix=MICROSD_CARD_FILESYSTEM_PREFIX
+        )
+    except OSError as e:
+        logger.error(
+            f"[{measurement.id}] Unable to write data to CSV file: {file_name} ({e})"
+        )
+
+
+def log_measurement_result(measurement, value, result):
+    unit = measurement.unit
+    to_value = measurement.to_value
+    if result & MEASUREMENT_RECORDED:
+        logger.debug(f"[{measurement.id}] Recorded: {to_value(value)}{unit}")
+        return
+    stabilized = measurement.sensor.stabilized
+    reasons = []
+    if stabilized and result & MEASUREMENT_NOT_CHANGED:
+        reasons.append(f"not within tolerance {to_value(measurement.tolerance)}{unit} [last_value={to_value(measurement.last_value())}{unit}]")
+    if not stabilized and not result & MEASUREMENT_CHANGED_RAW:
+        reasons.append(f"not within tolerance {to_value(measurement.tolerance)}{unit} of the last raw value")
+    if result & MEASUREMENT_OUTSIDE_RANGE:
+        reasons.append(f"not within range [{to_value(measurement.min_value)}{unit},{to_value(measurement.max_value)}{unit}]")
+    if not stabilized:
+        reasons.append(f"sensor stabilization ongoing {measurement.stabilize_count_max - measurement.stabilization_count}/{measurement.stabilize_count_max}")
+    logger.debug(
+        f"[{measurement.id}] Skipped: current {to_value(value)}{unit} ({', '.join(reasons)})"
+    )
+
+
+def process_measurement(measurement, value):
+    """
+    Process a new (scaled integer) value of a measurement.
+    Does not allocate memory unless debug logging or the SD card is enabled.
+    Returns True if the value is still changing (the sensor is not yet stable).
+    """
     global update_etag
-    
-    timestamp = get_iso_timestamp()
 
-    try:
-        sensor_measurements = []
-
-        if sensor_id == SENSOR_ID_BMP280 and bmp280_sensor is not None:
-            temp = bmp280_sensor.temperature
-            pressure = bmp280_sensor.pressure
-
-            sensor_measurements = [
-                (temp, MEASUREMENT_ID_BMP280_TEMPERATURE),
-                (pressure, MEASUREMENT_ID_BMP280_AIR_PRESSURE),
-            ]
-        elif sensor_id == SENSOR_ID_DHT22 and dht22_sensor is not None:
-            dht22_sensor.measure()
-            temp = dht22_sensor.temperature()
-            humidity = dht22_sensor.humidity()
-
-            sensor_measurements = [
-                (temp, MEASUREMENT_ID_DHT22_TEMPERATURE),
-                (humidity, MEASUREMENT_ID_DHT22_RELATIVE_HUMIDITY),
-            ]
-        else:
-            raise RuntimeError(
-                "Unknown {sensor_id=} or sensor not found {dht22=}/{bmp280=}"
-            )
+    if ENABLE_SD_CARD and (
+        not measurement.has_last_value_raw or value != measurement.last_value_raw
+    ):
+        write_measurement_csv(measurement, value, "data_raw")
 
-        counter_readings[sensor_id][COUNTER_READINGS_GOOD] += 1
-
-        sensor_changes_detected = False
-        for value, measurement_id in sensor_measurements:
-            unit = sensor_unit[measurement_id]
-            buffer = buffer_readings[measurement_id]
-            last_value_raw, stabilization_count = sensor_last_values[measurement_id]
-            last_value = buffer[-1][0] if len(buffer) > 0 else None
-            sensor_tolerance = sensor_tolerances[measurement_id]
-            min_value, max_value = sensor_ranges[measurement_id]
-
-            change_detected_raw = (
-                abs(value - last_value_raw) > sensor_tolerance
-                if last_value_raw is not None
-                else True
-            )
-            sensor_last_values[measurement_id] = (
-                value,
-                SENSOR_STABILIZE_COUNT if change_detected_raw else stabilization_count -1 if stabilization_count > 0 else 0,
-            )
-            if change_detected_raw or stabilization_count > 0:
-                sensor_changes_detected = True
+    result = measurement.update(value)
 
-            change_detected = (
-                abs(value - last_value) > sensor_tolerance
-                if last_value is not None
-                else True
+    if result & MEASUREMENT_RECORDED:
+        update_etag = True
+        if ENABLE_SD_CARD:
+            write_measurement_csv(measurement, value)
+    if logger.isEnabledFor("DEBUG"):
+        log_measurement_result(measurement, value, result)
+
+    return result & (MEASUREMENT_CHANGED_RAW | MEASUREMENT_STABILIZING) != 0
+
+
+def process_sensor(sensor, measurement_a, value_a, measurement_b, value_b):
+    """
+    Process a successful reading of a sensor with two measured values.
+    """
+    sensor.counter_good += 1
+    sensor_changes_detected = process_measurement(measurement_a, value_a)
+    if process_measurement(measurement_b, value_b):
+        sensor_changes_detected = True
+    if not sensor_changes_detected and not sensor.stabilized:
+        logger.info(f"[{sensor.id}] sensor stabilized: no changes detected")
+        sensor.stabilized = True
+
+
+def process_sensor_error(sensor, error):
+    logger.error(f"[{sensor.id}] Error reading sensor:", error)
+    sensor.counter_error += 1
+
+    if ENABLE_SD_CARD:
+        file_name = f"data_errors_{sensor.id}.csv"
+        try:
+            append_to_csv(
+                file_name,
+                ["error", "Timestamp"],
+                [[str(error), get_iso_timestamp()]],
+                file_path_prefix=MICROSD_CARD_FILESYSTEM_PREFIX
+            )
+        except OSError as e:
+            logger.error(
+                f"[{sensor.id}] Unable to write data to CSV file: {file_name} ({e})"
             )
-            within_range = value >= min_value and value <= max_value
-
-            try:
-                if ENABLE_SD_CARD and (
-                    abs(value - last_value_raw) > 0
-                    if last_value_raw is not None
-                    else True
-                ):
-                    append_to_csv(
-                        f"data_raw_{measurement_id}.csv",
-                        [unit, "Timestamp"],
-                        [[value, timestamp]],
-                        file_path_prefix=MICROSD_CARD_FILESYSTEM_PREFIX
-                    )
-            except OSError as e:
-                logger.error(
-                    f"[{measurement_id}] Unable to write data to CSV file: data_raw_{measurement_id}.csv ({e})"
-                )
 
-            if change_detected and within_range and sensor_stabilized[sensor_id]:
-                logger.debug(
-                    f"[{measurement_id}] Recorded: {value}{unit} at {timestamp}"
-                )
-                buffer.append([value, timestamp])
-                if len(buffer) > BUFFER_SIZE:
-                    buffer.pop(0)
-                update_etag = True
-
-                if ENABLE_SD_CARD:
-                    try:
-                        append_to_csv(
-                            f"data_{measurement_id}.csv",
-                            [unit, "Timestamp"],
-                            [[value, timestamp]],
-                            file_path_prefix=MICROSD_CARD_FILESYSTEM_PREFIX
-                        )
-                    except OSError as e:
-                        logger.error(
-                            f"[{measurement_id}] Unable to write data to CSV file: data_{measurement_id}.csv ({e})"
-                        )
-            else:
-                reasons = []
-                if sensor_stabilized[sensor_id] and not change_detected:
-                    reasons.append(f"not within tolerance {sensor_tolerance}{unit} [{last_value=}{unit}]")
-                if not sensor_stabilized[sensor_id] and not change_detected_raw:
-                    reasons.append(f"not within tolerance {sensor_tolerance}{unit} [{last_value_raw=}{unit}]")
-                if not within_range:
-                    reasons.append(f"not within range [{min_value}{unit},{max_value}{unit}]")
-                    counter_readings[measurement_id][COUNTER_READINGS_OUTSIDE_RANGE] += 1
-                if not sensor_stabilized[sensor_id]:
-                    reasons.append(f"sensor stabilization ongoing {SENSOR_STABILIZE_COUNT + 1 - stabilization_count}/{SENSOR_STABILIZE_COUNT}")
-                reason = ", ".join(reasons)
-                logger.debug(
-                    f"[{measurement_id}] Skipped: current {value}{unit} ({reason})"
-                )
-            
-        if not sensor_changes_detected and not sensor_stabilized[sensor_id]:
-            logger.info(f"[{sensor_id}] sensor stabilized: no changes detected")
-            sensor_stabilized[sensor_id] = True 
 
+def read_dht22():
+    try:
+        dht22_sensor.measure()
     except Exception as e:
-        logger.error(f"[{sensor_id}] Error reading sensor:", e)
-        counter_readings[sensor_id][COUNTER_READINGS_ERROR] += 1
-    
-        if ENABLE_SD_CARD:
-            try:
-                append_to_csv(
-                    f"data_errors_{sensor_id}.csv",
-                    ["error", "Timestamp"],
-                    [[str(e), timestamp]],
-                    file_path_prefix=MICROSD_CARD_FILESYSTEM_PREFIX
-                )
-            except OSError as e:
-                logger.error(
-                    f"[{sensor_id}] Unable to write data to CSV file: data_errors_{sensor_id}.csv ({e})"
-                )
-
+        process_sensor_error(sensor_dht22, e)
+        return
+    # Use the raw sensor data (0.1 resolution) instead of the float values
+    buf = dht22_sensor.buf
+    temperature = (buf[2] & 0x7F) << 8 | buf[3]
+    if buf[2] & 0x80:
+        temperature = -temperature
+    humidity = buf[0] << 8 | buf[1]
+    process_sensor(
+        sensor_dht22,
+        measurement_dht22_temperature,
+        temperature,
+        measurement_dht22_relative_humidity,
+        humidity,
+    )
 
-def read_dht22(timer):
-    read_sensor(timer, SENSOR_ID_DHT22)
 
+def read_bmp280():
+    global bmp280_consecutive_errors
 
-def read_bmp280(timer):
-    read_sensor(timer, SENSOR_ID_BMP280)
+    try:
+        # Integer compensation (0.01 Degrees Celsius, Pascal)
+        temperature, pressure = bmp280_sensor.measure_forced()
+    except Exception as e:
+        process_sensor_error(sensor_bmp280, e)
+        # Only restart the sensor and the I2C bus if it keeps failing (e.g. bus errors)
+        bmp280_consecutive_errors += 1
+        if bmp280_consecutive_errors >= BMP280_MAX_CONSECUTIVE_ERRORS:
+            restart_bmp280()
+        return
+    bmp280_consecutive_errors = 0
+    process_sensor(
+        sensor_bmp280,
+        measurement_bmp280_temperature,
+        temperature,
+        measurement_bmp280_air_pressure,
+        pressure,
+    )
 
 
-def restart_bmp280(timer):
+def restart_bmp280():
     global bmp280_sensor_i2c
     global bmp280_sensor
+    global bmp280_consecutive_errors
 
-    logger.debug("Restart BMP280")
-    bmp280_sensor_i2c = I2C(
-        0,
-        sda=Pin(GPIO_PIN_I2C_BMP280_SDA),
-        scl=Pin(GPIO_PIN_I2C_BMP280_SCL),
-        freq=BMP280_FREQUENCY_I2C,
-    )
-    i2c_scan(bmp280_sensor_i2c, logger.debug)
-    bmp280_sensor = BMP280(bmp280_sensor_i2c)
+    logger.warning("Restart BMP280")
+    bmp280_consecutive_errors = 0
+    try:
+        bmp280_sensor_i2c, bmp280_sensor = init_bmp280()
+    except Exception as e:
+        logger.error("Failed to restart BMP280:", e)
 
 
 def render_dashboard_html():
@@ -509,10 +562,10 @@ def generate_json_data():
             "title": "Data",
             "sections": [
                 {
-                    "title": f"{measurement_id} ({sensor_last_values[measurement_id][0]}{sensor_unit[measurement_id]}, {SENSOR_STABILIZE_COUNT - sensor_last_values[measurement_id][1]}/{SENSOR_STABILIZE_COUNT})",
-                    "data": [[sensor_unit[measurement_id], "Timestamp"]] + [[value, timestamp] for value, timestamp in values]
+                    "title": f"{measurement.id} ({measurement.to_value(measurement.last_value_raw) if measurement.has_last_value_raw else None}{measurement.unit}, {SENSOR_STABILIZE_COUNT - measurement.stabilization_count}/{SENSOR_STABILIZE_COUNT})",
+                    "data": [[measurement.unit, "Timestamp"]] + [[value, get_iso_timestamp(timestamp)] for value, timestamp in measurement.get_readings()]
                 }
-                for measurement_id, values in buffer_readings.items()
+                for measurement in measurements
             ],
         }
     )
@@ -524,10 +577,22 @@ def generate_json_readings():
             "title": "Readings",
             "sections": [
                 {
-                    "title": title,
-                    "data": value
+                    "title": measurement.id,
+                    "data": {
+                        COUNTER_READINGS_GOOD: measurement.counter_good,
+                        COUNTER_READINGS_OUTSIDE_RANGE: measurement.counter_outside_range,
+                    }
                 }
-                for title, value in counter_readings.items()
+                for measurement in measurements
+            ] + [
+                {
+                    "title": sensor.id,
+                    "data": {
+                        COUNTER_READINGS_GOOD: sensor.counter_good,
+                        COUNTER_READINGS_ERROR: sensor.counter_error,
+                    }
+                }
+                for sensor in sensors
             ],
         }
     )
@@ -575,10 +640,19 @@ def generate_json_info():
                         "WEB_SERVER_HEALTH_CHECK_TIME_DIFF_MIN": WEB_SERVER_HEALTH_CHECK_TIME_DIFF_MIN,
                         "TIMER_FREQ_DHT22": f"{TIMER_FREQ_DHT22}Hz ({timer_period_dht22:.2f}s)",
                         "TIMER_FREQ_BMP280": f"{TIMER_FREQ_BMP280}Hz ({timer_period_bmp280:.2f}s)",
+                        "BMP280_FORCED_PRESET": BMP280_FORCED_PRESET,
                         "SENSOR_STABILIZE_COUNT": SENSOR_STABILIZE_COUNT,
                         "ENABLE_SD_CARD": ENABLE_SD_CARD,
                     }
-                }
+                },
+                {
+                    "title": "Tasks",
+                    "data": scheduler.get_stats(),
+                },
+                {
+                    "title": "MicroSD Card",
+                    "data": sdcard.get_stats() if sdcard is not None else {},
+                },
             ],
         }
     )
@@ -591,11 +665,12 @@ def handle_web_request(socket):
     global last_server_activity
 
     cl, addr = socket.accept()
-    logger.debug(
-        "Client connected from",
-        addr,
-        convert_to_human_readable_str(*ramf(), unit_name="KB", name="Free RAM space"),
-    )
+    if logger.isEnabledFor("DEBUG"):
+        logger.debug(
+            "Client connected from",
+            addr,
+            convert_to_human_readable_str(*ramf(), unit_name="KB", name="Free RAM space"),
+        )
     try:
         start_time = time.ticks_ms()
         request = cl.recv(1024).decode("utf-8")
@@ -606,7 +681,9 @@ def handle_web_request(socket):
             return
         elif "GET /json_measurements" in request:
             if update_etag:
-                current_etag = generate_etag(buffer_readings)
+                current_etag = generate_etag(
+                    [measurement.get_readings() for measurement in measurements]
+                )
                 update_etag = False
             serve_data = True
             # Catch ETag entries from the request header if request is conditional
@@ -630,11 +707,11 @@ def handle_web_request(socket):
                 # Create JSON response with separate temperature and humidity lists
                 json_str = ujson.dumps(
                     {
-                        sensor: [
-                            {"value": value, "timestamp": timestamp}
-                            for value, timestamp in readings
+                        measurement.id: [
+                            {"value": value, "timestamp": get_iso_timestamp(timestamp)}
+                            for value, timestamp in measurement.get_readings()
                         ]
-                        for sensor, readings in buffer_readings.items()
+                        for measurement in measurements
                     }
                 )
                 response = generate_http_response(
@@ -669,7 +746,7 @@ def handle_web_request(socket):
         elif "GET /json_readings" in request:
             response = generate_http_response(generate_json_readings(), content_type=HTTP_CONTENT_TYPE_JSON)
         elif "GET /restart_bmp280" in request:
-            restart_bmp280(None)
+            restart_bmp280()
             response = generate_http_response(
                 "Restarted BMP280 sensor", content_type=HTTP_CONTENT_TYPE_TEXT
             )
@@ -708,10 +785,11 @@ def handle_web_request(socket):
                 for line in f:
                     cl.sendall(line)
         end_time = time.ticks_ms()
-        logger.debug(
-            f"Responded in {time.ticks_diff(end_time, start_time)}ms",
-            convert_to_human_readable_str(*ramf(), unit_name="KB", name="Free RAM space"),
-        )
+        if logger.isEnabledFor("DEBUG"):
+            logger.debug(
+                f"Responded in {time.ticks_diff(end_time, start_time)}ms",
+                convert_to_human_readable_str(*ramf(), unit_name="KB", name="Free RAM space"),
+            )
     except Exception as e:
         logger.error("Error handling request:", e)
     finally:
@@ -728,9 +806,14 @@ def web_server(ip, port=80):
         logger.info(f"Successfully bound to {ip}:{port}")
         s.listen(1)
         logger.info("Listening on", addr)
-        
+
+        # Wait only a short time for requests so that pending tasks can be run in between
+        poller = select.poll()
+        poller.register(s, select.POLLIN)
         while True:
-            handle_web_request(s)
+            if poller.poll(WEB_SERVER_POLL_TIMEOUT_MS):
+                handle_web_request(s)
+            scheduler.run_pending()
 
     except OSError as e:
         logger.error("Error connecting to socket:", e)
@@ -739,7 +822,9 @@ def web_server(ip, port=80):
         s.close()
 
 
-def web_server_health_check(timer):
+def web_server_health_check():
+    # Periodically write out buffered log messages
+    logger.flush_if_due()
     if (
         time.ticks_diff(time.ticks_ms(), last_server_activity) > WEB_SERVER_HEALTH_CHECK_TIME_DIFF_MIN * 60 * 1000
     ):  # If no activity in the last 5 minutes
@@ -767,47 +852,48 @@ def main():
 
     try:
         # Start the periodic sensor reading
-        read_dht22_timer = Timer(-1)
-        read_dht22_timer.init(
-            freq=TIMER_FREQ_DHT22, mode=Timer.PERIODIC, callback=read_dht22
-        )
-        # WARNING: Default frequency of BMP280 is too fast (use 2s instead)
-        read_bmp280_timer = Timer(-1)
-        read_bmp280_timer.init(
-            freq=TIMER_FREQ_BMP280, mode=Timer.PERIODIC, callback=read_bmp280
+        scheduler.add_timer(
+            Timer(-1),
+            scheduler.add_task("read_dht22", read_dht22),
+            freq=TIMER_FREQ_DHT22,
+            mode=Timer.PERIODIC,
         )
-        # Since the BMP280 timer is crashing all the time restart it periodically
-        restart_bmp280_timer = Timer(-1)
-        restart_bmp280_timer.init(
-            period=60 * 60 * 1000, mode=Timer.PERIODIC, callback=restart_bmp280
+        # The BMP280 only measures when a reading is triggered (forced mode)
+        scheduler.add_timer(
+            Timer(-1),
+            scheduler.add_task("read_bmp280", read_bmp280),
+            freq=TIMER_FREQ_BMP280,
+            mode=Timer.PERIODIC,
         )
-        
+
         # Since the SD card sometimes breaks or can be taken out remount it periodically
-        sdcard_remount_timer = machine.Timer(-1)
-        sdcard_remount_timer.init(
-            period=20 * 60 * 1000,
-            mode=machine.Timer.PERIODIC,
-            callback=lambda timer: mount_sdcard(),
-        )
+        if ENABLE_SD_CARD:
+            scheduler.add_timer(
+                Timer(-1),
+                scheduler.add_task("mount_sdcard", mount_sdcard),
+                period=20 * 60 * 1000,
+                mode=Timer.PERIODIC,
+            )
 
         # If the webserver is not being used for some time (e.g. crashes automatically restart the device)
-        health_timer = machine.Timer(-1)
-        health_timer.init(
+        # (runs in the main loop so a blocked main loop also stops feeding the watchdog)
+        scheduler.add_timer(
+            Timer(-1),
+            scheduler.add_task("web_server_health_check", web_server_health_check),
             period=4 * 1000,
-            mode=machine.Timer.PERIODIC,
-            callback=web_server_health_check,
+            mode=Timer.PERIODIC,
         )
 
-        # Start the web server
+        # Start the web server (which also runs the pending tasks)
         web_server(ip)
     except Exception as e:
         logger.error("Error occurred in main:", e)
     finally:
         # Ensure that all timers are stopped if there's an error
-        read_dht22_timer.deinit()
-        read_bmp280_timer.deinit()
-        restart_bmp280_timer.deinit()
+        scheduler.deinit()
         logger.info("Timers have been stopped")
+        # Write out all buffered log messages
+        logger.flush()
 
 
 if __name__ == "__main__":
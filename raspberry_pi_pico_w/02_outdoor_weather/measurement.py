@@ -0,0 +1,144 @@
+from array import array
+from time import time
+
+# Result flags of Measurement.update
+MEASUREMENT_RECORDED = const(1)
+MEASUREMENT_CHANGED_RAW = const(2)
+MEASUREMENT_NOT_CHANGED = const(4)
+MEASUREMENT_OUTSIDE_RANGE = const(8)
+MEASUREMENT_STABILIZING = const(16)
+
+
+class Sensor:
+    """
+    Preallocated state of a sensor (stabilization and reading counters).
+    """
+
+    def __init__(self, sensor_id):
+        self.id = sensor_id
+        self.stabilized = False
+        self.counter_good = 0
+        self.counter_error = 0
+
+
+class Measurement:
+    """
+    Preallocated state of a single measured value of a sensor.
+
+    Values are stored as scaled integers (e.g. scale=10 stores 21.5°C as 215) so that
+    updating the state with a new value does not allocate any memory.
+    The recorded values are kept in a fixed size ring buffer together with the time
+    (seconds since the epoch) they were recorded at.
+    """
+
+    def __init__(
+        self,
+        measurement_id,
+        sensor,
+        unit,
+        scale,
+        tolerance,
+        value_range,
+        buffer_size,
+        stabilize_count,
+    ):
+        self.id = measurement_id
+        self.sensor = sensor
+        self.unit = unit
+        self.scale = scale
+        self.tolerance = round(tolerance * scale)
+        self.min_value = round(value_range[0] * scale)
+        self.max_value = round(value_range[1] * scale)
+        self.stabilize_count_max = stabilize_count
+        # Last (raw) value and # of values left until it's considered stable
+        self.has_last_value_raw = False
+        self.last_value_raw = 0
+        self.stabilization_count = stabilize_count
+        # Ring buffer of the recorded values
+        self.buffer_values = array("i", [0] * buffer_size)
+        self.buffer_times = array("i", [0] * buffer_size)
+        self.buffer_start = 0
+        self.buffer_length = 0
+        # Counters
+        self.counter_good = 0
+        self.counter_outside_range = 0
+
+    def update(self, value):
+        """
+        Update the state with a new (scaled integer) value and record it in the buffer
+        if it's within the range, changed more than the tolerance compared to the last
+        recorded value and the sensor is stabilized.
+        Returns MEASUREMENT_* flags that describe what happened.
+        """
+        result = 0
+        stabilization_count = self.stabilization_count
+
+        # Check if the value changed compared to the last raw value
+        if (
+            not self.has_last_value_raw
+            or abs(value - self.last_value_raw) > self.tolerance
+        ):
+            result |= MEASUREMENT_CHANGED_RAW
+            self.stabilization_count = self.stabilize_count_max
+        elif stabilization_count > 0:
+            self.stabilization_count = stabilization_count - 1
+        if stabilization_count > 0:
+            result |= MEASUREMENT_STABILIZING
+        self.has_last_value_raw = True
+        self.last_value_raw = value
+
+        # Check if the value changed compared to the last recorded value
+        if self.buffer_length > 0 and abs(value - self.last_value()) <= self.tolerance:
+            result |= MEASUREMENT_NOT_CHANGED
+        if value < self.min_value or value > self.max_value:
+            result |= MEASUREMENT_OUTSIDE_RANGE
+            self.counter_outside_range += 1
+
+        if (
+            self.sensor.stabilized
+            and result & (MEASUREMENT_NOT_CHANGED | MEASUREMENT_OUTSIDE_RANGE) == 0
+        ):
+            self.record(value, time())
+            result |= MEASUREMENT_RECORDED
+        return result
+
+    def record(self, value, timestamp):
+        """
+        Add a value to the ring buffer (overwrites the oldest value if it's full).
+        """
+        size = len(self.buffer_values)
+        if self.buffer_length < size:
+            index = (self.buffer_start + self.buffer_length) % size
+            self.buffer_length += 1
+        else:
+            index = self.buffer_start
+            self.buffer_start = (self.buffer_start + 1) % size
+        self.buffer_values[index] = value
+        self.buffer_times[index] = timestamp
+        self.counter_good += 1
+
+    def last_value(self):
+        """
+        Get the last recorded (scaled integer) value.
+        """
+        size = len(self.buffer_values)
+        return self.buffer_values[(self.buffer_start + self.buffer_length - 1) % size]
+
+    def to_value(self, value):
+        """
+        Convert a scaled integer value back to its actual value.
+        """
+        return value / self.scale if self.scale != 1 else value
+
+    def get_readings(self):
+        """
+        Get a list of all recorded (actual value, time) pairs from the oldest to the newest.
+        """
+        size = len(self.buffer_values)
+        readings = []
+        for i in range(self.buffer_length):
+            index = (self.buffer_start + i) % size
+            readings.append(
+                (self.to_value(self.buffer_values[index]), self.buffer_times[index])
+            )
+        return readings
@@ -0,0 +1,110 @@
+import time
+
+
+class SchedulerTask:
+    """
+    Represents a single task of the scheduler and tracks its runtimes.
+    """
+
+    def __init__(self, name, callback):
+        self.name = name
+        self.callback = callback
+        self.runs = 0
+        self.errors = 0
+        self.runtime_total_ms = 0
+        self.runtime_max_ms = 0
+        self.runtime_last_ms = 0
+
+    def get_stats(self):
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "runtime last (ms)": self.runtime_last_ms,
+            "runtime avg (ms)": self.runtime_total_ms // self.runs if self.runs > 0 else 0,
+            "runtime max (ms)": self.runtime_max_ms,
+        }
+
+
+class Scheduler:
+    """
+    A small cooperative scheduler for MicroPython.
+
+    Timer callbacks (which can run in interrupt context) only mark a task as pending
+    which is allocation-free. The actual work of all pending tasks is done in the main
+    loop by calling `run_pending` so it never interrupts other code (e.g. a web request).
+    """
+
+    def __init__(self, logger=None):
+        self.tasks = []
+        self.pending = bytearray(0)
+        self.timers = []
+        self.logger = logger
+
+    def add_task(self, name, callback):
+        """
+        Add a task and return its id which can be used to post it.
+        The callback is called without arguments.
+        """
+        self.tasks.append(SchedulerTask(name, callback))
+        self.pending = self.pending + bytearray(1)
+        return len(self.tasks) - 1
+
+    def post(self, task_id):
+        """
+        Mark a task as pending (safe to be called from an interrupt).
+        """
+        self.pending[task_id] = 1
+
+    def create_timer_callback(self, task_id):
+        """
+        Create a timer callback that only posts the task.
+        """
+        def timer_callback(timer):
+            self.pending[task_id] = 1
+        return timer_callback
+
+    def add_timer(self, timer, task_id, **timer_init_kwargs):
+        """
+        Initialize a (periodic) timer that posts the task each time it fires.
+        """
+        timer.init(callback=self.create_timer_callback(task_id), **timer_init_kwargs)
+        self.timers.append(timer)
+
+    def run_pending(self):
+        """
+        Run all pending tasks (needs to be called periodically from the main loop).
+        """
+        for task_id in range(len(self.tasks)):
+            if self.pending[task_id]:
+                self.pending[task_id] = 0
+                self.run(task_id)
+
+    def run(self, task_id):
+        """
+        Run a task immediately and measure its runtime.
+        """
+        task = self.tasks[task_id]
+        start_time = time.ticks_ms()
+        try:
+            task.callback()
+        except Exception as e:
+            task.errors += 1
+            if self.logger is not None:
+                self.logger.error(f"[{task.name}] Error running task:", e)
+        runtime_ms = time.ticks_diff(time.ticks_ms(), start_time)
+        task.runs += 1
+        task.runtime_last_ms = runtime_ms
+        task.runtime_total_ms += runtime_ms
+        if runtime_ms > task.runtime_max_ms:
+            task.runtime_max_ms = runtime_ms
+
+    def get_stats(self):
+        return {task.name: task.get_stats() for task in self.tasks}
+
+    def deinit(self):
+        """
+        Stop all timers.
+        """
+        for timer in self.timers:
+            timer.deinit()
+        self.timers.clear()
@@ -20,6 +20,14 @@ Example usage on ESP8266:
     os.mount(sd, '/sd')
     os.listdir('/')
 
+Changes:
+
+- Write-back block cache (cache_blocks) with dirty tracking that is flushed when the
+  filesystem syncs (ioctl), adjacent dirty blocks are written with a single CMD25
+  multi-block transfer and reads of multiple blocks use a single CMD18 transfer
+- Negotiation of a higher SPI clock (baudrate_max) after the initialization
+- I/O operation counters (get_stats)
+
 """
 
 from micropython import const
@@ -39,12 +47,33 @@ _TOKEN_CMD25 = const(0xFC)
 _TOKEN_STOP_TRAN = const(0xFD)
 _TOKEN_DATA = const(0xFE)
 
+_IOCTL_INIT = const(1)
+_IOCTL_DEINIT = const(2)
+_IOCTL_SYNC = const(3)
+_IOCTL_BLK_COUNT = const(4)
+_IOCTL_BLK_SIZE = const(5)
+
 
 class SDCard:
-    def __init__(self, spi, cs, baudrate=1320000):
+    def __init__(self, spi, cs, baudrate=1320000, baudrate_max=None, cache_blocks=8):
         self.spi = spi
         self.cs = cs
 
+        # block cache (block number -> buffer, least recently used first)
+        self.cache_blocks = cache_blocks
+        self.cache_order = []
+        self.cache = {}
+        self.cache_dirty = set()
+        self.cache_free = [bytearray(512) for _ in range(cache_blocks)]
+
+        # I/O counters
+        self.stats_start = time.ticks_ms()
+        self.counter_read_ops = 0
+        self.counter_write_ops = 0
+        self.counter_blocks_read = 0
+        self.counter_blocks_written = 0
+        self.counter_cache_hits = 0
+
         self.cmdbuf = bytearray(6)
         self.dummybuf = bytearray(512)
         self.tokenbuf = bytearray(1)
@@ -54,6 +83,9 @@ class SDCard:
 
         # initialise the card
         self.init_card(baudrate)
+        self.baudrate = baudrate
+        if baudrate_max is not None and baudrate_max > baudrate:
+            self.negotiate_baudrate(baudrate_max)
 
     def init_spi(self, baudrate):
         try:
@@ -94,10 +126,8 @@ class SDCard:
 
         # get the number of sectors
         # CMD9: response R2 (R1 byte + 16-byte block read)
-        if self.cmd(9, 0, 0, 0, False) != 0:
-            raise OSError("no response from SD card")
-        csd = bytearray(16)
-        self.readinto(csd)
+        csd = self.read_csd()
+        self.csd = csd
         if csd[0] & 0xC0 == 0x40:  # CSD version 2.0
             self.sectors = ((csd[8] << 8 | csd[9]) + 1) * 1024
         elif csd[0] & 0xC0 == 0x00:  # CSD version 1.0 (old, <=2GB)
@@ -117,6 +147,29 @@ class SDCard:
         # set to high data rate now that it's initialised
         self.init_spi(baudrate)
 
+    def read_csd(self):
+        csd = bytearray(16)
+        if self.cmd(9, 0, 0, 0, False) != 0:
+            self.cs(1)
+            raise OSError("no response from SD card")
+        self.readinto(csd)
+        return csd
+
+    def negotiate_baudrate(self, baudrate_max):
+        # try the highest clock first and halve it until the CSD register can be read
+        # correctly (compared to the one read with the initialization clock)
+        baudrate = baudrate_max
+        while baudrate > self.baudrate:
+            self.init_spi(baudrate)
+            try:
+                if self.read_csd() == self.csd:
+                    self.baudrate = baudrate
+                    return
+            except OSError:
+                pass
+            baudrate //= 2
+        self.init_spi(self.baudrate)
+
     def init_card_v1(self):
         for i in range(_CMD_TIMEOUT):
             time.sleep_ms(50)
@@ -243,7 +296,10 @@ class SDCard:
         self.cs(1)
         self.spi.write(b"\xff")
 
-    def readblocks(self, block_num, buf):
+    def read_card_blocks(self, block_num, buf):
+        self.counter_read_ops += 1
+        self.counter_blocks_read += len(buf) // 512
+
         # workaround for shared bus, required for (at least) some Kingston
         # devices, ensure MOSI is high before starting transaction
         self.spi.write(b"\xff")
@@ -274,35 +330,140 @@ class SDCard:
             if self.cmd(12, 0, 0xFF, skip1=True):
                 raise OSError(5)  # EIO
 
-    def writeblocks(self, block_num, buf):
+    def write_card_blocks(self, block_num, blocks):
+        # blocks is a list of 512 byte buffers that are written to adjacent blocks
+        self.counter_write_ops += 1
+        self.counter_blocks_written += len(blocks)
+
         # workaround for shared bus, required for (at least) some Kingston
         # devices, ensure MOSI is high before starting transaction
         self.spi.write(b"\xff")
 
-        nblocks, err = divmod(len(buf), 512)
-        assert nblocks and not err, "Buffer length is invalid"
-        if nblocks == 1:
+        if len(blocks) == 1:
             # CMD24: set write address for single block
             if self.cmd(24, block_num * self.cdv, 0) != 0:
                 raise OSError(5)  # EIO
 
             # send the data
-            self.write(_TOKEN_DATA, buf)
+            self.write(_TOKEN_DATA, blocks[0])
         else:
             # CMD25: set write address for first block
             if self.cmd(25, block_num * self.cdv, 0) != 0:
                 raise OSError(5)  # EIO
             # send the data
-            offset = 0
-            mv = memoryview(buf)
-            while nblocks:
-                self.write(_TOKEN_CMD25, mv[offset : offset + 512])
-                offset += 512
-                nblocks -= 1
+            for block in blocks:
+                self.write(_TOKEN_CMD25, block)
             self.write_token(_TOKEN_STOP_TRAN)
 
+    def cache_get(self, block_num):
+        buf = self.cache.get(block_num)
+        if buf is not None:
+            # mark as most recently used
+            self.cache_order.remove(block_num)
+            self.cache_order.append(block_num)
+        return buf
+
+    def cache_put(self, block_num, data, dirty):
+        buf = self.cache_get(block_num)
+        if buf is None:
+            if len(self.cache_free) == 0:
+                # evict the least recently used block (write all dirty blocks first)
+                if self.cache_order[0] in self.cache_dirty:
+                    self.flush()
+                evicted_block_num = self.cache_order.pop(0)
+                self.cache_free.append(self.cache.pop(evicted_block_num))
+            buf = self.cache_free.pop()
+            self.cache[block_num] = buf
+            self.cache_order.append(block_num)
+        buf[:] = data
+        if dirty:
+            self.cache_dirty.add(block_num)
+
+    def cache_discard(self, block_num):
+        buf = self.cache.pop(block_num, None)
+        if buf is not None:
+            self.cache_order.remove(block_num)
+            self.cache_dirty.discard(block_num)
+            self.cache_free.append(buf)
+
+    def flush(self):
+        """
+        Write all dirty cached blocks to the card (adjacent blocks in a single transfer).
+        """
+        if len(self.cache_dirty) == 0:
+            return
+        dirty = sorted(self.cache_dirty)
+        start = 0
+        for i in range(1, len(dirty) + 1):
+            if i == len(dirty) or dirty[i] != dirty[i - 1] + 1:
+                self.write_card_blocks(
+                    dirty[start], [self.cache[block_num] for block_num in dirty[start:i]]
+                )
+                start = i
+        self.cache_dirty.clear()
+
+    def readblocks(self, block_num, buf):
+        nblocks = len(buf) // 512
+        assert nblocks and not len(buf) % 512, "Buffer length is invalid"
+        if self.cache_blocks == 0:
+            self.read_card_blocks(block_num, buf)
+            return
+        if nblocks == 1:
+            cached = self.cache_get(block_num)
+            if cached is not None:
+                self.counter_cache_hits += 1
+                buf[:] = cached
+                return
+            self.read_card_blocks(block_num, buf)
+            self.cache_put(block_num, buf, False)
+            return
+        # read all blocks at once and overwrite the ones that are cached (they could be dirty)
+        self.read_card_blocks(block_num, buf)
+        mv = memoryview(buf)
+        for i in range(nblocks):
+            cached = self.cache.get(block_num + i)
+            if cached is not None:
+                self.counter_cache_hits += 1
+                mv[i * 512 : (i + 1) * 512] = cached
+
+    def writeblocks(self, block_num, buf):
+        nblocks, err = divmod(len(buf), 512)
+        assert nblocks and not err, "Buffer length is invalid"
+        mv = memoryview(buf)
+        if nblocks > self.cache_blocks:
+            # too big for the cache: write directly and drop the outdated cached blocks
+            for i in range(nblocks):
+                self.cache_discard(block_num + i)
+            self.write_card_blocks(
+                block_num, [mv[i * 512 : (i + 1) * 512] for i in range(nblocks)]
+            )
+            return
+        for i in range(nblocks):
+            self.cache_put(block_num + i, mv[i * 512 : (i + 1) * 512], True)
+
+    def get_stats(self):
+        """
+        Get the I/O counters and the average operations per second since the start.
+        """
+        seconds = max(time.ticks_diff(time.ticks_ms(), self.stats_start), 1) / 1000
+        return {
+            "baudrate": self.baudrate,
+            "read ops": self.counter_read_ops,
+            "write ops": self.counter_write_ops,
+            "blocks read": self.counter_blocks_read,
+            "blocks written": self.counter_blocks_written,
+            "cache hits": self.counter_cache_hits,
+            "read ops/s": self.counter_read_ops / seconds,
+            "write ops/s": self.counter_write_ops / seconds,
+        }
+
     def ioctl(self, op, arg):
-        if op == 4:  # get number of blocks
+        if op == _IOCTL_INIT:
+            return 0
+        if op == _IOCTL_DEINIT or op == _IOCTL_SYNC:
+            self.flush()
+            return 0
+        if op == _IOCTL_BLK_COUNT:  # get number of blocks
             return self.sectors
-        if op == 5:  # get block size in bytes
+        if op == _IOCTL_BLK_SIZE:  # get block size in bytes
             return 512
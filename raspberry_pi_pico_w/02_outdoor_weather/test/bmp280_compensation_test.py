@@ -0,0 +1,55 @@
+# Checks that the integer compensation of BMP280.read matches the float compensation
+# using the calibration and data test vectors of the datasheet.
+# Copy bmp280.py to the Raspberry Pi Pico W and run it with e.g. `mpremote run bmp280_compensation_test.py`.
+
+import gc
+
+from bmp280 import BMP280
+
+# Maximum difference of the 32-bit integer pressure compensation (datasheet: 1 Pa resolution)
+TOLERANCE_PRESSURE_PA = 5
+
+
+class TestI2C:
+    """
+    I2C bus without a connected sensor.
+    """
+
+    def readfrom_mem(self, addr, memaddr, nbytes):
+        return bytes(nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf):
+        pass
+
+    def writeto_mem(self, addr, memaddr, buf):
+        pass
+
+
+bmp280 = BMP280(TestI2C(), use_case=None)
+bmp280.load_test_calibration()
+
+# Float compensation (properties read the data registers again so reset the test data)
+bmp280._gauge = lambda: None
+bmp280.load_test_data()
+temperature_float = bmp280.temperature
+pressure_float = bmp280.pressure
+
+# Integer compensation
+bmp280.load_test_data()
+temperature, pressure = bmp280._compensate()
+print(f"Float: {temperature_float}°C {pressure_float}Pa, Integer: {temperature / 100}°C {pressure}Pa")
+assert temperature == 2508, f"Expected 2508 (25.08°C) but got {temperature}"
+assert temperature == round(temperature_float * 100), "Expected the same temperature"
+assert abs(pressure - pressure_float) <= TOLERANCE_PRESSURE_PA, "Expected a similar pressure"
+
+# The compensation should only allocate the returned tuple (one 16 byte block)
+gc.collect()
+gc.disable()
+mem_alloc_start = gc.mem_alloc()
+for _ in range(100):
+    bmp280._compensate()
+allocated = gc.mem_alloc() - mem_alloc_start
+gc.enable()
+print(f"Allocated {allocated} bytes for 100 compensations")
+assert allocated <= 100 * 16, "Expected no float or big integer allocations"
+print("OK")
@@ -0,0 +1,59 @@
+# Checks that processing sensor values does not allocate memory on the heap.
+# Copy measurement.py to the Raspberry Pi Pico W and run it with e.g. `mpremote run measurement_allocation_test.py`.
+
+import gc
+from time import time
+
+from measurement import (
+    Sensor,
+    Measurement,
+    MEASUREMENT_RECORDED,
+    MEASUREMENT_NOT_CHANGED,
+    MEASUREMENT_OUTSIDE_RANGE,
+)
+
+ITERATIONS = 1000
+
+sensor = Sensor("test")
+measurement = Measurement("test_temperature", sensor, "°C", 10, 0.5, (-40, 80), 10, 5)
+
+# Values that are recorded, skipped (within tolerance) and outside the range
+values = [200, 201, 210, 230, 229, 1000, -500]
+
+# Warm up until the sensor is stabilized and the ring buffer is full
+while measurement.stabilization_count > 0:
+    measurement.update(values[0])
+sensor.stabilized = True
+for i in range(20):
+    measurement.update(values[i % len(values)])
+
+
+def measure_allocations(values):
+    results = 0
+    gc.collect()
+    gc.disable()
+    mem_alloc_start = gc.mem_alloc()
+    for i in range(ITERATIONS):
+        results |= measurement.update(values[i % len(values)])
+    mem_alloc_end = gc.mem_alloc()
+    gc.enable()
+    return mem_alloc_end - mem_alloc_start, results
+
+
+# Skipped values (within tolerance or outside the range) should never allocate memory
+last_value = measurement.last_value()
+allocated, results = measure_allocations([last_value, last_value + 1, 1000, -500])
+print(f"Allocated {allocated} bytes for {ITERATIONS} skipped updates")
+assert not results & MEASUREMENT_RECORDED, "Expected no recorded values"
+assert results & MEASUREMENT_NOT_CHANGED, "Expected values within tolerance"
+assert results & MEASUREMENT_OUTSIDE_RANGE, "Expected values outside the range"
+assert allocated == 0, f"Expected no allocations but {allocated} bytes were allocated"
+
+# Recorded values should only allocate memory if time() returns a big integer
+# (ports that use 1970 as epoch instead of 2000)
+allocated, results = measure_allocations(values)
+print(f"Allocated {allocated} bytes for {ITERATIONS} mixed updates")
+assert results & MEASUREMENT_RECORDED, "Expected recorded values"
+if time() < (1 << 30):
+    assert allocated == 0, f"Expected no allocations but {allocated} bytes were allocated"
+print("OK")
@@ -1,9 +1,10 @@
 from time import localtime
 
 
-def get_iso_timestamp() -> str:
+def get_iso_timestamp(secs=None) -> str:
     """
-    Get the current time in ISO 8601 format (e.g., "2024-12-15T14:30:00Z").
+    Get the current (or the supplied seconds since the epoch) time in ISO 8601 format
+    (e.g., "2024-12-15T14:30:00Z").
     """
-    t = localtime()
+    t = localtime(secs)
     return f"{t[0]:04}-{t[1]:02}-{t[2]:02}T{t[3]:02}:{t[4]:02}:{t[5]:02}Z"
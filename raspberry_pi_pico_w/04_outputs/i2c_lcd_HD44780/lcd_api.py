@@ -54,6 +54,8 @@ class LcdApi:
         self.cursor_y = 0
         self.implied_newline = False
         self.backlight = True
+        # Shadow buffer of the displayed characters (to only write changed cells)
+        self.shadow = bytearray(self.num_lines * self.num_columns)
         self.display_off()
         self.backlight_on()
         self.clear()
@@ -67,6 +69,8 @@ class LcdApi:
         self.hal_write_command(self.LCD_HOME)
         self.cursor_x = 0
         self.cursor_y = 0
+        for i in range(len(self.shadow)):
+            self.shadow[i] = 0x20
 
     def show_cursor(self):
         # Causes the cursor to be made visible
@@ -135,20 +139,100 @@ class LcdApi:
                 self.cursor_x = self.num_columns
         else:
             self.hal_write_data(ord(char))
+            self.update_shadow(char, 0, 1)
             self.cursor_x += 1
         if self.cursor_x >= self.num_columns:
             self.cursor_x = 0
             self.cursor_y += 1
             self.implied_newline = (char != '\n')
-        if self.cursor_y >= self.num_lines:
-            self.cursor_y = 0
-        self.move_to(self.cursor_x, self.cursor_y)
+            if self.cursor_y >= self.num_lines:
+                self.cursor_y = 0
+            # The cursor auto increments so it only needs to be moved on wraps
+            self.move_to(self.cursor_x, self.cursor_y)
 
     def putstr(self, string):
         # Write the indicated string to the LCD at the current cursor
         # position and advances the cursor position appropriately.
-        for char in string:
-            self.putchar(char)
+        # Characters are written in runs until the end of the current line
+        # (the cursor auto increments so it only needs to be moved on wraps).
+        start = 0
+        length = len(string)
+        while start < length:
+            if string[start] == '\n':
+                self.putchar('\n')
+                start += 1
+                continue
+            end = string.find('\n', start)
+            if end == -1:
+                end = length
+            end = min(end, start + max(self.num_columns - self.cursor_x, 1))
+            self.hal_write_data_str(string, start, end)
+            self.update_shadow(string, start, end)
+            self.cursor_x += end - start
+            start = end
+            if self.cursor_x >= self.num_columns:
+                self.cursor_x = 0
+                self.cursor_y += 1
+                self.implied_newline = True
+                if self.cursor_y >= self.num_lines:
+                    self.cursor_y = 0
+                self.move_to(self.cursor_x, self.cursor_y)
+
+    def update_shadow(self, string, start, end):
+        # Store the characters string[start:end] that were written at the
+        # current cursor position in the shadow buffer
+        if self.cursor_y >= self.num_lines:
+            return
+        offset = self.cursor_y * self.num_columns
+        x = self.cursor_x
+        for index in range(start, end):
+            if x >= self.num_columns:
+                break
+            self.shadow[offset + x] = ord(string[index]) & 0xff
+            x += 1
+
+    def render(self, lines):
+        # Show the lines (list of strings, one per display line) by only
+        # writing the cells that changed compared to the shadow buffer and
+        # only moving the cursor if it's not already at the next changed cell.
+        # This does not need a (slow) clear and removes the flickering.
+        # Lines longer than the display are wrapped onto the next display
+        # line (like putstr does).
+        num_columns = self.num_columns
+        rows = []
+        for line in lines:
+            while len(line) > num_columns:
+                rows.append(line[:num_columns])
+                line = line[num_columns:]
+            rows.append(line)
+        for y in range(self.num_lines):
+            line = rows[y] if y < len(rows) else ""
+            if len(line) < num_columns:
+                line = line + " " * (num_columns - len(line))
+            offset = y * num_columns
+            x = 0
+            while x < num_columns:
+                if self.shadow[offset + x] == ord(line[x]) & 0xff:
+                    x += 1
+                    continue
+                # Find the end of the changed cells (unchanged single cells in
+                # between are rewritten since it costs as much as a cursor move)
+                start = x
+                end = x + 1
+                x += 1
+                while x < num_columns:
+                    if self.shadow[offset + x] != ord(line[x]) & 0xff:
+                        end = x + 1
+                    elif x + 1 - end > 1:
+                        break
+                    x += 1
+                if self.cursor_x != start or self.cursor_y != y:
+                    self.move_to(start, y)
+                self.hal_write_data_str(line, start, end)
+                self.update_shadow(line, start, end)
+                self.cursor_x = end
+        if self.cursor_x >= num_columns:
+            self.move_to(0, (self.cursor_y + 1) % self.num_lines)
 
     def custom_char(self, location, charmap):
         # Write a character to one of the 8 CGRAM locations, available
@@ -181,6 +265,14 @@ class LcdApi:
         # It is expected that a derived HAL class will implement this function.
         raise NotImplementedError
 
+    def hal_write_data_str(self, string, start=0, end=None):
+        # Write the characters string[start:end] to the LCD.
+        # A derived HAL class can implement this function to batch the writes.
+        if end is None:
+            end = len(string)
+        for index in range(start, end):
+            self.hal_write_data(ord(string[index]))
+
     def hal_sleep_us(self, usecs):
         # Sleep for some time (given in microseconds)
         time.sleep_us(usecs)
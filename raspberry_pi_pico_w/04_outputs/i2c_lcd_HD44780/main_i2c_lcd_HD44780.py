@@ -49,6 +49,19 @@ def scroll_text_zigzag(lcd, text, delay=0.001):
         utime.sleep(delay)
 
 
+def benchmark_throughput(lcd, repetitions=20):
+    """Measure how many characters per second can be written to the whole screen"""
+    screen = "".join([chr(ord("A") + i % 26) for i in range(lcd.num_lines * lcd.num_columns)])
+    lcd.clear()
+    start = utime.ticks_us()
+    for _ in range(repetitions):
+        lcd.move_to(0, 0)
+        lcd.putstr(screen)
+    duration_us = utime.ticks_diff(utime.ticks_us(), start)
+    chars = repetitions * len(screen)
+    print(f"Wrote {chars} characters in {duration_us / 1000:.2f}ms ({chars * 1000000 / duration_us:.0f} characters/s)")
+
+
 def main():
     # Write strings
     lcd.putstr("Hello world!")
@@ -154,6 +167,9 @@ def main():
     lcd.clear()
     scroll_text_zigzag(lcd, "".join([chr(char_code) for char_code in range(0, 255 + 1)]), 0)
 
+    # Measure the throughput
+    benchmark_throughput(lcd)
+
 
 main()
 
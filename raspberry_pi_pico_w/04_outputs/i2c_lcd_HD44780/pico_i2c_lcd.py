@@ -1,5 +1,4 @@
 import utime
-import gc
 
 from lcd_api import LcdApi
 from machine import I2C
@@ -19,6 +18,11 @@ class I2cLcd(LcdApi):
     def __init__(self, i2c, i2c_addr, num_lines, num_columns):
         self.i2c = i2c
         self.i2c_addr = i2c_addr
+        # Preallocated buffers for a single byte (command) and a whole line of
+        # characters (data) since every byte is sent as 4 nibble/enable transitions
+        self.cmd_buf = bytearray(4)
+        self.data_buf = bytearray(4 * min(num_columns, 40))
+        self.data_buf_memoryview = memoryview(self.data_buf)
         self.i2c.writeto(self.i2c_addr, bytes([0]))
         utime.sleep_ms(20)   # Allow LCD time to powerup
         # Send reset 3 times
@@ -36,51 +40,62 @@ class I2cLcd(LcdApi):
         if num_lines > 1:
             cmd |= self.LCD_FUNCTION_2LINES
         self.hal_write_command(cmd)
-        gc.collect()
 
     def hal_write_init_nibble(self, nibble):
         # Writes an initialization nibble to the LCD.
         # This particular function is only used during initialization.
         byte = ((nibble >> 4) & 0x0f) << SHIFT_DATA
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
+        buf = self.cmd_buf
+        buf[0] = byte | MASK_E
+        buf[1] = byte
+        self.i2c.writeto(self.i2c_addr, memoryview(buf)[:2])
         
     def hal_backlight_on(self):
         # Allows the hal layer to turn the backlight on
         self.i2c.writeto(self.i2c_addr, bytes([1 << SHIFT_BACKLIGHT]))
-        gc.collect()
         
     def hal_backlight_off(self):
         #Allows the hal layer to turn the backlight off
         self.i2c.writeto(self.i2c_addr, bytes([0]))
-        gc.collect()
+
+    def pack_byte(self, buf, offset, mask, value):
+        # Pack a byte as 4 PCF8574 writes (high/low nibble each latched on the
+        # falling edge of E) into the buffer
+        byte = mask | (((value >> 4) & 0x0f) << SHIFT_DATA)
+        buf[offset] = byte | MASK_E
+        buf[offset + 1] = byte
+        byte = mask | ((value & 0x0f) << SHIFT_DATA)
+        buf[offset + 2] = byte | MASK_E
+        buf[offset + 3] = byte
         
     def hal_write_command(self, cmd):
-        # Write a command to the LCD. Data is latched on the falling edge of E.
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                (((cmd >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = ((self.backlight << SHIFT_BACKLIGHT) |
-                ((cmd & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
+        # Write a command to the LCD (in a single I2C transaction).
+        self.pack_byte(self.cmd_buf, 0, self.backlight << SHIFT_BACKLIGHT, cmd)
+        self.i2c.writeto(self.i2c_addr, self.cmd_buf)
         if cmd <= 3:
             # The home and clear commands require a worst case delay of 4.1 msec
             utime.sleep_ms(5)
-        gc.collect()
 
     def hal_write_data(self, data):
-        # Write data to the LCD. Data is latched on the falling edge of E.
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                (((data >> 4) & 0x0f) << SHIFT_DATA))
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        byte = (MASK_RS |
-                (self.backlight << SHIFT_BACKLIGHT) |
-                ((data & 0x0f) << SHIFT_DATA))      
-        self.i2c.writeto(self.i2c_addr, bytes([byte | MASK_E]))
-        self.i2c.writeto(self.i2c_addr, bytes([byte]))
-        gc.collect()
+        # Write data to the LCD (in a single I2C transaction).
+        self.pack_byte(self.cmd_buf, 0, MASK_RS | (self.backlight << SHIFT_BACKLIGHT), data)
+        self.i2c.writeto(self.i2c_addr, self.cmd_buf)
+
+    def hal_write_data_str(self, string, start=0, end=None):
+        # Write the characters string[start:end] to the LCD using as few I2C
+        # transactions as possible (one per line of characters).
+        if end is None:
+            end = len(string)
+        buf = self.data_buf
+        mask = MASK_RS | (self.backlight << SHIFT_BACKLIGHT)
+        offset = 0
+        for index in range(start, end):
+            if offset == len(buf):
+                self.i2c.writeto(self.i2c_addr, buf)
+                offset = 0
+            self.pack_byte(buf, offset, mask, ord(string[index]))
+            offset += 4
+        if offset == len(buf):
+            self.i2c.writeto(self.i2c_addr, buf)
+        elif offset > 0:
+            self.i2c.writeto(self.i2c_addr, self.data_buf_memoryview[:offset])
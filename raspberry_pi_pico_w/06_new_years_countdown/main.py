@@ -140,13 +140,12 @@ def countdown_to_new_year():
         minutes = (remaining_time % 3600) // 60
         seconds = remaining_time % 60
         
-        # Clear the screen and update with countdown time
-        lcd.clear()
-        lcd.putstr("Countdown: {}".format(target_year))
-
-        # Format and display hours, minutes, and seconds
-        lcd.move_to(0, 1)
-        lcd.putstr("{:02}:{:02}:{:02} {}".format(hours, minutes, seconds, info))
+        # Update the countdown time (only the changed characters are written)
+        lcd.render([
+            "Countdown: {}".format(target_year),
+            # Format and display hours, minutes, and seconds
+            "{:02}:{:02}:{:02} {}".format(hours, minutes, seconds, info),
+        ])
 
         # Measure the loop duration
         loop_end_time = time.ticks_ms()
@@ -161,10 +160,10 @@ def countdown_to_new_year():
     led_3.on()
 
     # Once the countdown finishes, display "Happy New Year"
-    lcd.clear()
-    lcd.putstr("Happy New Year!")
-    lcd.move_to(0, 1)
-    lcd.putstr("{}!".format(target_year))
+    lcd.render([
+        "Happy New Year!",
+        "{}!".format(target_year),
+    ])
 
 
 def main():